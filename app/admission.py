@@ -0,0 +1,128 @@
+# app/admission.py
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from app.exceptions import ServiceOverloadedError
+from app.logger import logger
+from app.utils import (
+    get_admission_max_concurrency,
+    get_admission_max_queue,
+    get_admission_queue_timeout,
+    get_admission_retry_after
+)
+
+UPSTREAMS = ("polygon", "marketwatch")
+
+
+class AdmissionLimiter:
+    """
+    Limit on the concurrent in-flight calls to an upstream, with a bounded wait queue.\n
+    Calls over the limit wait for a slot, but only while the queue has room and until their deadline;
+    past that they are shed instead of piling up behind a saturated upstream.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_deadline = 0
+
+    async def acquire(self, deadline: float):
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self.shed_queue_full += 1
+                raise self._overloaded("queue full")
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                self.shed_deadline += 1
+                raise self._overloaded("deadline exceeded")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.in_flight += 1
+        self.admitted += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def _overloaded(self, reason: str) -> ServiceOverloadedError:
+        logger.warning(f"Shed a {self.name} call: {reason} ({self.in_flight} in flight, {self.waiting} waiting)")
+        return ServiceOverloadedError(
+            message=f"The service is overloaded, {self.name} calls are limited. Retry later.",
+            error_detail={"error": f"Admission to {self.name} refused: {reason}."},
+            status_code=503,
+            retry_after=get_admission_retry_after()
+        )
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_deadline": self.shed_deadline
+        }
+
+
+def _build_limiters() -> dict[str, AdmissionLimiter]:
+    limiters = {"global": AdmissionLimiter("upstream", get_admission_max_concurrency(), get_admission_max_queue())}
+    for upstream in UPSTREAMS:
+        limiters[upstream] = AdmissionLimiter(upstream, get_admission_max_concurrency(upstream), get_admission_max_queue())
+    return limiters
+
+
+limiters = _build_limiters()
+
+# Responses answered with stale cached data instead of being shed
+stale_served = 0
+
+
+def reset_limiters():
+    """
+    Rebuild the limiters from the configuration, binding them to the running event loop (done in the app lifespan).
+    """
+    global limiters
+    limiters = _build_limiters()
+
+
+@asynccontextmanager
+async def admit(upstream: str):
+    """
+    Hold an upstream slot and a global slot for the duration of an upstream call, or raise ServiceOverloadedError.
+    The upstream slot is taken first so that calls waiting for a saturated upstream do not hold global slots.
+    """
+    deadline = time.monotonic() + get_admission_queue_timeout()
+    upstream_limiter, global_limiter = limiters[upstream], limiters["global"]
+    await upstream_limiter.acquire(deadline)
+    try:
+        await global_limiter.acquire(deadline)
+    except ServiceOverloadedError:
+        upstream_limiter.release()
+        raise
+    try:
+        yield
+    finally:
+        global_limiter.release()
+        upstream_limiter.release()
+
+
+def record_stale_served():
+    global stale_served
+    stale_served += 1
+
+
+def admission_stats() -> dict:
+    return {**{name: limiter.stats() for name, limiter in limiters.items()}, "stale_served": stale_served}
@@ -0,0 +1,77 @@
+# app/bars.py
+from datetime import date
+from decimal import Decimal
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models import DailyBars
+
+
+def bar_from_polygon(polygon_data: dict) -> dict:
+    """
+    Convert a Polygon open/close API response into a daily bar dictionary.
+    """
+    return {
+        "stock_symbol": polygon_data["symbol"].upper(),
+        "session_date": date.fromisoformat(polygon_data["from"]),
+        "open": polygon_data.get("open"),
+        "high": polygon_data.get("high"),
+        "low": polygon_data.get("low"),
+        "close": polygon_data.get("close"),
+        "volume": polygon_data.get("volume")
+    }
+
+
+def get_bars_for_session(db_session: Session, stock_symbols: list[str], session_date: date) -> dict:
+    """
+    Load the stored bars of the given symbols for one session in a single query.
+    RESPONSE: A dictionary of daily bar dictionaries keyed by stock symbol.
+    """
+    if not stock_symbols:
+        return {}
+    rows = db_session.query(DailyBars).filter(
+        DailyBars.session_date == session_date,
+        DailyBars.stock_symbol.in_(stock_symbols)).all()
+    return {
+        row.stock_symbol: {
+            "stock_symbol": row.stock_symbol,
+            "session_date": row.session_date,
+            "open": None if row.open is None else float(row.open),
+            "high": None if row.high is None else float(row.high),
+            "low": None if row.low is None else float(row.low),
+            "close": float(row.close),
+            "volume": row.volume
+        }
+        for row in rows
+    }
+
+
+def save_bars(db_session: Session, bars: list[dict]):
+    """
+    Insert or update daily bars in a single statement.
+    """
+    if not bars:
+        return
+    statement = insert(DailyBars).values([
+        {
+            "stock_symbol": bar["stock_symbol"],
+            "session_date": bar["session_date"],
+            "open": None if bar["open"] is None else Decimal(str(bar["open"])),
+            "high": None if bar["high"] is None else Decimal(str(bar["high"])),
+            "low": None if bar["low"] is None else Decimal(str(bar["low"])),
+            "close": Decimal(str(bar["close"])),
+            "volume": int(bar["volume"]) if bar.get("volume") is not None else None
+        }
+        for bar in bars
+    ])
+    statement = statement.on_conflict_do_update(
+        constraint="uq_daily_bars_symbol_session",
+        set_={
+            "open": statement.excluded.open,
+            "high": statement.excluded.high,
+            "low": statement.excluded.low,
+            "close": statement.excluded.close,
+            "volume": statement.excluded.volume
+        }
+    )
+    db_session.execute(statement)
+    db_session.commit()
@@ -0,0 +1,444 @@
+# app/cache.py
+import sys
+import time
+from array import array
+from collections import OrderedDict
+from datetime import date
+from decimal import Context, Decimal
+from cachetools import TTLCache
+from app.exceptions import StocksFastAPIError
+from app.schemas import Stock, StockValues, PerformanceData, Competitor, MarketCap
+from app.utils import (
+    get_cache_max_bytes,
+    get_cache_protected_ratio,
+    get_cache_ttl,
+    get_cache_stale_grace,
+    get_price_cache_max_bytes,
+    get_marketwatch_cache_ttl,
+    get_marketwatch_cache_max_bytes,
+    get_negative_cache_ttl,
+    get_negative_cache_maxsize
+)
+
+# Decimals are packed as an int64 coefficient and an int8 exponent, at most 18 significant digits
+_PACKING_CONTEXT = Context(prec=18)
+
+# Bookkeeping of an entry in the cache dictionaries (dict slot, entry list, key)
+_ENTRY_OVERHEAD = 200
+
+_MISSING = object()
+
+
+def _pack_decimal(value: Decimal) -> tuple[int, int]:
+    sign, digits, exponent = _PACKING_CONTEXT.create_decimal(value).normalize().as_tuple()
+    coefficient = int("".join(map(str, digits)) or "0")
+    return (-coefficient if sign else coefficient), exponent
+
+
+def _unpack_decimal(coefficient: int, exponent: int) -> Decimal:
+    return Decimal(coefficient).scaleb(exponent)
+
+
+class CompactStock:
+    """
+    Compact representation of a Stock response for the cache: slotted attributes, the numeric
+    fields packed in arrays and the competitors stored column-wise instead of as nested models.
+    The rendered and precompressed response body is kept along, so that cache hits are not serialized again.
+    """
+    __slots__ = (
+        "status", "purchased_amount", "purchased_status", "request_date", "company_code", "company_name",
+        "values", "competitor_names", "competitor_symbols", "competitor_currencies",
+        "market_cap_coefficients", "market_cap_exponents", "body", "nbytes"
+    )
+
+    # Order of the numeric fields packed in `values`
+    STOCK_VALUE_FIELDS = ("open", "high", "low", "close")
+    PERFORMANCE_FIELDS = ("five_days", "one_month", "three_months", "year_to_date", "one_year")
+
+    @classmethod
+    def from_stock(cls, stock: Stock) -> "CompactStock":
+        compact = cls()
+        compact.status = sys.intern(stock.status)
+        compact.purchased_amount = stock.purchased_amount
+        compact.purchased_status = sys.intern(stock.purchased_status)
+        compact.request_date = stock.request_date
+        compact.company_code = sys.intern(stock.company_code)
+        compact.company_name = stock.company_name
+        compact.values = array("d", [getattr(stock.stock_values, field) for field in cls.STOCK_VALUE_FIELDS] +
+                               [getattr(stock.performance_data, field) for field in cls.PERFORMANCE_FIELDS])
+        compact.competitor_names = tuple(competitor.name for competitor in stock.competitors)
+        compact.competitor_symbols = tuple(
+            sys.intern(competitor.symbol) if competitor.symbol else None for competitor in stock.competitors)
+        compact.competitor_currencies = tuple(
+            sys.intern(competitor.market_cap.currency) for competitor in stock.competitors)
+        packed = [_pack_decimal(competitor.market_cap.value) for competitor in stock.competitors]
+        compact.market_cap_coefficients = array("q", [coefficient for coefficient, _ in packed])
+        compact.market_cap_exponents = array("b", [exponent for _, exponent in packed])
+        compact.body = None
+        compact.nbytes = compact._estimate_size()
+        return compact
+
+    def set_body(self, body):
+        """
+        Attach the rendered response body (an EncodedBody); set it before caching the entry so that it is counted in its size.
+        """
+        self.body = body
+        self.nbytes = self._estimate_size()
+
+    def to_stock(self) -> Stock:
+        stock_values_count = len(self.STOCK_VALUE_FIELDS)
+        return Stock(
+            status=self.status,
+            purchased_amount=self.purchased_amount,
+            purchased_status=self.purchased_status,
+            request_date=self.request_date,
+            company_code=self.company_code,
+            company_name=self.company_name,
+            stock_values=StockValues(**dict(zip(self.STOCK_VALUE_FIELDS, self.values[:stock_values_count]))),
+            performance_data=PerformanceData(**dict(zip(self.PERFORMANCE_FIELDS, self.values[stock_values_count:]))),
+            competitors=[
+                Competitor(
+                    name=name,
+                    symbol=symbol,
+                    market_cap=MarketCap(currency=currency, value=_unpack_decimal(coefficient, exponent))
+                )
+                for name, symbol, currency, coefficient, exponent in zip(
+                    self.competitor_names, self.competitor_symbols, self.competitor_currencies,
+                    self.market_cap_coefficients, self.market_cap_exponents)
+            ]
+        )
+
+    def _estimate_size(self) -> int:
+        # Interned strings (status, currencies, symbols) are shared between entries and are not counted
+        size = sys.getsizeof(self) + sys.getsizeof(self.purchased_amount) + sys.getsizeof(self.request_date)
+        size += sys.getsizeof(self.company_name) + sys.getsizeof(self.values)
+        size += sys.getsizeof(self.competitor_names) + sum(sys.getsizeof(name) for name in self.competitor_names)
+        size += sys.getsizeof(self.competitor_symbols) + sys.getsizeof(self.competitor_currencies)
+        size += sys.getsizeof(self.market_cap_coefficients) + sys.getsizeof(self.market_cap_exponents)
+        if self.body is not None:
+            size += self.body.nbytes
+        return size
+
+
+def estimate_size(value) -> int:
+    """
+    Estimate the memory used by a cached value, using its own estimate when it has one.
+    """
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class SizedCache:
+    """
+    TTL cache bounded by a byte budget instead of an entry count, with a size-aware segmented LRU policy.\n
+    New entries go to the probation segment and are promoted to the protected segment on their first hit,
+    so one-off lookups cannot flush the frequently used entries. When the budget is exceeded, the least
+    recently used probation entries are evicted first, whatever their size. Expired entries stay readable by
+    get_stale for stale_grace seconds, as long as they are not evicted; they are evicted before any live entry.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float, protected_ratio: float = 0.8, timer=time.monotonic,
+                 stale_grace: float = 0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_grace = stale_grace
+        self.protected_max_bytes = int(max_bytes * protected_ratio)
+        self.timer = timer
+        # key -> [value, size, expires_at]
+        self.probation = OrderedDict()
+        self.protected = OrderedDict()
+        self.probation_bytes = 0
+        self.protected_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejections = 0
+        # Lower bound of the expiries of the entries, so that eviction only looks for expired entries when there can be some
+        self.next_expiry = float("inf")
+
+    @property
+    def current_bytes(self) -> int:
+        return self.probation_bytes + self.protected_bytes
+
+    def __len__(self):
+        return len(self.probation) + len(self.protected)
+
+    def _find(self, key):
+        entry = self.protected.get(key)
+        if entry is not None:
+            return self.protected, entry
+        entry = self.probation.get(key)
+        if entry is not None:
+            return self.probation, entry
+        return None, None
+
+    def _remove(self, segment: OrderedDict, key):
+        entry = segment.pop(key)
+        if segment is self.protected:
+            self.protected_bytes -= entry[1]
+        else:
+            self.probation_bytes -= entry[1]
+        return entry
+
+    def _expired(self, segment: OrderedDict, key, entry: list) -> bool:
+        # Expired entries are only dropped once their stale grace is over too, get_stale may still need them
+        now = self.timer()
+        if entry[2] > now:
+            return False
+        if entry[2] + self.stale_grace <= now:
+            self._remove(segment, key)
+            self.expirations += 1
+        return True
+
+    def __contains__(self, key) -> bool:
+        segment, entry = self._find(key)
+        return entry is not None and not self._expired(segment, key, entry)
+
+    def get(self, key, default=None):
+        segment, entry = self._find(key)
+        if entry is None or self._expired(segment, key, entry):
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        if segment is self.protected:
+            self.protected.move_to_end(key)
+        else:
+            # Promote on the second access
+            self._promote(key)
+        return entry[0]
+
+    def _promote(self, key):
+        # Move a probation entry to the protected segment, demoting the coldest protected entries when it is full
+        entry = self._remove(self.probation, key)
+        self.protected[key] = entry
+        self.protected_bytes += entry[1]
+        while self.protected_bytes > self.protected_max_bytes and len(self.protected) > 1:
+            demoted_key, demoted_entry = self.protected.popitem(last=False)
+            self.protected_bytes -= demoted_entry[1]
+            self.probation[demoted_key] = demoted_entry
+            self.probation_bytes += demoted_entry[1]
+
+    def get_stale(self, key, default=None):
+        """
+        Get a value even if it has expired, within its stale grace and as long as it was not evicted yet.
+        Used as a fallback when fresh data cannot be fetched; it does not count as a hit nor refresh the entry.
+        """
+        segment, entry = self._find(key)
+        if entry is None:
+            return default
+        if entry[2] + self.stale_grace <= self.timer():
+            self._remove(segment, key)
+            self.expirations += 1
+            return default
+        return entry[0]
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def set(self, key, value, ttl: float | None = None):
+        """
+        Store a value with its own TTL (the cache default when not given), evicting entries to stay within the budget.
+        """
+        size = estimate_size(value) + estimate_size(key) + _ENTRY_OVERHEAD
+        segment, entry = self._find(key)
+        if entry is not None:
+            self._remove(segment, key)
+        if size > self.max_bytes:
+            self.rejections += 1
+            return
+        expires_at = self.timer() + (self.ttl if ttl is None else ttl)
+        self.probation[key] = [value, size, expires_at]
+        self.probation_bytes += size
+        self.next_expiry = min(self.next_expiry, expires_at)
+        self._evict()
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def resize(self, key, value):
+        """
+        Count again the size of an entry whose value changed in place (e.g. a CompactStock whose body was
+        rendered again), evicting entries to stay within the budget. Other values stored under the key are left alone.
+        """
+        segment, entry = self._find(key)
+        if entry is None or entry[0] is not value:
+            return
+        size = estimate_size(value) + estimate_size(key) + _ENTRY_OVERHEAD
+        if segment is self.protected:
+            self.protected_bytes += size - entry[1]
+        else:
+            self.probation_bytes += size - entry[1]
+        entry[1] = size
+        if size > self.max_bytes:
+            self._remove(segment, key)
+            self.rejections += 1
+            return
+        self._evict()
+
+    def pop(self, key, default=None):
+        segment, entry = self._find(key)
+        if entry is None:
+            return default
+        return self._remove(segment, key)[0]
+
+    def __delitem__(self, key):
+        if self.pop(key, _MISSING) is _MISSING:
+            raise KeyError(key)
+
+    def _evict_expired(self):
+        # Entries past their stale grace go first, then the other expired ones, from both segments: after a
+        # session rollover the entries of the previous session must not push out the fresh ones
+        now = self.timer()
+        expired = sorted(
+            ((entry[2] + self.stale_grace > now, entry[2], segment is self.protected, key)
+             for segment in (self.probation, self.protected)
+             for key, entry in segment.items() if entry[2] <= now),
+            key=lambda candidate: candidate[:2]
+        )
+        for _, _, protected, key in expired:
+            if self.current_bytes <= self.max_bytes:
+                break
+            self._remove(self.protected if protected else self.probation, key)
+            self.expirations += 1
+        self.next_expiry = min((entry[2] for segment in (self.probation, self.protected) for entry in segment.values()),
+                               default=float("inf"))
+
+    def _evict(self):
+        if self.current_bytes > self.max_bytes and self.next_expiry <= self.timer():
+            self._evict_expired()
+        while self.current_bytes > self.max_bytes:
+            segment = self.probation if self.probation else self.protected
+            key = next(iter(segment))
+            self._remove(segment, key)
+            self.evictions += 1
+
+    def clear(self):
+        self.probation.clear()
+        self.protected.clear()
+        self.probation_bytes = 0
+        self.protected_bytes = 0
+        self.next_expiry = float("inf")
+
+    def live_entries(self) -> list[tuple]:
+        """
+        List the unexpired entries as (key, value, remaining TTL, protected), least recently used first, for snapshots.
+        """
+        now = self.timer()
+        return [
+            (key, entry[0], entry[2] - now, segment is self.protected)
+            for segment in (self.probation, self.protected)
+            for key, entry in segment.items() if entry[2] > now
+        ]
+
+    def restore(self, key, value, ttl: float, protected: bool = False):
+        """
+        Store an entry loaded from a snapshot, back in the segment it was in.
+        """
+        self.set(key, value, ttl=ttl)
+        if protected and key in self.probation:
+            self._promote(key)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "probation_bytes": self.probation_bytes,
+            "protected_bytes": self.protected_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "rejections": self.rejections
+        }
+
+
+# Stock responses and daily bars are keyed by (upper case stock symbol, session date) and live until the
+# data of the next session is available. Scraped MarketWatch data is keyed by symbol only, with its own TTL.
+
+# Cache of full Stock responses as CompactStock entries
+cache = SizedCache(max_bytes=get_cache_max_bytes(), ttl=get_cache_ttl(), protected_ratio=get_cache_protected_ratio(),
+                   stale_grace=get_cache_stale_grace())
+
+# Cache of daily bars (open/high/low/close of a session)
+price_cache = SizedCache(max_bytes=get_price_cache_max_bytes(), ttl=get_cache_ttl())
+
+# Cache of scraped MarketWatch data (company name, performance and competitors)
+scrape_cache = SizedCache(max_bytes=get_marketwatch_cache_max_bytes(), ttl=get_marketwatch_cache_ttl(),
+                          stale_grace=get_cache_stale_grace())
+
+
+def session_key(stock_symbol: str, session_date: date) -> tuple:
+    return (stock_symbol.upper(), session_date)
+
+
+class NegativeCache:
+    """
+    Cache of known-permanent upstream outcomes (errors and empty results), so that retries
+    of the same bad request are answered locally. Each error class has its own TTL.
+    """
+    ERROR_CLASSES = ("not_found", "no_trading_day", "missing_section")
+
+    def __init__(self):
+        self.caches = {
+            error_class: TTLCache(maxsize=get_negative_cache_maxsize(), ttl=get_negative_cache_ttl(error_class))
+            for error_class in self.ERROR_CLASSES
+        }
+        self.hits = {error_class: 0 for error_class in self.ERROR_CLASSES}
+        self.stores = {error_class: 0 for error_class in self.ERROR_CLASSES}
+        self.misses = 0
+
+    def get(self, key: tuple):
+        """
+        Get the cached outcome of a key: either an exception to raise again or an empty result to return.
+        """
+        for error_class, entries in self.caches.items():
+            outcome = entries.get(key)
+            if outcome is not None:
+                self.hits[error_class] += 1
+                return outcome
+        self.misses += 1
+        return None
+
+    @staticmethod
+    def replay(outcome):
+        """
+        Raise a fresh copy of a cached error, or return a cached empty result.
+        """
+        if isinstance(outcome, StocksFastAPIError):
+            raise type(outcome)(
+                message=outcome.message,
+                error_detail=outcome.error_detail,
+                status_code=outcome.status_code
+            )
+        return outcome
+
+    def record(self, key: tuple, error_class: str, outcome):
+        self.caches[error_class][key] = outcome
+        self.stores[error_class] += 1
+
+    def clear(self):
+        for entries in self.caches.values():
+            entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": dict(self.hits),
+            "stores": dict(self.stores),
+            "misses": self.misses,
+            "entries": {error_class: len(entries) for error_class, entries in self.caches.items()}
+        }
+
+
+negative_cache = NegativeCache()
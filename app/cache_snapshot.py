@@ -0,0 +1,183 @@
+# app/cache_snapshot.py
+import asyncio
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+import time
+from contextlib import contextmanager
+from app.cache import cache, price_cache, scrape_cache
+from app.logger import logger
+from app.performance import performance_cache
+from app.resources import run_in_executor
+from app.utils import get_cache_snapshot_enabled, get_cache_snapshot_path, get_cache_snapshot_interval
+
+try:
+    import fcntl
+except ImportError:  # Unix only, snapshots are written without a lock elsewhere
+    fcntl = None
+
+# Snapshot of the caches, so that a restarted worker serves hits right away instead of hitting the upstreams:
+#   header: magic, format version, number of entries
+#   entries: cache id, protected flag, absolute expiry (epoch seconds), key length, value length, then the
+#            pickled key and value
+# Expiries are absolute so that the time spent down counts against the TTLs. The index fields of an entry
+# are read from the memory-mapped file before its key and value, so expired entries are skipped unpickled.
+# The file is only ever written by the service itself, which makes unpickling it safe.
+SNAPSHOT_MAGIC = b"SFCS"
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct("<4sHI")
+_ENTRY = struct.Struct("<BBdII")
+
+# Snapshotted caches, by id; the format version must change when this order does
+SNAPSHOT_CACHES = (("stock", cache), ("price", price_cache), ("scrape", scrape_cache), ("performance", performance_cache))
+
+
+def _read_records(path: str):
+    """
+    Read the entries of a snapshot file as (cache id, protected, expires at, pickled key, mapped file,
+    value offset, value length), so that values are only copied out of the mapped file when needed.
+    """
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        magic, version, count = _HEADER.unpack_from(data, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported cache snapshot format {magic!r} version {version}.")
+        offset = _HEADER.size
+        for _ in range(count):
+            cache_id, protected, expires_at, key_length, value_length = _ENTRY.unpack_from(data, offset)
+            offset += _ENTRY.size
+            key = data[offset:offset + key_length]
+            offset += key_length
+            yield cache_id, protected, expires_at, key, data, offset, value_length
+            offset += value_length
+
+
+def collect_entries() -> list[tuple]:
+    """
+    Take the live entries of the caches, with their absolute expiry. Cheap enough to run on the event loop,
+    the entries are serialized afterwards.
+    """
+    now = time.time()
+    return [
+        (cache_id, protected, now + ttl, key, value)
+        for cache_id, (_, sized_cache) in enumerate(SNAPSHOT_CACHES)
+        for key, value, ttl, protected in sized_cache.live_entries()
+    ]
+
+
+@contextmanager
+def _snapshot_lock(path: str):
+    """
+    Hold an exclusive lock on the sidecar lock file of a snapshot, so that the read-merge-replace of
+    workers writing the same snapshot do not interleave and drop each other's entries.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_snapshot(entries: list[tuple], path: str | None = None) -> int:
+    """
+    Write the entries to the snapshot file atomically. Live entries of the previous snapshot that are
+    not among the given ones (e.g. cached by other workers) are carried over, under a file lock.\n
+    RESPONSE: The number of entries written.
+    """
+    path = path or get_cache_snapshot_path()
+    now = time.time()
+    records = []
+    for cache_id, protected, expires_at, key, value in entries:
+        records.append((cache_id, protected, expires_at, pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL),
+                        pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with _snapshot_lock(path):
+        carried = []
+        if os.path.exists(path):
+            written = {(record[0], record[3]) for record in records}
+            try:
+                for cache_id, protected, expires_at, key, data, offset, value_length in _read_records(path):
+                    if expires_at > now and (cache_id, key) not in written:
+                        carried.append((cache_id, protected, expires_at, key, data[offset:offset + value_length]))
+            except Exception as e:
+                logger.warning(f"Ignoring the previous cache snapshot {path}: {e}")
+                carried = []
+
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(carried) + len(records)))
+                # Carried entries first, so that the entries of this worker are the most recently used once loaded
+                for cache_id, protected, expires_at, key, value in carried + records:
+                    file.write(_ENTRY.pack(cache_id, protected, expires_at, len(key), len(value)))
+                    file.write(key)
+                    file.write(value)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+    logger.info(f"Wrote {len(records)} cache entries to {path} ({len(carried)} carried over)")
+    return len(carried) + len(records)
+
+
+def save_snapshot(path: str | None = None) -> int:
+    """
+    Write the snapshot of the caches of this worker, e.g. on shutdown, which must not fail because of it.
+    """
+    try:
+        return write_snapshot(collect_entries(), path)
+    except Exception as e:
+        logger.error(f"Failed to write the cache snapshot: {e}")
+        return 0
+
+
+def load_snapshot(path: str | None = None) -> int:
+    """
+    Load the unexpired entries of the snapshot file into the caches, with their remaining TTLs.\n
+    RESPONSE: The number of entries loaded.
+    """
+    path = path or get_cache_snapshot_path()
+    if not os.path.exists(path):
+        return 0
+    now = time.time()
+    loaded = skipped = 0
+    try:
+        for cache_id, protected, expires_at, key, data, offset, value_length in _read_records(path):
+            if expires_at <= now or cache_id >= len(SNAPSHOT_CACHES):
+                skipped += 1
+                continue
+            value = pickle.loads(data[offset:offset + value_length])
+            SNAPSHOT_CACHES[cache_id][1].restore(pickle.loads(key), value, expires_at - now, bool(protected))
+            loaded += 1
+    except Exception as e:
+        logger.error(f"Failed to load the cache snapshot {path}: {e}")
+    logger.info(f"Loaded {loaded} cache entries from {path}, skipped {skipped} expired")
+    return loaded
+
+
+async def checkpoint_periodically():
+    """
+    Write a snapshot every CACHE_SNAPSHOT_INTERVAL seconds, so that a crashed worker loses little of its cache.
+    """
+    while True:
+        await asyncio.sleep(get_cache_snapshot_interval())
+        try:
+            await run_in_executor(write_snapshot, collect_entries())
+        except Exception as e:
+            logger.error(f"Failed to write the cache snapshot: {e}")
+
+
+def start_cache_snapshots() -> asyncio.Task | None:
+    """
+    Load the snapshot left by the previous process and start the periodic checkpoints (done in the app lifespan).
+    """
+    if not get_cache_snapshot_enabled():
+        return None
+    load_snapshot()
+    return asyncio.create_task(checkpoint_periodically())
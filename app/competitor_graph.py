@@ -0,0 +1,107 @@
+# app/competitor_graph.py
+from collections import Counter
+from decimal import Decimal
+from sqlalchemy.orm import Session
+from app.models import CompetitorEdges
+from app.logger import logger
+
+
+def save_competitors(db_session: Session, stock_symbol: str, competitors_data: list[dict]):
+    """
+    Replace the outgoing competitor edges of a symbol with a freshly scraped competitors list.
+    """
+    stock_symbol = stock_symbol.upper()
+    db_session.query(CompetitorEdges).filter(
+        CompetitorEdges.stock_symbol == stock_symbol).delete(synchronize_session=False)
+
+    # MarketWatch may list the same company twice (e.g. several share classes with the same name)
+    seen_names = set()
+    for competitor in competitors_data:
+        name = competitor.get("name")
+        if not name or name in seen_names or competitor.get("symbol") == stock_symbol:
+            continue
+        seen_names.add(name)
+        market_cap = competitor.get("market_cap") or {}
+        value = market_cap.get("value")
+        db_session.add(CompetitorEdges(
+            stock_symbol=stock_symbol,
+            competitor_name=name,
+            competitor_symbol=competitor.get("symbol"),
+            market_cap_currency=market_cap.get("currency"),
+            market_cap_value=Decimal(value) if value is not None else None
+        ))
+
+    db_session.commit()
+    logger.info(f"Saved {len(seen_names)} competitor edges for {stock_symbol}")
+
+
+def _edge_to_dict(edge: CompetitorEdges) -> dict:
+    return {
+        "stock_symbol": edge.stock_symbol,
+        "competitor_name": edge.competitor_name,
+        "competitor_symbol": edge.competitor_symbol,
+        "market_cap": {
+            "currency": edge.market_cap_currency,
+            "value": edge.market_cap_value
+        } if edge.market_cap_value is not None else None
+    }
+
+
+def get_competitor_edges(db_session: Session, stock_symbol: str) -> list[dict]:
+    """
+    Get the competitors listed by a symbol, largest market cap first.
+    """
+    edges = db_session.query(CompetitorEdges).filter(
+        CompetitorEdges.stock_symbol == stock_symbol.upper()).all()
+    edges.sort(key=lambda edge: edge.market_cap_value or 0, reverse=True)
+    return [_edge_to_dict(edge) for edge in edges]
+
+
+def get_listed_by(db_session: Session, stock_symbol: str) -> list[dict]:
+    """
+    Reverse lookup: get the edges of every symbol listing the given symbol as a competitor.
+    """
+    edges = db_session.query(CompetitorEdges).filter(
+        CompetitorEdges.competitor_symbol == stock_symbol.upper()).order_by(CompetitorEdges.stock_symbol).all()
+    return [_edge_to_dict(edge) for edge in edges]
+
+
+def get_neighbor_symbols(db_session: Session, stock_symbol: str) -> list[str]:
+    """
+    Get the symbols directly connected to a symbol in the competitor graph, in either direction.
+    """
+    stock_symbol = stock_symbol.upper()
+    outgoing = db_session.query(CompetitorEdges.competitor_symbol).filter(
+        CompetitorEdges.stock_symbol == stock_symbol,
+        CompetitorEdges.competitor_symbol.isnot(None)).all()
+    incoming = db_session.query(CompetitorEdges.stock_symbol).filter(
+        CompetitorEdges.competitor_symbol == stock_symbol).all()
+
+    neighbors = []
+    for (symbol,) in outgoing + incoming:
+        if symbol != stock_symbol and symbol not in neighbors:
+            neighbors.append(symbol)
+    return neighbors
+
+
+def get_peers(db_session: Session, stock_symbol: str, limit: int = 20) -> list[dict]:
+    """
+    Get the peers of a symbol: its direct neighbors plus the symbols listing the same competitors,
+    ranked by the number of connections they share with it.
+    """
+    stock_symbol = stock_symbol.upper()
+    scores = Counter(get_neighbor_symbols(db_session, stock_symbol))
+
+    competitor_symbols = [
+        symbol for (symbol,) in db_session.query(CompetitorEdges.competitor_symbol).filter(
+            CompetitorEdges.stock_symbol == stock_symbol,
+            CompetitorEdges.competitor_symbol.isnot(None)).all()
+    ]
+    if competitor_symbols:
+        co_listing = db_session.query(CompetitorEdges.stock_symbol).filter(
+            CompetitorEdges.competitor_symbol.in_(competitor_symbols),
+            CompetitorEdges.stock_symbol != stock_symbol).all()
+        scores.update(symbol for (symbol,) in co_listing)
+
+    scores.pop(stock_symbol, None)
+    return [{"symbol": symbol, "score": score} for symbol, score in scores.most_common(limit)]
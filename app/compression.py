@@ -0,0 +1,120 @@
+# app/compression.py
+import gzip
+from fastapi import Request
+from fastapi.responses import Response
+from app.timing import timed
+from app.utils import get_compression_min_size, get_compression_gzip_level, get_compression_brotli_quality
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, responses are gzipped without it
+    brotli = None
+
+# Media types worth compressing, the others (e.g. images) are sent as they are
+COMPRESSIBLE_MEDIA_TYPES = ("application/json", "text/")
+
+
+def available_encodings() -> tuple[str, ...]:
+    # In order of preference when the client accepts several with the same weight
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """
+    Pick the content coding of a response from the Accept-Encoding header of the request.\n
+    RESPONSE: "br", "gzip" or None to send the response uncompressed.
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, parameters = item.strip().partition(";")
+        weight = 1.0
+        parameter = parameters.strip()
+        if parameter.startswith("q="):
+            try:
+                weight = float(parameter[2:])
+            except ValueError:
+                continue
+        weights[coding.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in available_encodings():
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(content: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(content, quality=get_compression_brotli_quality())
+    # mtime=0 so that the same content is always compressed to the same bytes
+    return gzip.compress(content, compresslevel=get_compression_gzip_level(), mtime=0)
+
+
+class EncodedBody:
+    """
+    Response body with its compressed variants, produced once (e.g. when a response is cached) and
+    sent as is to every client afterwards. Bodies under the size threshold are not compressed.\n
+    The tag records what the body was rendered from, so that its owner can tell when it is outdated.
+    """
+    __slots__ = ("content", "variants", "tag", "nbytes")
+
+    def __init__(self, content: bytes, tag=None):
+        self.content = content
+        self.tag = tag
+        self.variants = {}
+        if len(content) >= get_compression_min_size():
+            with timed("compress"):
+                for encoding in available_encodings():
+                    self.variants[encoding] = compress(content, encoding)
+        self.nbytes = len(content) + sum(len(variant) for variant in self.variants.values()) + 200
+
+    def response(self, request: Request, headers: dict | None = None) -> Response:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+        if encoding in self.variants:
+            headers["Content-Encoding"] = encoding
+            return Response(content=self.variants[encoding], media_type="application/json", headers=headers)
+        return Response(content=self.content, media_type="application/json", headers=headers)
+
+
+def _is_compressible(response: Response) -> bool:
+    headers = response.headers
+    if "content-encoding" in headers or response.status_code < 200 or response.status_code in (204, 304):
+        return False
+    # Streamed responses (no Content-Length) are left alone, they are sent as they are produced
+    content_length = headers.get("content-length")
+    if content_length is None or int(content_length) < get_compression_min_size():
+        return False
+    return headers.get("content-type", "").startswith(COMPRESSIBLE_MEDIA_TYPES)
+
+
+async def compression_middleware(request: Request, call_next):
+    """
+    HTTP middleware compressing the responses above the size threshold with the coding the client prefers.
+    Responses that are already encoded, e.g. precompressed cached bodies, are passed through.
+    """
+    response = await call_next(request)
+    if not _is_compressible(response):
+        return response
+
+    vary = response.headers.get("vary")
+    if vary is None:
+        response.headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        response.headers["Vary"] = f"{vary}, Accept-Encoding"
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is None:
+        return response
+
+    content = b"".join([chunk async for chunk in response.body_iterator])
+    with timed("compress"):
+        compressed = compress(content, encoding)
+    compressed_response = Response(content=compressed, status_code=response.status_code)
+    compressed_response.raw_headers = [
+        (name, value) for name, value in response.raw_headers if name != b"content-length"
+    ] + [(b"content-length", str(len(compressed)).encode()), (b"content-encoding", encoding.encode())]
+    return compressed_response
@@ -3,7 +3,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy_utils import database_exists, create_database
-from app.utils import get_db_url
+from app.utils import get_db_url, get_db_echo, get_db_pool_size, get_db_max_overflow, get_db_pool_recycle
 
 # Load the database connection URL from config.py
 DATABASE_URL = get_db_url()
@@ -12,7 +12,15 @@ if not database_exists(DATABASE_URL):
     create_database(DATABASE_URL)
     
 # Create the engine for connecting to the database (Factory pattern)
-engine = create_engine(DATABASE_URL, echo=True) # With echo=True, logs from the database will be displayed
+# Each worker process imports this module on its own, so every worker owns its connection pool.
+engine = create_engine(
+    DATABASE_URL,
+    echo=get_db_echo(), # With DB_ECHO=true, logs from the database will be displayed
+    pool_size=get_db_pool_size(),
+    max_overflow=get_db_max_overflow(),
+    pool_recycle=get_db_pool_recycle(),
+    pool_pre_ping=True
+)
 
 # SessionLocal for interacting with the database
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -23,6 +31,10 @@ Base = declarative_base()
 def create_tables_if_not_exists():
     Base.metadata.create_all(bind=engine)
 
+def dispose_engine():
+    # Close every pooled connection of this worker, used on shutdown
+    engine.dispose()
+
 def get_db_session():
     db = SessionLocal()
     try:
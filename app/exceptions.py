@@ -15,6 +15,10 @@ class MarketWatchDataScrapeError(StocksFastAPIError):
     """Exception for scraping errors."""
     pass
 
+class MarketWatchMissingSectionError(MarketWatchDataScrapeError):
+    """Exception for MarketWatch pages missing a required section, which retrying will not fix."""
+    pass
+
 class InvalidAPIResponseError(StocksFastAPIError):
     """Exception for invalid API responses."""
     pass
@@ -22,3 +26,9 @@ class InvalidAPIResponseError(StocksFastAPIError):
 class InvalidAPIRequestError(StocksFastAPIError):
     """Exception for invalid API requests."""
     pass
+
+class ServiceOverloadedError(StocksFastAPIError):
+    """Exception for requests shed by the admission control, answered with a Retry-After header."""
+    def __init__(self, message: str = "The service is overloaded", error_detail: dict = None, status_code: int = 503, retry_after: int = 1):
+        super().__init__(message, error_detail, status_code)
+        self.retry_after = retry_after
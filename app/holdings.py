@@ -0,0 +1,177 @@
+# app/holdings.py
+import asyncio
+import json
+import os
+from decimal import Decimal
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.data_base import engine, SessionLocal
+from app.logger import logger
+from app.resources import run_in_executor
+from app.models import Stocks
+from app.utils import get_holdings_listen_enabled, get_holdings_reconnect_interval
+
+# Postgres channel on which every holding change is announced to the other workers
+HOLDINGS_CHANNEL = "holdings_changed"
+
+
+class HoldingsMap:
+    """
+    In-process copy of the Stocks table (symbol -> purchased amount), so that read requests do not
+    query the database. It is loaded once per worker and kept current by the amount updates of the
+    worker itself and by the change notifications of the other workers.
+    """
+
+    def __init__(self):
+        self._amounts: dict[str, Decimal] = {}
+        self.loaded = False
+        self.reloads = 0
+        self.notifications = 0
+
+    def load(self, db_session: Session):
+        self._amounts = {
+            stock_symbol.upper(): purchased_amount
+            for stock_symbol, purchased_amount in db_session.query(Stocks.stock_symbol, Stocks.purchased_amount)
+        }
+        self.loaded = True
+        self.reloads += 1
+        logger.info(f"Loaded {len(self._amounts)} holdings")
+
+    def reload(self):
+        db_session = SessionLocal()
+        try:
+            self.load(db_session)
+        finally:
+            db_session.close()
+
+    def ensure_loaded(self):
+        # Apps started without their lifespan (e.g. in tests) load the holdings on first use
+        if not self.loaded:
+            self.reload()
+
+    def get(self, stock_symbol: str) -> Decimal | None:
+        self.ensure_loaded()
+        return self._amounts.get(stock_symbol.upper())
+
+    def set(self, stock_symbol: str, purchased_amount: Decimal):
+        self._amounts[stock_symbol.upper()] = purchased_amount
+
+    def items(self) -> list[tuple[str, Decimal]]:
+        self.ensure_loaded()
+        return list(self._amounts.items())
+
+    def __len__(self):
+        return len(self._amounts)
+
+    def stats(self) -> dict:
+        return {
+            "holdings": len(self._amounts),
+            "reloads": self.reloads,
+            "notifications": self.notifications
+        }
+
+
+holdings = HoldingsMap()
+
+
+def notify_holding_changed(db_session: Session, stock_symbol: str, purchased_amount: Decimal):
+    """
+    Announce a holding change to the other workers. The notification is part of the transaction of
+    the change, so it is only delivered once the change is committed.
+    """
+    if db_session.get_bind().dialect.name != "postgresql":
+        return
+    payload = json.dumps({"stock_symbol": stock_symbol.upper(), "purchased_amount": str(purchased_amount),
+                          "pid": os.getpid()})
+    db_session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": HOLDINGS_CHANNEL, "payload": payload})
+
+
+def apply_notification(payload: str):
+    change = json.loads(payload)
+    holdings.notifications += 1
+    if change.get("reload"):
+        # Bulk changes are announced once, the whole map is reloaded off the event loop
+        asyncio.ensure_future(run_in_executor(holdings.reload))
+        return
+    holdings.set(change["stock_symbol"], Decimal(change["purchased_amount"]))
+
+
+class HoldingsListener:
+    """
+    LISTEN on the holdings channel with a dedicated connection watched by the event loop, so that
+    notifications are applied as soon as they arrive without polling. When the connection is lost,
+    the holdings are reloaded after reconnecting since notifications may have been missed meanwhile.
+    """
+
+    def __init__(self):
+        self._connection = None
+        self._reconnect_task = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        connection = engine.raw_connection()
+        # The connection is owned by the listener for the lifetime of the worker, not by the pool
+        connection.detach()
+        self._connection = connection.driver_connection
+        self._connection.autocommit = True
+        with self._connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {HOLDINGS_CHANNEL}")
+        loop.add_reader(self._connection.fileno(), self._on_readable)
+        logger.info(f"Listening for holding changes on {HOLDINGS_CHANNEL}")
+
+    def _on_readable(self):
+        try:
+            self._connection.poll()
+        except Exception as e:
+            logger.error(f"Lost the holdings notification connection: {e}")
+            self._close()
+            self._reconnect_task = asyncio.ensure_future(self._reconnect())
+            return
+        while self._connection.notifies:
+            notification = self._connection.notifies.pop(0)
+            try:
+                apply_notification(notification.payload)
+            except (ValueError, KeyError) as e:
+                logger.error(f"Invalid holdings notification {notification.payload}: {e}")
+
+    async def _reconnect(self):
+        while True:
+            await asyncio.sleep(get_holdings_reconnect_interval())
+            try:
+                self.start()
+                await run_in_executor(holdings.reload)
+                return
+            except Exception as e:
+                self._close()
+                logger.error(f"Failed to reconnect the holdings notification connection: {e}")
+
+    def _close(self):
+        if self._connection is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_reader(self._connection.fileno())
+        except Exception:
+            pass
+        try:
+            self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+
+    def stop(self):
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        self._close()
+
+
+def start_holdings_listener() -> HoldingsListener | None:
+    if not get_holdings_listen_enabled() or engine.dialect.name != "postgresql":
+        return None
+    listener = HoldingsListener()
+    try:
+        listener.start()
+    except Exception as e:
+        logger.error(f"Failed to listen for holding changes: {e}")
+        listener._close()
+        listener._reconnect_task = asyncio.ensure_future(listener._reconnect())
+    return listener
@@ -0,0 +1,242 @@
+# app/holdings_io.py
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import AsyncIterator, Iterable, Iterator, Literal
+from pydantic import ValidationError
+from sqlalchemy import select
+from app.data_base import engine, SessionLocal
+from app.exceptions import InvalidAPIRequestError
+from app.holdings import holdings, HOLDINGS_CHANNEL
+from app.logger import logger
+from app.models import Stocks
+from app.schemas import Amount
+from app.tickers import normalize_stock_symbol, is_known_stock_symbol
+from app.utils import get_holdings_export_batch_size
+
+HoldingsFormat = Literal["csv", "ndjson"]
+ImportMode = Literal["set", "add"]
+
+# Invalid rows reported back at most, the import is rejected as a whole anyway
+MAX_REPORTED_ERRORS = 20
+
+# Size of the blocks of an uploaded body parsed at once in the executor
+IMPORT_BLOCK_BYTES = 256 * 1024
+
+# Throughput of the last import and export of this worker, exposed in /metrics
+transfer_stats = {"import": None, "export": None}
+
+
+def _throughput(rows: int, seconds: float) -> dict:
+    return {"rows": rows, "seconds": round(seconds, 3), "rows_per_second": round(rows / seconds) if seconds else None}
+
+
+class HoldingsParser:
+    """
+    Incremental parser of CSV ("stock_symbol,purchased_amount" header) or NDJSON holdings, fed one line
+    or one block of lines at a time so that uploads are never held in memory. Valid rows are written as CSV to a spooled
+    file, ready to be sent with COPY; invalid rows are collected with their line number.
+    """
+
+    def __init__(self, holdings_format: HoldingsFormat):
+        self.format = holdings_format
+        self.columns = None
+        self.line_number = 0
+        self.rows = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        # Kept in memory up to 8 MiB, then on disk
+        self.spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024, mode="w+", newline="")
+        self._writer = csv.writer(self.spool)
+
+    def feed(self, line: str):
+        self.line_number += 1
+        line = line.strip()
+        if not line:
+            return
+        try:
+            if self.format == "ndjson":
+                record = json.loads(line)
+            else:
+                values = next(csv.reader([line]))
+                if self.columns is None:
+                    self.columns = [column.strip() for column in values]
+                    if not {"stock_symbol", "purchased_amount"} <= set(self.columns):
+                        raise ValueError("The CSV header must name the stock_symbol and purchased_amount columns.")
+                    return
+                record = dict(zip(self.columns, values))
+            stock_symbol = normalize_stock_symbol(str(record["stock_symbol"]))
+            if not is_known_stock_symbol(stock_symbol):
+                raise ValueError(f"Unknown stock symbol {stock_symbol}.")
+            purchased_amount = Amount(amount=record["purchased_amount"]).amount
+        except (ValueError, KeyError, TypeError, ValidationError) as e:
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                message = e.errors()[0]["msg"] if isinstance(e, ValidationError) else str(e)
+                self.errors.append({"line": self.line_number, "error": message})
+            else:
+                self.errors.append(None)
+            return
+        self._writer.writerow((stock_symbol, purchased_amount))
+        self.rows += 1
+
+    def feed_block(self, block: bytes):
+        """
+        Parse a block of whole lines, in the executor since parsing large uploads is CPU bound.
+        """
+        for line in iter_lines((block,)):
+            self.feed(line)
+
+    def raise_for_errors(self):
+        if self.errors:
+            raise InvalidAPIRequestError(
+                message=f"{len(self.errors)} invalid holdings rows, nothing was imported.",
+                error_detail={"errors": [error for error in self.errors if error is not None]},
+                status_code=400
+            )
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """
+    Split a stream of byte chunks into decoded lines.
+    """
+    # A bytearray cut at the last newline of each chunk keeps long lines linear to buffer
+    pending = bytearray()
+    for chunk in chunks:
+        end = chunk.rfind(b"\n")
+        if end < 0:
+            pending += chunk
+            continue
+        end += len(pending)
+        pending += chunk
+        for line in pending[:end].split(b"\n"):
+            yield line.decode("utf-8-sig")
+        del pending[:end + 1]
+    if pending:
+        yield pending.decode("utf-8-sig")
+
+
+async def aiter_blocks(chunks, block_bytes: int = IMPORT_BLOCK_BYTES) -> AsyncIterator[bytes]:
+    """
+    Regroup an async stream of byte chunks, e.g. a request body, into blocks of whole lines of at least
+    block_bytes (but the last one), so that they can be parsed off the event loop.
+    """
+    pending = bytearray()
+    async for chunk in chunks:
+        end = chunk.rfind(b"\n")
+        if end < 0 or len(pending) + end < block_bytes:
+            pending += chunk
+            continue
+        end += len(pending)
+        pending += chunk
+        yield bytes(pending[:end])
+        del pending[:end + 1]
+    if pending:
+        yield bytes(pending)
+
+
+def merge_holdings(parser: HoldingsParser, mode: ImportMode = "set") -> dict:
+    """
+    Import the parsed rows in one transaction: COPY into a staging table, then a single merge into
+    the Stocks table. Rows of the same symbol are summed. With mode "set" the imported amounts replace
+    the stored ones, with mode "add" they are added to them like POST /stock/{stock_symbol} does.\n
+    RESPONSE: The import throughput.
+    """
+    parser.raise_for_errors()
+    parser.spool.seek(0)
+    amount = "EXCLUDED.purchased_amount" if mode == "set" else "stocks.purchased_amount + EXCLUDED.purchased_amount"
+
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMP TABLE stocks_staging (stock_symbol TEXT, purchased_amount NUMERIC) ON COMMIT DROP")
+            cursor.copy_expert("COPY stocks_staging (stock_symbol, purchased_amount) FROM STDIN WITH (FORMAT csv)",
+                               parser.spool)
+            cursor.execute(
+                f"INSERT INTO {Stocks.__tablename__} (stock_symbol, purchased_amount) "
+                "SELECT stock_symbol, SUM(purchased_amount) FROM stocks_staging GROUP BY stock_symbol "
+                f"ON CONFLICT (stock_symbol) DO UPDATE SET purchased_amount = {amount}, updated_at = now() "
+                "RETURNING stock_symbol, purchased_amount"
+            )
+            merged = cursor.fetchall()
+            # A single notification makes the other workers reload their holdings
+            cursor.execute("SELECT pg_notify(%s, %s)",
+                           (HOLDINGS_CHANNEL, json.dumps({"reload": True, "pid": os.getpid()})))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+        parser.spool.close()
+
+    for stock_symbol, purchased_amount in merged:
+        holdings.set(stock_symbol, purchased_amount)
+
+    # Measured from the first parsed line, so that the throughput covers the whole import
+    stats = {**_throughput(parser.rows, time.perf_counter() - parser.started), "symbols": len(merged)}
+    transfer_stats["import"] = stats
+    logger.info(f"Imported {parser.rows} holdings rows for {len(merged)} symbols "
+                f"at {stats['rows_per_second']} rows/s")
+    return stats
+
+
+def iter_export(holdings_format: HoldingsFormat) -> Iterator[str]:
+    """
+    Stream the Stocks table as CSV or NDJSON from a server-side cursor, in constant memory.
+    The throughput is logged once the last row is sent.
+    """
+    start = time.perf_counter()
+    rows = 0
+    if holdings_format == "csv":
+        yield "stock_symbol,purchased_amount\n"
+
+    db_session = SessionLocal()
+    try:
+        statement = select(Stocks.stock_symbol, Stocks.purchased_amount).order_by(Stocks.stock_symbol)
+        result = db_session.execute(
+            statement.execution_options(stream_results=True, yield_per=get_holdings_export_batch_size()))
+        for partition in result.partitions():
+            buffer = io.StringIO()
+            for stock_symbol, purchased_amount in partition:
+                if holdings_format == "csv":
+                    buffer.write(f"{stock_symbol},{purchased_amount}\n")
+                else:
+                    buffer.write(json.dumps({"stock_symbol": stock_symbol, "purchased_amount": str(purchased_amount)}))
+                    buffer.write("\n")
+            rows += len(partition)
+            yield buffer.getvalue()
+    finally:
+        db_session.close()
+
+    stats = _throughput(rows, time.perf_counter() - start)
+    transfer_stats["export"] = stats
+    logger.info(f"Exported {rows} holdings rows at {stats['rows_per_second']} rows/s")
+
+
+def _main(arguments: list[str]):
+    # python -m app.holdings_io import <file> [--add] | export <file>
+    if len(arguments) < 2 or arguments[0] not in ("import", "export"):
+        sys.exit("Usage: python -m app.holdings_io import <file.csv|file.ndjson> [--add] | export <file.csv|file.ndjson>")
+    command, path = arguments[0], arguments[1]
+    holdings_format = "ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv"
+
+    if command == "import":
+        parser = HoldingsParser(holdings_format)
+        with open(path, "rb") as file:
+            for line in iter_lines(iter(lambda: file.read(1024 * 1024), b"")):
+                parser.feed(line)
+        print(merge_holdings(parser, "add" if "--add" in arguments else "set"))
+    else:
+        with open(path, "w", encoding="utf-8") as file:
+            for chunk in iter_export(holdings_format):
+                file.write(chunk)
+        print(transfer_stats["export"])
+
+
+if __name__ == "__main__":
+    _main(sys.argv[1:])
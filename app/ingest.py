@@ -0,0 +1,273 @@
+# app/ingest.py
+import asyncio
+import csv
+import io
+import sys
+from datetime import date
+import httpx
+import numpy as np
+from sqlalchemy import text
+from app.cache import price_cache, session_key
+from app.data_base import engine, SessionLocal
+from app.exceptions import ExternalAPIError, InvalidAPIResponseError
+from app.logger import logger
+from app.market_calendar import last_completed_session, seconds_until_next_session_data
+from app.models import DailyBars, IngestedSessions
+from app.polygon_keys import polygon_get
+from app.resources import http_client, run_in_executor
+from app.utils import (
+    get_polygon_api_url,
+    get_bulk_ingest_enabled,
+    get_bulk_ingest_retry_interval
+)
+
+# Key of the Postgres advisory lock making sure a single worker ingests a session
+INGEST_LOCK_KEY = 727001
+
+# Columns of the batch, in the order of the COPY into the staging table
+BAR_COLUMNS = ("stock_symbol", "session_date", "open", "high", "low", "close", "volume")
+
+
+async def fetch_grouped_daily(session_date: date, client: httpx.AsyncClient | None = None) -> dict:
+    """
+    Fetch the daily bars of the whole US stock market for a session in a single Polygon grouped daily request.\n
+    RESPONSE: The grouped daily API response.
+    """
+    url = f"{get_polygon_api_url()}/v2/aggs/grouped/locale/us/market/stocks/{session_date.isoformat()}"
+    params = {"adjusted": "true"}
+    try:
+        if client is not None:
+            response = await polygon_get(client, url, params)
+        else:
+            async with http_client() as shared_client:
+                response = await polygon_get(shared_client, url, params)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as e:
+        logger.error(f"HTTP error while fetching grouped daily bars from Polygon: {e}")
+        raise ExternalAPIError(
+            message=f"Failed to fetch grouped daily bars from external API. {e}",
+            error_detail={"error": e.response.content.decode("utf-8")},
+            status_code=e.response.status_code
+        )
+
+
+def parse_grouped_daily(payload: dict, session_date: date) -> dict:
+    """
+    Parse a grouped daily response into a columnar batch: one array per bar column.
+    """
+    results = payload.get("results")
+    if payload.get("status") not in ("OK", "DELAYED") or results is None:
+        raise InvalidAPIResponseError(
+            message="Failed to validate grouped daily response from external API.",
+            error_detail={"error": f"Unexpected status {payload.get('status')} without results."},
+            status_code=500
+        )
+
+    rows = [row for row in results if row.get("T") and all(row.get(field) is not None for field in "ohlc")]
+    count = len(rows)
+    return {
+        "session_date": session_date,
+        "stock_symbol": np.array([row["T"].upper() for row in rows], dtype=object),
+        "open": np.fromiter((row["o"] for row in rows), dtype=np.float64, count=count),
+        "high": np.fromiter((row["h"] for row in rows), dtype=np.float64, count=count),
+        "low": np.fromiter((row["l"] for row in rows), dtype=np.float64, count=count),
+        "close": np.fromiter((row["c"] for row in rows), dtype=np.float64, count=count),
+        "volume": np.fromiter((row.get("v") or 0 for row in rows), dtype=np.int64, count=count)
+    }
+
+
+def write_bars(batch: dict):
+    """
+    Write a batch to the daily_bars table: COPY into a staging table, then one merge statement.
+    The session is marked as ingested in the same transaction.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    session_date = batch["session_date"].isoformat()
+    writer.writerows(zip(
+        batch["stock_symbol"],
+        [session_date] * len(batch["stock_symbol"]),
+        np.round(batch["open"], 4),
+        np.round(batch["high"], 4),
+        np.round(batch["low"], 4),
+        np.round(batch["close"], 4),
+        batch["volume"]
+    ))
+    buffer.seek(0)
+
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMP TABLE daily_bars_staging "
+                "(stock_symbol TEXT, session_date DATE, open NUMERIC, high NUMERIC, low NUMERIC, close NUMERIC, volume BIGINT) "
+                "ON COMMIT DROP"
+            )
+            cursor.copy_expert(
+                f"COPY daily_bars_staging ({', '.join(BAR_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+            cursor.execute(
+                f"INSERT INTO {DailyBars.__tablename__} ({', '.join(BAR_COLUMNS)}) "
+                f"SELECT {', '.join(BAR_COLUMNS)} FROM daily_bars_staging "
+                "ON CONFLICT ON CONSTRAINT uq_daily_bars_symbol_session DO UPDATE SET "
+                "open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low, "
+                "close = EXCLUDED.close, volume = EXCLUDED.volume"
+            )
+            cursor.execute(
+                f"INSERT INTO {IngestedSessions.__tablename__} (session_date, bar_count) VALUES (%s, %s) "
+                "ON CONFLICT (session_date) DO UPDATE SET bar_count = EXCLUDED.bar_count, ingested_at = now()",
+                (session_date, len(batch["stock_symbol"]))
+            )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def fill_price_cache(batch: dict) -> int:
+    """
+    Store every bar of a batch in the price cache, until the next session's data is available.
+    """
+    session_date = batch["session_date"]
+    ttl = seconds_until_next_session_data()
+    columns = [batch[column].tolist() for column in ("stock_symbol", "open", "high", "low", "close", "volume")]
+    for stock_symbol, open_, high, low, close, volume in zip(*columns):
+        price_cache.set(session_key(stock_symbol, session_date), {
+            "stock_symbol": stock_symbol,
+            "session_date": session_date,
+            "open": open_,
+            "high": high,
+            "low": low,
+            "close": close,
+            "volume": volume
+        }, ttl=ttl)
+    return len(columns[0])
+
+
+def load_batch_from_bars(session_date: date) -> dict:
+    """
+    Read the stored bars of a session as a batch, for workers that did not run the ingestion themselves.
+    """
+    with engine.connect() as connection:
+        rows = connection.execute(
+            text(f"SELECT stock_symbol, open, high, low, close, volume FROM {DailyBars.__tablename__} "
+                 "WHERE session_date = :session_date"),
+            {"session_date": session_date}
+        ).all()
+    count = len(rows)
+    return {
+        "session_date": session_date,
+        "stock_symbol": np.array([row[0] for row in rows], dtype=object),
+        "open": np.fromiter((np.nan if row[1] is None else row[1] for row in rows), dtype=np.float64, count=count),
+        "high": np.fromiter((np.nan if row[2] is None else row[2] for row in rows), dtype=np.float64, count=count),
+        "low": np.fromiter((np.nan if row[3] is None else row[3] for row in rows), dtype=np.float64, count=count),
+        "close": np.fromiter((row[4] for row in rows), dtype=np.float64, count=count),
+        "volume": np.fromiter((row[5] or 0 for row in rows), dtype=np.int64, count=count)
+    }
+
+
+async def ingest_session(session_date: date) -> int:
+    """
+    Fetch, store and cache the whole market's daily bars of a session.\n
+    RESPONSE: The number of bars ingested.
+    """
+    payload = await fetch_grouped_daily(session_date)
+    batch = parse_grouped_daily(payload, session_date)
+    await run_in_executor(write_bars, batch)
+    count = fill_price_cache(batch)
+    logger.info(f"Ingested {count} daily bars for {session_date}")
+    return count
+
+
+def _session_is_stored(session_date: date) -> bool:
+    # Bars stored one by one (portfolio pricing, backfills) do not make a session ingested, only the marker does
+    db_session = SessionLocal()
+    try:
+        return db_session.get(IngestedSessions, session_date) is not None
+    finally:
+        db_session.close()
+
+
+def _try_ingest_lock():
+    """
+    Try to take the session-level advisory lock of the ingestion on a dedicated connection.\n
+    RESPONSE: The connection holding the lock, or None when another worker holds it.
+    """
+    connection = engine.connect()
+    try:
+        locked = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": INGEST_LOCK_KEY}).scalar()
+        # The lock outlives the transaction, which must not stay open while the session is being ingested
+        connection.commit()
+    except Exception:
+        connection.close()
+        raise
+    if not locked:
+        connection.close()
+        return None
+    return connection
+
+
+def _release_ingest_lock(connection):
+    try:
+        connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": INGEST_LOCK_KEY})
+        connection.commit()
+    except Exception as e:
+        # Closing the underlying connection releases the lock, it must not go back to the pool still holding it
+        logger.error(f"Failed to release the ingestion lock: {e}")
+        connection.invalidate()
+    finally:
+        connection.close()
+
+
+async def ingest_or_load_session(session_date: date) -> int:
+    """
+    Make the bars of a session available in this worker's price cache. The first worker to get the advisory
+    lock ingests the session from Polygon; the others wait for it and load the stored bars.
+    """
+    while True:
+        if await run_in_executor(_session_is_stored, session_date):
+            batch = await run_in_executor(load_batch_from_bars, session_date)
+            count = fill_price_cache(batch)
+            logger.info(f"Loaded {count} stored daily bars for {session_date} into the price cache")
+            return count
+
+        lock_connection = await run_in_executor(_try_ingest_lock)
+        if lock_connection is not None:
+            try:
+                if not await run_in_executor(_session_is_stored, session_date):
+                    return await ingest_session(session_date)
+            finally:
+                await run_in_executor(_release_ingest_lock, lock_connection)
+
+        # Another worker is ingesting the session, its bars will be stored shortly
+        await asyncio.sleep(5)
+
+
+async def run_daily_ingestion():
+    """
+    Background task of the app lifespan: fill the price cache with the last completed session,
+    then again each time the data of a new session becomes available.
+    """
+    while True:
+        try:
+            await ingest_or_load_session(last_completed_session())
+            await asyncio.sleep(seconds_until_next_session_data())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Daily bars ingestion failed, retrying in {get_bulk_ingest_retry_interval()}s: {e}")
+            await asyncio.sleep(get_bulk_ingest_retry_interval())
+
+
+def start_daily_ingestion() -> asyncio.Task | None:
+    if not get_bulk_ingest_enabled():
+        return None
+    return asyncio.create_task(run_daily_ingestion())
+
+
+if __name__ == "__main__":
+    # Ingest a session by hand: python -m app.ingest [YYYY-MM-DD]
+    target = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else last_completed_session()
+    asyncio.run(ingest_session(target))
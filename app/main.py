@@ -1,19 +1,91 @@
 # app/main.py
-from fastapi import FastAPI, Request, HTTPException, Depends, status
+from fastapi import FastAPI, Request, HTTPException, Depends, BackgroundTasks, status
 from pydantic import BaseModel
 from app.services import fetch_polygon_open_close_stock_data, fetch_marketwatch_and_scrape_stock_data
 from app.schemas import *
 from datetime import date, timedelta
 from decimal import Decimal
-from app.data_base import create_tables_if_not_exists, get_db_session
+from app.data_base import create_tables_if_not_exists, get_db_session, dispose_engine, SessionLocal
 from sqlalchemy.orm import Session
 from app.models import Stocks
 from app.logger import logger
-from cachetools import TTLCache
-from app.exceptions import StocksFastAPIError, InvalidAPIRequestError, ExternalAPIError, MarketWatchDataScrapeError
-from fastapi.responses import JSONResponse
+from app.cache import cache, price_cache, scrape_cache, negative_cache, session_key, CompactStock
+from app.market_calendar import last_completed_session, seconds_until_next_session_data, previous_trading_day
+from app.bars import bar_from_polygon
+from app.portfolio import value_portfolio
+from app.competitor_graph import save_competitors, get_competitor_edges, get_listed_by, get_peers, get_neighbor_symbols
+from app.utils import get_competitor_prefetch_enabled, get_competitor_prefetch_limit, get_cache_ttl
+from app.exceptions import StocksFastAPIError, InvalidAPIRequestError, ExternalAPIError, MarketWatchDataScrapeError, ServiceOverloadedError
+from app.admission import admission_stats, record_stale_served, reset_limiters
+from app.polygon_keys import polygon_key_stats, reset_key_pool
+from app.cache_snapshot import start_cache_snapshots, save_snapshot
+from app.page_archive import start_page_archive_gc
+from app.memory import GroupBy, start_tracing_if_enabled, take_snapshot, list_snapshots, diff_snapshots, memory_stats
+from app.performance import use_stored_bars, stored_performance, scraped_data_ttl, performance_cache, backfill_in_progress
+from fastapi.responses import JSONResponse, Response, PlainTextResponse, StreamingResponse
+from contextlib import asynccontextmanager
+from app.resources import open_resources, close_resources, run_in_executor
+from app.tickers import StockSymbol, get_ticker_index, is_known_stock_symbol, refresh_ticker_index_periodically
+from app.ingest import start_daily_ingestion
+from app.timing import timed, server_timing_middleware, timing_stats
+from app.compression import EncodedBody, compression_middleware
+from app.profiler import profile_request, profile_window, pop_stored_profile
+from app.security import require_admin, require_profiler, is_admin_request
+from app.utils import get_profiler_enabled
+from app.holdings import holdings, notify_holding_changed, start_holdings_listener
+from app.holdings_io import (
+    HoldingsFormat, ImportMode, HoldingsParser, aiter_blocks, merge_holdings, iter_export, transfer_stats
+)
+import asyncio
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs once per worker process: set up the worker's resources and release them on shutdown
+    start_tracing_if_enabled()
+    create_tables_if_not_exists()
+    open_resources()
+    reset_limiters()
+    reset_key_pool()
+    get_ticker_index()
+    # Listen before loading so that no change committed in between is missed
+    holdings_listener = start_holdings_listener()
+    holdings.ensure_loaded()
+    ticker_refresh_task = asyncio.create_task(refresh_ticker_index_periodically())
+    ingestion_task = start_daily_ingestion()
+    # Warm restart: serve the entries cached before the restart right away
+    snapshot_task = start_cache_snapshots()
+    page_archive_gc_task = start_page_archive_gc()
+    logger.info("Worker started")
+    yield
+    ticker_refresh_task.cancel()
+    if page_archive_gc_task is not None:
+        page_archive_gc_task.cancel()
+    if snapshot_task is not None:
+        snapshot_task.cancel()
+        save_snapshot()
+    if ingestion_task is not None:
+        ingestion_task.cancel()
+    if holdings_listener is not None:
+        holdings_listener.stop()
+    await close_resources()
+    dispose_engine()
+    logger.info("Worker stopped")
+
+app = FastAPI(lifespan=lifespan)
+
+# Added first so that it is the innermost middleware, the other middlewares see the compressed responses
+app.middleware("http")(compression_middleware)
 
-app = FastAPI()
+
+@app.middleware("http")
+async def profile_requested(request: Request, call_next):
+    # Admins can profile a single request by sending an X-Profile header
+    if "X-Profile" in request.headers and get_profiler_enabled() and is_admin_request(request):
+        return await profile_request(request, call_next)
+    return await call_next(request)
+
+# Added last so that it is the outermost middleware and its total covers the profiled requests too
+app.middleware("http")(server_timing_middleware)
 
 # Define a custom exception handler for swagger documentation
 @app.exception_handler(StocksFastAPIError)
@@ -21,23 +93,211 @@ async def stocks_fastapi_exception_handler(request: Request, exc: StocksFastAPIE
     logger.error(
         f"An error occurred: {exc.message} - Details: {exc.error_detail}")
 
+    # Shed requests tell the clients when to come back
+    headers = {"Retry-After": str(exc.retry_after)} if isinstance(exc, ServiceOverloadedError) else None
     return JSONResponse(
         status_code=exc.status_code,
         content={
             "message": exc.message,
             "error_detail": exc.error_detail
-        }
+        },
+        headers=headers
     )
 
-@app.on_event("startup")
-def on_startup():
-    create_tables_if_not_exists()
+def apply_holding(stock: Stock) -> Stock:
+    """
+    Set the purchased amount and status of a Stock response from the in-memory holdings.
+    """
+    purchased_amount = holdings.get(stock.company_code)
+    stock.purchased_amount = Decimal("0.0") if purchased_amount is None else purchased_amount
+    stock.purchased_status = "Purchased" if purchased_amount is not None else "Not Purchased"
+    return stock
+
+
+def render_stock(compact: CompactStock, key: tuple | None = None) -> EncodedBody:
+    """
+    Get the response body of a stock with the current holding applied. The body and its compressed
+    variants are rendered once per cache entry, and again only when the holding has changed since.
+    The entry cached under the given key is then resized, its new body being counted in the cache budget.
+    """
+    purchased_amount = holdings.get(compact.company_code)
+    if compact.body is None or compact.body.tag != purchased_amount:
+        stock = apply_holding(compact.to_stock())
+        # Serialize here rather than in FastAPI so that the serialization stage is timed
+        with timed("serialize"):
+            content = stock.model_dump_json().encode("utf-8")
+        compact.set_body(EncodedBody(content, tag=purchased_amount))
+        if key is not None:
+            cache.resize(key, compact)
+    return compact.body
+
+
+def persist_competitors(stock_symbol: str, competitors_data: list[dict]):
+    """
+    Persist scraped competitors as edges of the competitor graph, with a session of its own
+    since it runs after the response has been sent.
+    """
+    db_session = SessionLocal()
+    try:
+        with timed("db"):
+            save_competitors(db_session, stock_symbol, competitors_data)
+    except Exception as e:
+        logger.error(f"Failed to save the competitors of {stock_symbol}: {e}")
+    finally:
+        db_session.close()
+
+
+async def build_stock(stock_symbol: str, background_tasks: BackgroundTasks | None = None) -> tuple[CompactStock, bool]:
+    """
+    Build the Stock response of a symbol from Polygon and MarketWatch data and store it in the cache.\n
+    Scraped competitors are persisted by a background task when one can be scheduled, inline otherwise.\n
+    RESPONSE: The compact stock, and whether it was built from stale MarketWatch data (it is not cached then).
+    """
+    # Use the last session whose data is available, Polygon has nothing for weekends and holidays
+    session_date = last_completed_session()
+    session_ttl = seconds_until_next_session_data()
+
+    # Daily bar of the session, from the price cache or the Polygon API
+    bar = price_cache.get(session_key(stock_symbol, session_date))
+    if bar is None:
+        logger.info(f"Fetching data for date: {session_date}")
+        polygon_data = await fetch_polygon_open_close_stock_data(stock_symbol, session_date.isoformat())
+        bar = bar_from_polygon(polygon_data)
+        price_cache.set(session_key(stock_symbol, session_date), bar, ttl=session_ttl)
+
+    # Scraped data, from its own cache or MarketWatch
+    stale = False
+    stale_marketwatch_data = scrape_cache.get_stale(stock_symbol)
+    marketwatch_data = scrape_cache.get(stock_symbol)
+    if marketwatch_data is None:
+        try:
+            marketwatch_data = await fetch_marketwatch_and_scrape_stock_data(stock_symbol)
+        except ServiceOverloadedError:
+            # Expired scraped data is better than no response when MarketWatch calls are shed
+            marketwatch_data = stale_marketwatch_data
+            if marketwatch_data is None:
+                raise
+            logger.warning(f"Using stale MarketWatch data for {stock_symbol}")
+            record_stale_served()
+            stale = True
+        else:
+            scrape_cache.set(stock_symbol, marketwatch_data, ttl=scraped_data_ttl())
+
+            # Persist the competitors as edges of the competitor graph, off the request path
+            competitors_data = marketwatch_data.get("competitors_data", [])
+            if background_tasks is not None:
+                background_tasks.add_task(persist_competitors, stock_symbol, competitors_data)
+            else:
+                await run_in_executor(persist_competitors, stock_symbol, competitors_data)
+
+    # Map the daily bar to StockValues
+    stock_values = StockValues(
+        open=bar["open"],
+        high=bar["high"],
+        low=bar["low"],
+        close=bar["close"]
+    )
+
+    # Map the performance data, computed from the stored daily closes when configured, scraped otherwise
+    if use_stored_bars():
+        # Scraped data is kept for days in this mode, its performance values would be outdated: windows the
+        # stored history does not cover yet have no value
+        try:
+            performance = await stored_performance(stock_symbol, bar)
+        except Exception as e:
+            logger.error(f"Failed to compute the performance of {stock_symbol} from stored bars: {e}")
+            performance = {}
+    else:
+        performance = marketwatch_data.get("performance_data", {})
+    performance_data = PerformanceData(
+        five_days=performance.get("five_days", None),
+        one_month=performance.get("one_month", None),
+        three_months=performance.get("three_months", None),
+        year_to_date=performance.get("year_to_date", None),
+        one_year=performance.get("one_year", None)
+    )
+
+    # Map MarketWatch competitors data
+    competitors = []
+    for comp in marketwatch_data.get("competitors_data", []):
+        market_cap_data = comp.get("market_cap", {})
+        competitor = Competitor(
+            name=comp.get("name"),
+            symbol=comp.get("symbol"),
+            market_cap=MarketCap(
+                currency=market_cap_data.get("currency"),
+                value=Decimal(market_cap_data.get("value", '0'))
+            )
+        )
+        competitors.append(competitor)
+
+    # Create the Stock instance
+    # Holdings change independently of the market data, they are applied when the stock is served
+    stock = Stock(
+        status="OK",
+        purchased_amount=float(0),
+        purchased_status="Not Purchased",
+        request_date=bar["session_date"],
+        company_code=stock_symbol.upper(),
+        company_name=marketwatch_data.get("company_name", "Unknown"),
+        stock_values=stock_values,
+        performance_data=performance_data,
+        competitors=competitors
+    )
+
+    compact = CompactStock.from_stock(stock)
+
+    # Responses built from stale data are not cached, the next request tries to refresh them
+    if stale:
+        return compact, stale
+
+    # Render the response body before caching the entry, so that its size is counted and hits reuse it
+    render_stock(compact)
+
+    # Store the stock data in the cache until either of its sources expires, or only briefly while the
+    # missing performance windows are being backfilled
+    ttl = min(session_ttl, scraped_data_ttl())
+    if use_stored_bars() and backfill_in_progress(stock_symbol):
+        ttl = min(ttl, get_cache_ttl())
+    cache.set(session_key(stock_symbol, session_date), compact, ttl=ttl)
+    logger.info(f"Cached data for {stock_symbol}")
+
+    return compact, stale
+
+
+def load_neighbor_symbols(stock_symbol: str) -> list[str]:
+    """
+    Get the competitor graph neighbors of a symbol with a short-lived session, released before any prefetch.
+    """
+    db_session = SessionLocal()
+    try:
+        with timed("db"):
+            return get_neighbor_symbols(db_session, stock_symbol)
+    finally:
+        db_session.close()
+
+
+async def prefetch_competitors(stock_symbol: str):
+    """
+    Warm the cache with the competitor graph neighbors of a symbol, since they are usually requested next.
+    """
+    session_date = last_completed_session()
+    neighbors = await run_in_executor(load_neighbor_symbols, stock_symbol)
+    # Skip neighbors already cached and foreign listings unknown to the ticker index
+    neighbors = [
+        symbol for symbol in neighbors
+        if session_key(symbol, session_date) not in cache and is_known_stock_symbol(symbol)
+    ][:get_competitor_prefetch_limit()]
+    for neighbor in neighbors:
+        try:
+            await build_stock(neighbor)
+            logger.info(f"Prefetched {neighbor} as a competitor of {stock_symbol}")
+        except Exception as e:
+            logger.warning(f"Failed to prefetch {neighbor} as a competitor of {stock_symbol}: {e}")
+
 
-# Define a cache with a size of 1000 and an expiration time of 60 seconds
-cache = TTLCache(maxsize=1000, ttl=60)
-    
 @app.get("/stock/{stock_symbol}", response_model=Stock, tags=["stock"])
-async def get_stock_by_symbol(stock_symbol: str, db_session: Session = Depends(get_db_session)):
+async def get_stock_by_symbol(stock_symbol: StockSymbol, request: Request, background_tasks: BackgroundTasks):
     """
     Retrieve stock data for a given stock symbol. \n
     Fetch stock values data from Polygon Open/Close API \n
@@ -46,80 +306,40 @@ async def get_stock_by_symbol(stock_symbol: str, db_session: Session = Depends(g
     :RESPONSE: A dictionary containing the stock data.
     """
     try:
+        headers = None
+        session_date = last_completed_session()
 
-        # Check if the stock is in the cache
-        if stock_symbol.upper() in cache:
+        # Check if the stock is in the cache, keeping the expired entry aside in case upstream calls are shed
+        key = session_key(stock_symbol, session_date)
+        stale_stock = cache.get_stale(key)
+        cached_stock = cache.get(key)
+        if cached_stock is not None:
             logger.info(f"Cache hit for {stock_symbol}")
-            return cache[stock_symbol]
         else:
             logger.info(f"Cache miss for {stock_symbol}")
+            try:
+                cached_stock, stale = await build_stock(stock_symbol, background_tasks)
+            except ServiceOverloadedError:
+                # Shed upstream calls: serve the expired entry of this session or the previous one, if still around
+                cached_stock = stale_stock
+                if cached_stock is None:
+                    key = session_key(stock_symbol, previous_trading_day(session_date))
+                    cached_stock = cache.get_stale(key)
+                if cached_stock is None:
+                    raise
+                logger.warning(f"Serving stale data for {stock_symbol}")
+                record_stale_served()
+                headers = {"X-Served-Stale": "true"}
+            else:
+                if stale:
+                    # Built from expired MarketWatch data, upstream calls are being shed: no prefetch either
+                    headers = {"X-Served-Stale": "true"}
+                elif get_competitor_prefetch_enabled():
+                    # Competitors are prefetched once the response has been sent
+                    background_tasks.add_task(prefetch_competitors, stock_symbol.upper())
 
-        # Check if the stock is already in the database to populate the purchased_amount and purchased_status
-        stock_check = db_session.query(Stocks).filter(
-            Stocks.stock_symbol == stock_symbol).first()
-        purchased_amount = float(
-            0) if not stock_check else stock_check.purchased_amount
-        purchased_status = "Purchased" if stock_check else "Not Purchased"
-
-        # Using yesterday's data because we don't have acess to today's data
-        yesterday = (date.today() - timedelta(days=1)).strftime('%Y-%m-%d')
-        logger.info(f"Fetching data for date: {yesterday}")
-
-        # Fetch data from Polygon API
-        polygon_data = await fetch_polygon_open_close_stock_data(stock_symbol, yesterday)
-
-        # Fetch data from MarketWatch
-        marketwatch_data = await fetch_marketwatch_and_scrape_stock_data(stock_symbol)
-
-        # Map Polygon data to StockValues
-        stock_values = StockValues(
-            open=polygon_data.get("open"),
-            high=polygon_data.get("high"),
-            low=polygon_data.get("low"),
-            close=polygon_data.get("close")
-        )
-
-        # Map MarketWatch performance data
-        performance = marketwatch_data.get("performance_data", {})
-        performance_data = PerformanceData(
-            five_days=performance.get("five_days", None),
-            one_month=performance.get("one_month", None),
-            three_months=performance.get("three_months", None),
-            year_to_date=performance.get("year_to_date", None),
-            one_year=performance.get("one_year", None)
-        )
-
-        # Map MarketWatch competitors data
-        competitors = []
-        for comp in marketwatch_data.get("competitors_data", []):
-            market_cap_data = comp.get("market_cap", {})
-            competitor = Competitor(
-                name=comp.get("name"),
-                market_cap=MarketCap(
-                    currency=market_cap_data.get("currency"),
-                    value=Decimal(market_cap_data.get("value", '0'))
-                )
-            )
-            competitors.append(competitor)
-
-        # Create the Stock instance
-        stock = Stock(
-            status=polygon_data.get("status"),
-            purchased_amount=purchased_amount,  # Assuming not purchased yet
-            purchased_status=purchased_status,
-            request_date=polygon_data.get("from"),
-            company_code=stock_symbol.upper(),
-            company_name=marketwatch_data.get("company_name", "Unknown"),
-            stock_values=stock_values,
-            performance_data=performance_data,
-            competitors=competitors
-        )
-
-        # Store the stock data in the cache
-        cache[stock_symbol.upper()] = stock
-        logger.info(f"Cached data for {stock_symbol}")
-
-        return stock
+        # Send the body rendered when the entry was cached, compressed with the coding the client accepts
+        return render_stock(cached_stock, key).response(request, headers)
 
     except StocksFastAPIError as e:
         logger.error(f"Error fetching stock data for {stock_symbol}: {e}")
@@ -138,7 +358,7 @@ When other function parameters that are not part of the path parameters are decl
 So, to read the request body, a parameter must be declared with the Request type or the Pydantic model type.
 """
 @app.post("/stock/{stock_symbol}", response_model=AmountResponse, status_code=201, tags=["stock"]) # Modified to return 201 status code when successful, according to assignment requirements
-async def update_stock_amount(stock_symbol: str, amount: Amount, db_session: Session = Depends(get_db_session)):
+async def update_stock_amount(stock_symbol: StockSymbol, amount: Amount, db_session: Session = Depends(get_db_session)):
     """
     Update stock purchase amount, persist the data in a database and return a message presenting the amount purchased for given stock symbol.\n
     :{stock_symbol}: The symbol of the stock to fetch data for, e.g. AAPL.\n
@@ -161,19 +381,183 @@ async def update_stock_amount(stock_symbol: str, amount: Amount, db_session: Ses
         # If the stock is found, update the amount
         stock.purchased_amount += Decimal(amount.amount)
 
+    # Announce the change to the other workers, committed along with it
+    purchased_amount = Decimal(stock.purchased_amount).quantize(Decimal("0.0001"))
+    notify_holding_changed(db_session, stock_symbol, purchased_amount)
     db_session.commit()
+    holdings.set(stock_symbol, purchased_amount)
     logger.info(f"Updated purchased amount for {stock_symbol}")
 
-    # Invalidate cache for the stock symbol
-    if stock_symbol in cache:
-        del cache[stock_symbol]
-        logger.info(f"Invalidated cache for {stock_symbol}")
-
     return {"message": f"{amount.amount} units of stock {stock_symbol} were added to your stock record"}
 
 
+@app.post("/holdings/import", response_model=HoldingsImportResult, tags=["holdings"],
+          dependencies=[Depends(require_admin)])
+async def import_holdings(request: Request, format: HoldingsFormat = "csv", mode: ImportMode = "set"):
+    """
+    Import holdings in bulk from a streamed CSV or NDJSON request body, in a single transaction.\n
+    CSV bodies start with a "stock_symbol,purchased_amount" header, NDJSON lines are {"stock_symbol": ..., "purchased_amount": ...} objects.\n
+    :format: csv or ndjson.\n
+    :mode: set to replace the stored amounts, add to add to them.\n
+    Requires the X-Admin-Token header.\n
+    :RESPONSE: The number of imported rows and the import throughput. Nothing is imported when a row is invalid.
+    """
+    parser = HoldingsParser(format)
+    async for block in aiter_blocks(request.stream()):
+        await run_in_executor(parser.feed_block, block)
+    return await run_in_executor(merge_holdings, parser, mode)
+
+
+@app.get("/holdings/export", tags=["holdings"])
+async def export_holdings(format: HoldingsFormat = "csv"):
+    """
+    Stream every holding as CSV or NDJSON, in constant memory whatever the number of holdings.\n
+    :format: csv or ndjson.\n
+    :RESPONSE: The holdings, in the import format.
+    """
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(iter_export(format), media_type=media_type)
+
+
+@app.get("/portfolio", response_model=Portfolio, tags=["portfolio"])
+async def get_portfolio(db_session: Session = Depends(get_db_session)):
+    """
+    Value every stock holding of the database in a single request.\n
+    Prices come from the cache or the stored daily bars, only missing ones are fetched from Polygon.\n
+    :RESPONSE: Per-position market value, session P&L and weight, with the portfolio totals.
+    """
+    try:
+        return await value_portfolio(db_session, last_completed_session())
+    except StocksFastAPIError as e:
+        logger.error(f"Error valuing portfolio: {e}")
+        raise e
+    except Exception as e:
+        logger.exception(f"Unexpected error: {e}")
+        raise StocksFastAPIError(
+            message=f"An unexpected error occurred. {e}",
+            error_detail={"error": str(e)},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@app.get("/competitors/{stock_symbol}", response_model=List[CompetitorEdge], tags=["competitors"])
+async def get_stored_competitors(stock_symbol: StockSymbol, db_session: Session = Depends(get_db_session)):
+    """
+    List the competitors of a stock stored in the competitor graph, without scraping MarketWatch.\n
+    :{stock_symbol}: The symbol of the stock, e.g. AAPL.\n
+    :RESPONSE: The competitors listed by the stock, largest market cap first.
+    """
+    return get_competitor_edges(db_session, stock_symbol)
+
+
+@app.get("/competitors/{stock_symbol}/listed_by", response_model=List[CompetitorEdge], tags=["competitors"])
+async def get_stocks_listing_competitor(stock_symbol: StockSymbol, db_session: Session = Depends(get_db_session)):
+    """
+    List the stocks that list the given stock as one of their competitors.\n
+    :{stock_symbol}: The symbol of the stock, e.g. MSFT.\n
+    :RESPONSE: The competitor graph edges pointing to the stock.
+    """
+    return get_listed_by(db_session, stock_symbol)
+
+
+@app.get("/competitors/{stock_symbol}/peers", response_model=PeersResponse, tags=["competitors"])
+async def get_stock_peers(stock_symbol: StockSymbol, limit: int = 20, db_session: Session = Depends(get_db_session)):
+    """
+    List the sector peers of a stock from the competitor graph: its competitors, the stocks listing it and the stocks listing the same competitors.\n
+    :{stock_symbol}: The symbol of the stock, e.g. AAPL.\n
+    :RESPONSE: The peers ranked by the number of connections they share with the stock.
+    """
+    return {"stock_symbol": stock_symbol.upper(), "peers": get_peers(db_session, stock_symbol, limit)}
+
+
+@app.get("/tickers/search", response_model=List[Ticker], tags=["tickers"])
+async def search_tickers(prefix: str, limit: int = 10):
+    """
+    Autocomplete stock symbols from the local ticker reference index.\n
+    :prefix: The beginning of the symbol, e.g. AA.\n
+    :RESPONSE: The matching tickers with their company names, in alphabetical order.
+    """
+    return get_ticker_index().search(prefix, min(limit, 100))
+
+
+@app.get("/metrics", tags=["metrics"])
+async def get_metrics():
+    """
+    Expose the internal counters of this worker.\n
+    :RESPONSE: A dictionary of counters grouped by component.
+    """
+    return {
+        "cache": cache.stats(),
+        "price_cache": price_cache.stats(),
+        "scrape_cache": scrape_cache.stats(),
+        "negative_cache": negative_cache.stats(),
+        "performance_cache": performance_cache.stats(),
+        "holdings": holdings.stats(),
+        "holdings_transfers": transfer_stats,
+        "admission": admission_stats(),
+        "polygon_keys": polygon_key_stats(),
+        "memory": memory_stats(),
+        "timing": timing_stats()
+    }
+
+
+@app.post("/admin/profile", response_class=PlainTextResponse, tags=["admin"],
+          dependencies=[Depends(require_admin), Depends(require_profiler)])
+async def profile_worker(seconds: float = 10):
+    """
+    Profile the worker serving the request for a time window, sampling the stacks of its event loop.\n
+    Send the X-Profile header along with the X-Admin-Token header on any request to profile that request only.\n
+    :seconds: Length of the window, capped by PROFILER_MAX_SECONDS.\n
+    :RESPONSE: The sampled stacks in folded format, e.g. for flamegraph.pl or speedscope.
+    """
+    return await profile_window(seconds)
+
+
+@app.get("/admin/profile/{profile_id}", response_class=PlainTextResponse, tags=["admin"],
+         dependencies=[Depends(require_admin), Depends(require_profiler)])
+async def get_request_profile(profile_id: str):
+    """
+    Fetch the profile of a single request, once.\n
+    :{profile_id}: The X-Profile-Id header of the profiled request's response.\n
+    :RESPONSE: The sampled stacks in folded format.
+    """
+    return pop_stored_profile(profile_id)
+
+
+# Snapshots block while the traced allocations are copied, these endpoints run in the threadpool
+@app.post("/admin/memory/snapshots", tags=["admin"], dependencies=[Depends(require_admin)])
+def create_memory_snapshot(limit: int = 10):
+    """
+    Take a tracemalloc snapshot of the worker serving the request, starting the tracing if needed.\n
+    :limit: Number of top allocations returned.\n
+    :RESPONSE: The snapshot id, the RSS, the traced memory and the top allocations.
+    """
+    return take_snapshot(min(limit, 100))
+
+
+@app.get("/admin/memory/snapshots", tags=["admin"], dependencies=[Depends(require_admin)])
+def get_memory_snapshots():
+    """
+    List the memory snapshots kept by the worker serving the request.\n
+    :RESPONSE: The snapshots with their RSS and traced memory.
+    """
+    return list_snapshots()
+
+
+@app.get("/admin/memory/diff", tags=["admin"], dependencies=[Depends(require_admin)])
+def get_memory_diff(first: str, second: str, group_by: GroupBy = "lineno", limit: int = 20):
+    """
+    Compare two memory snapshots of the worker serving the request.\n
+    :first: Id of the earlier snapshot.\n
+    :second: Id of the later snapshot.\n
+    :group_by: Group the allocations by lineno, filename or traceback.\n
+    :RESPONSE: The RSS and traced memory growth, and the allocations that grew the most in between.
+    """
+    return diff_snapshots(first, second, group_by, min(limit, 100))
+
+
 @app.get("/stock/open_close/{stock_symbol}/{date}", response_model=PolygonOpenCloseStockDataResponse, tags=["polygon"])
-async def get_open_close_stock_values_polygon_api(stock_symbol: str, date: str):
+async def get_open_close_stock_values_polygon_api(stock_symbol: StockSymbol, date: str):
     """
     Fetch open/close stock data from the Polygon API for the given stock symbol and date.\n
     :{stock_symbol}: The symbol of the stock to fetch data for, e.g. AAPL.\n
@@ -196,7 +580,7 @@ async def get_open_close_stock_values_polygon_api(stock_symbol: str, date: str):
 
 
 @app.get("/stock/marketwatch/{stock_symbol}", response_model=MarketWatchStockDataResponse, tags=["marketwatch"])
-async def get_marketwatch_stock_data_scrape(stock_symbol: str):
+async def get_marketwatch_stock_data_scrape(stock_symbol: StockSymbol):
     """
     Fetch marketwatch stock data through data scraping given stock symbol.\n
     :{stock_symbol}: The symbol of the stock to fetch data for, e.g. AAPL.\n
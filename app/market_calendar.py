@@ -0,0 +1,132 @@
+# app/market_calendar.py
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+from app.utils import get_session_data_delay
+
+# US equity sessions (NYSE/Nasdaq) follow New York time
+MARKET_TIMEZONE = ZoneInfo("America/New_York")
+REGULAR_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    first = date(year, month, 1)
+    return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+
+def _last_weekday(year: int, month: int, weekday: int) -> date:
+    last = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter_sunday(year: int) -> date:
+    # Anonymous Gregorian algorithm
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _observed(holiday: date) -> date:
+    # Holidays falling on a Saturday are observed on Friday, on a Sunday on Monday
+    if holiday.weekday() == 5:
+        return holiday - timedelta(days=1)
+    if holiday.weekday() == 6:
+        return holiday + timedelta(days=1)
+    return holiday
+
+
+@lru_cache(maxsize=64)
+def market_holidays(year: int) -> frozenset:
+    """
+    Full-day market holidays of a year, following the NYSE rules.
+    """
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),            # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),            # Washington's Birthday
+        _easter_sunday(year) - timedelta(days=2),  # Good Friday
+        _last_weekday(year, 5, 0),              # Memorial Day
+        _observed(date(year, 7, 4)),            # Independence Day
+        _nth_weekday(year, 9, 0, 1),            # Labor Day
+        _nth_weekday(year, 11, 3, 4),           # Thanksgiving Day
+        _observed(date(year, 12, 25)),          # Christmas Day
+    }
+    # New Year's Day is not observed on the previous Friday when it falls on a Saturday
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+    return frozenset(holidays)
+
+
+def is_trading_day(day: date) -> bool:
+    return day.weekday() < 5 and day not in market_holidays(day.year)
+
+
+def _early_closes(year: int) -> set:
+    early_closes = {_nth_weekday(year, 11, 3, 4) + timedelta(days=1)}  # Day after Thanksgiving
+    if date(year, 7, 4).weekday() in (1, 2, 3, 4):
+        early_closes.add(date(year, 7, 3))
+    early_closes.add(date(year, 12, 24))
+    return {day for day in early_closes if is_trading_day(day)}
+
+
+def session_close(day: date) -> datetime:
+    """
+    Closing time of a trading day, in the market timezone.
+    """
+    close = EARLY_CLOSE if day in _early_closes(day.year) else REGULAR_CLOSE
+    return datetime.combine(day, close, tzinfo=MARKET_TIMEZONE)
+
+
+def previous_trading_day(day: date) -> date:
+    day -= timedelta(days=1)
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+
+def next_trading_day(day: date) -> date:
+    day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return day
+
+
+def _now() -> datetime:
+    return datetime.now(MARKET_TIMEZONE)
+
+
+def _data_available_at(day: date) -> datetime:
+    # Daily data of a session is published by the upstreams a little after the close
+    return session_close(day) + timedelta(seconds=get_session_data_delay())
+
+
+def last_completed_session(now: datetime | None = None) -> date:
+    """
+    Date of the last session whose daily data is available.
+    """
+    now = (now or _now()).astimezone(MARKET_TIMEZONE)
+    today = now.date()
+    if is_trading_day(today) and now >= _data_available_at(today):
+        return today
+    return previous_trading_day(today)
+
+
+def seconds_until_next_session_data(now: datetime | None = None) -> float:
+    """
+    Seconds until the daily data of the next session becomes available, i.e. how long the data of the
+    last completed session stays current.
+    """
+    now = (now or _now()).astimezone(MARKET_TIMEZONE)
+    next_session = next_trading_day(last_completed_session(now))
+    return max((_data_available_at(next_session) - now).total_seconds(), 1.0)
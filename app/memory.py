@@ -0,0 +1,154 @@
+# app/memory.py
+import gc
+import itertools
+import os
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Literal
+from app.exceptions import InvalidAPIRequestError
+from app.logger import logger
+from app.utils import get_memory_trace_enabled, get_memory_trace_frames, get_memory_max_snapshots
+
+try:
+    import resource
+except ImportError:  # Unix only, the RSS is read from /proc on Linux anyway
+    resource = None
+
+GroupBy = Literal["lineno", "filename", "traceback"]
+
+# Allocations of the tracing itself and of the import machinery are noise in the diffs
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>")
+)
+
+# Snapshots taken in this worker, by id. Past MEMORY_MAX_SNAPSHOTS the oldest ones are dropped, except
+# the first one, kept as the baseline of the growth since the worker started being observed. Ids are
+# "<pid>-<number>", unique across the workers, whose snapshots are not shared
+_snapshots: OrderedDict[str, dict] = OrderedDict()
+_snapshot_ids = itertools.count(1)
+
+
+def rss_bytes() -> int:
+    """
+    Resident set size of the worker, from /proc on Linux, its peak from getrusage elsewhere.
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        if resource is None:
+            return 0
+        # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def start_tracing():
+    """
+    Start tracing the allocations (done in the app lifespan when MEMORY_TRACE_ENABLED is set). Tracing
+    costs memory and CPU, and only the allocations made after it started appear in the snapshots.
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(get_memory_trace_frames())
+        logger.info(f"Tracing allocations with {get_memory_trace_frames()} frames")
+
+
+def start_tracing_if_enabled():
+    if get_memory_trace_enabled():
+        start_tracing()
+
+
+def _statistics(statistics, limit: int) -> list[dict]:
+    return [
+        {
+            # Grouped by traceback, the location is the allocating stack, most recent call last
+            "location": [f"{frame.filename}:{frame.lineno}" for frame in reversed(statistic.traceback)]
+            if len(statistic.traceback) > 1 else f"{statistic.traceback[0].filename}:{statistic.traceback[0].lineno}",
+            "size_bytes": statistic.size,
+            "count": statistic.count,
+            **({"size_diff_bytes": statistic.size_diff, "count_diff": statistic.count_diff}
+               if hasattr(statistic, "size_diff") else {})
+        }
+        for statistic in statistics[:limit]
+    ]
+
+
+def take_snapshot(limit: int = 10) -> dict:
+    """
+    Take a tracemalloc snapshot of the worker, starting the tracing first if needed.\n
+    RESPONSE: The snapshot id with the RSS, the traced memory and the top allocations at that time.
+    """
+    start_tracing()
+    gc.collect()
+    snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+    traced_bytes, traced_peak_bytes = tracemalloc.get_traced_memory()
+    snapshot_id = f"{os.getpid()}-{next(_snapshot_ids)}"
+    summary = {
+        "id": snapshot_id,
+        # Snapshots are per worker, the pid tells which worker answered
+        "pid": os.getpid(),
+        "taken_at": time.time(),
+        "rss_bytes": rss_bytes(),
+        "traced_bytes": traced_bytes,
+        "traced_peak_bytes": traced_peak_bytes
+    }
+    _snapshots[snapshot_id] = {**summary, "snapshot": snapshot}
+    # The baseline and the latest two snapshots are always kept, for growth since start and since last time
+    while len(_snapshots) > max(get_memory_max_snapshots(), 3):
+        del _snapshots[list(_snapshots)[1]]
+    return {**summary, "top": _statistics(snapshot.statistics("lineno"), limit)}
+
+
+def list_snapshots() -> list[dict]:
+    return [{key: value for key, value in stored.items() if key != "snapshot"} for stored in _snapshots.values()]
+
+
+def _get_snapshot(snapshot_id: str) -> dict:
+    stored = _snapshots.get(snapshot_id)
+    if stored is not None:
+        return stored
+    pid = snapshot_id.partition("-")[0]
+    if pid != str(os.getpid()):
+        raise InvalidAPIRequestError(
+            message=f"Memory snapshot {snapshot_id} was taken by another worker.",
+            error_detail={"error": f"Worker {os.getpid()} served this request, snapshots are kept per worker. "
+                                   "Compare snapshots on a server running a single worker."},
+            status_code=409
+        )
+    raise InvalidAPIRequestError(
+        message=f"Unknown memory snapshot {snapshot_id}.",
+        error_detail={"error": f"The snapshots kept are {list(_snapshots)}."},
+        status_code=404
+    )
+
+
+def diff_snapshots(first_id: str, second_id: str, group_by: GroupBy = "lineno", limit: int = 20) -> dict:
+    """
+    Compare two snapshots of the worker.\n
+    RESPONSE: The RSS and traced memory growth, and the allocations that grew the most in between.
+    """
+    first, second = _get_snapshot(first_id), _get_snapshot(second_id)
+    statistics = second["snapshot"].compare_to(first["snapshot"], group_by)
+    return {
+        "first": first_id,
+        "second": second_id,
+        "seconds": round(second["taken_at"] - first["taken_at"], 3),
+        "rss_diff_bytes": second["rss_bytes"] - first["rss_bytes"],
+        "traced_diff_bytes": second["traced_bytes"] - first["traced_bytes"],
+        "top": _statistics(statistics, limit)
+    }
+
+
+def memory_stats() -> dict:
+    traced_bytes, traced_peak_bytes = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (None, None)
+    return {
+        "rss_bytes": rss_bytes(),
+        "tracing": tracemalloc.is_tracing(),
+        "traced_bytes": traced_bytes,
+        "traced_peak_bytes": traced_peak_bytes,
+        "gc_counts": gc.get_count(),
+        "snapshots": list(_snapshots)
+    }
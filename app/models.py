@@ -1,6 +1,6 @@
 # app/models.py
 from app.data_base import Base
-from sqlalchemy import Column, Integer, String, DECIMAL, DateTime, func
+from sqlalchemy import Column, Integer, BigInteger, String, DECIMAL, Date, DateTime, UniqueConstraint, func
 
 class Stocks(Base):
     __tablename__ = "stocks"
@@ -9,4 +9,46 @@ class Stocks(Base):
     stock_symbol = Column(String, index=True, unique=True)
     purchased_amount = Column(DECIMAL(10, 4))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class DailyBars(Base):
+    __tablename__ = "daily_bars"
+    __table_args__ = (
+        UniqueConstraint("stock_symbol", "session_date", name="uq_daily_bars_symbol_session"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    stock_symbol = Column(String, index=True, nullable=False)
+    session_date = Column(Date, index=True, nullable=False)
+    open = Column(DECIMAL(18, 4))
+    high = Column(DECIMAL(18, 4))
+    low = Column(DECIMAL(18, 4))
+    close = Column(DECIMAL(18, 4))
+    volume = Column(BigInteger)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class IngestedSessions(Base):
+    __tablename__ = "ingested_sessions"
+
+    # Written in the same transaction as the session's bars: a few bars stored by other paths do not mark a session as ingested
+    session_date = Column(Date, primary_key=True)
+    bar_count = Column(Integer, nullable=False)
+    ingested_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class CompetitorEdges(Base):
+    __tablename__ = "competitor_edges"
+    __table_args__ = (
+        UniqueConstraint("stock_symbol", "competitor_name", name="uq_competitor_edges_symbol_name"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    stock_symbol = Column(String, index=True, nullable=False)
+    competitor_name = Column(String, nullable=False)
+    # Indexed for reverse lookups ("who lists X as a competitor")
+    competitor_symbol = Column(String, index=True)
+    market_cap_currency = Column(String)
+    market_cap_value = Column(DECIMAL(30, 2))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
\ No newline at end of file
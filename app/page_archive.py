@@ -0,0 +1,280 @@
+# app/page_archive.py
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from app.logger import logger
+from app.resources import run_in_executor
+from app.utils import (
+    get_page_archive_dir,
+    get_page_archive_enabled,
+    get_page_archive_compression,
+    get_page_archive_max_versions,
+    get_page_archive_gc_interval
+)
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, pages are gzipped without it
+    zstandard = None
+
+# Local archive of the fetched MarketWatch pages, laid out as:
+#   objects/<2 first hex digits>/<sha256 of the page>.html.<zst|gz>   compressed pages, content-addressed
+#   refs/<SYMBOL>/<fetch time in ns>-<sha256>.json                 one file per archived version of a symbol's page
+#   parsed/<SYMBOL>.json                                             last successful parse of a symbol's page
+# Identical pages are stored once, and every file is written atomically so that concurrent workers never read partial files.
+# Versions being separate files, concurrent fetches of a symbol never lose each other's versions. Objects that no
+# version references anymore are removed by collect_garbage.
+
+# Unreferenced objects younger than this are kept, they may be about to be referenced by a worker storing them
+GC_GRACE_SECONDS = 3600
+
+
+def _compression() -> str:
+    compression = get_page_archive_compression()
+    if compression == "zstd" and zstandard is None:
+        return "gzip"
+    return compression
+
+
+def _compress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(data: bytes, extension: str) -> bytes:
+    if extension == "zst":
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is required to read zstd archived pages.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _path(*parts: str) -> str:
+    return os.path.join(get_page_archive_dir(), *parts)
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(data)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def _read_json(path: str):
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def _object_path(digest: str) -> str | None:
+    for extension in ("zst", "gz"):
+        path = _path("objects", digest[:2], f"{digest}.html.{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _ref_names(stock_symbol: str) -> list[str]:
+    # Reference file names sort by fetch time, latest first
+    try:
+        return sorted((name for name in os.listdir(_path("refs", stock_symbol)) if name.endswith(".json")),
+                      reverse=True)
+    except FileNotFoundError:
+        return []
+
+
+def _ref_digest(name: str) -> str:
+    return name[:-len(".json")].split("-", 1)[1]
+
+
+def _unlink(path: str) -> int:
+    # Another worker may have removed the file already
+    try:
+        size = os.path.getsize(path)
+        os.unlink(path)
+        return size
+    except FileNotFoundError:
+        return 0
+
+
+def store_page(stock_symbol: str, url: str, html: str) -> str | None:
+    """
+    Archive a fetched page and reference it as the latest version of the symbol's page. Versions beyond
+    PAGE_ARCHIVE_MAX_VERSIONS and older versions of the same page are dereferenced.\n
+    RESPONSE: The digest of the page, or None when the archive is disabled.
+    """
+    if not get_page_archive_enabled():
+        return None
+    data = html.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    object_path = _object_path(digest)
+    if object_path is not None:
+        try:
+            # A fresh modification time keeps the garbage collection away until the new version references it
+            os.utime(object_path)
+        except FileNotFoundError:
+            object_path = None
+    if object_path is None:
+        compression = _compression()
+        extension = "zst" if compression == "zstd" else "gz"
+        _write_atomic(_path("objects", digest[:2], f"{digest}.html.{extension}"), _compress(data, compression))
+
+    stock_symbol = stock_symbol.upper()
+    version = {"digest": digest, "url": url, "fetched_at": datetime.now(timezone.utc).isoformat()}
+    _write_atomic(_path("refs", stock_symbol, f"{time.time_ns():020d}-{digest}.json"),
+                  json.dumps(version).encode("utf-8"))
+
+    kept = set()
+    for name in _ref_names(stock_symbol):
+        if _ref_digest(name) in kept or len(kept) >= get_page_archive_max_versions():
+            _unlink(_path("refs", stock_symbol, name))
+        else:
+            kept.add(_ref_digest(name))
+    return digest
+
+
+def load_page(digest: str) -> str:
+    path = _object_path(digest)
+    if path is None:
+        raise FileNotFoundError(f"Page {digest} is not archived.")
+    with open(path, "rb") as file:
+        return _decompress(file.read(), path.rsplit(".", 1)[1]).decode("utf-8")
+
+
+def page_versions(stock_symbol: str) -> list[dict]:
+    """
+    Get the archived versions of a symbol's page, latest first.
+    """
+    stock_symbol = stock_symbol.upper()
+    versions, seen = [], set()
+    for name in _ref_names(stock_symbol):
+        version = _read_json(_path("refs", stock_symbol, name))
+        if version is not None and version["digest"] not in seen:
+            seen.add(version["digest"])
+            versions.append(version)
+    return versions
+
+
+def save_last_good_parse(stock_symbol: str, digest: str | None, data: dict):
+    if not get_page_archive_enabled():
+        return
+    record = {"digest": digest, "parsed_at": datetime.now(timezone.utc).isoformat(), "data": data}
+    _write_atomic(_path("parsed", f"{stock_symbol.upper()}.json"), json.dumps(record, default=str).encode("utf-8"))
+
+
+def load_last_good_parse(stock_symbol: str) -> dict | None:
+    """
+    Get the last successful parse of a symbol's page, with the digest of the parsed page.
+    """
+    if not get_page_archive_enabled():
+        return None
+    return _read_json(_path("parsed", f"{stock_symbol.upper()}.json"))
+
+
+def archived_symbols() -> list[str]:
+    try:
+        return sorted(name for name in os.listdir(_path("refs")) if os.path.isdir(_path("refs", name)))
+    except FileNotFoundError:
+        return []
+
+
+def collect_garbage(grace_seconds: float = GC_GRACE_SECONDS) -> dict:
+    """
+    Remove the archived pages that no version and no last good parse references anymore.\n
+    RESPONSE: The number of pages removed and kept, and the bytes freed.
+    """
+    referenced = set()
+    for stock_symbol in archived_symbols():
+        referenced.update(_ref_digest(name) for name in _ref_names(stock_symbol))
+    try:
+        parsed_names = os.listdir(_path("parsed"))
+    except FileNotFoundError:
+        parsed_names = []
+    for name in parsed_names:
+        record = _read_json(_path("parsed", name)) if name.endswith(".json") else None
+        if record is not None and record.get("digest"):
+            referenced.add(record["digest"])
+
+    cutoff = time.time() - grace_seconds
+    removed = kept = freed_bytes = 0
+    for directory, _, names in os.walk(_path("objects")):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                recent = os.path.getmtime(path) >= cutoff
+            except FileNotFoundError:
+                continue
+            # Leftover temporary files of interrupted writes are collected too
+            if name.split(".", 1)[0] in referenced or recent:
+                kept += 1
+                continue
+            freed_bytes += _unlink(path)
+            removed += 1
+    logger.info(f"Removed {removed} unreferenced archived pages ({freed_bytes} bytes), kept {kept}")
+    return {"removed": removed, "kept": kept, "freed_bytes": freed_bytes}
+
+
+async def collect_garbage_periodically():
+    """
+    Background task of the app lifespan that bounds the disk usage of the archive.
+    """
+    while True:
+        await asyncio.sleep(get_page_archive_gc_interval())
+        try:
+            await run_in_executor(collect_garbage)
+        except Exception as e:
+            logger.error(f"Failed to collect the page archive garbage: {e}")
+
+
+def start_page_archive_gc() -> asyncio.Task | None:
+    if not get_page_archive_enabled():
+        return None
+    return asyncio.create_task(collect_garbage_periodically())
+
+
+def reparse_archive(parse, stock_symbols: list[str] | None = None) -> dict:
+    """
+    Parse the latest archived page of every symbol again, without any network call, e.g. after the
+    parser was fixed for a MarketWatch markup change. Successful parses become the last good parses.\n
+    RESPONSE: The symbols parsed and the ones that failed, with their errors.
+    """
+    parsed, failed = [], {}
+    for stock_symbol in stock_symbols or archived_symbols():
+        versions = page_versions(stock_symbol)
+        if not versions:
+            failed[stock_symbol] = "No archived page."
+            continue
+        digest = versions[0]["digest"]
+        try:
+            data = parse(load_page(digest), stock_symbol)
+        except Exception as e:
+            failed[stock_symbol] = getattr(e, "message", str(e))
+            continue
+        save_last_good_parse(stock_symbol, digest, data)
+        parsed.append(stock_symbol)
+    logger.info(f"Re-parsed {len(parsed)} archived pages, {len(failed)} failed")
+    return {"parsed": parsed, "failed": failed}
+
+
+if __name__ == "__main__":
+    # Re-parse archived pages: python -m app.page_archive [SYMBOL ...]
+    # Remove unreferenced pages: python -m app.page_archive --gc
+    if sys.argv[1:] == ["--gc"]:
+        print(json.dumps(collect_garbage(), indent=2))
+    else:
+        from app.services import parse_marketwatch_page
+        print(json.dumps(reparse_archive(parse_marketwatch_page, [s.upper() for s in sys.argv[1:]] or None), indent=2))
@@ -0,0 +1,233 @@
+# app/performance.py
+import asyncio
+import calendar
+import sys
+from datetime import date, datetime, timedelta
+import httpx
+import numpy as np
+from app.admission import admit
+from app.bars import save_bars
+from app.cache import SizedCache, session_key
+from app.data_base import SessionLocal
+from app.exceptions import ExternalAPIError
+from app.logger import logger
+from app.market_calendar import MARKET_TIMEZONE, seconds_until_next_session_data, last_completed_session
+from app.models import DailyBars
+from app.polygon_keys import polygon_get
+from app.resources import http_client, run_in_executor
+from app.timing import timed
+from app.utils import (
+    get_performance_source,
+    get_performance_backfill_enabled,
+    get_performance_cache_max_bytes,
+    get_marketwatch_cache_ttl,
+    get_marketwatch_profile_cache_ttl,
+    get_cache_ttl,
+    get_polygon_api_url
+)
+
+PERFORMANCE_FIELDS = ("five_days", "one_month", "three_months", "year_to_date", "one_year")
+
+# Sessions back for the "5 Day" return, the other windows are calendar based
+FIVE_DAYS_SESSIONS = 5
+
+# A reference close older than its target date by more than this is a gap in the stored series, not a match
+MAX_REFERENCE_GAP = np.timedelta64(7, "D")
+
+# Computed performance of a symbol for a session, keyed like the price cache
+performance_cache = SizedCache(max_bytes=get_performance_cache_max_bytes(), ttl=get_cache_ttl())
+
+# Symbols whose bar history is being backfilled, so that a symbol is backfilled once at a time
+_backfills_in_progress: set[str] = set()
+
+# References to the running backfill tasks, so that they are not garbage collected before completing
+_backfill_tasks: set[asyncio.Task] = set()
+
+# Session up to which each symbol was last backfilled. Windows still missing after it are gaps of the
+# upstream history (e.g. a symbol listed less than a year ago), not worth backfilling again
+_backfilled_sessions: dict[str, date] = {}
+
+
+def use_stored_bars() -> bool:
+    return get_performance_source() == "bars"
+
+
+def scraped_data_ttl() -> int:
+    """
+    TTL of scraped MarketWatch data: when performance comes from the stored bars, the scrape only
+    provides the company name and competitors, which change rarely and are kept much longer.
+    """
+    return get_marketwatch_profile_cache_ttl() if use_stored_bars() else get_marketwatch_cache_ttl()
+
+
+def _months_back(day: date, months: int) -> date:
+    month_index = day.year * 12 + day.month - 1 - months
+    year, month = divmod(month_index, 12)
+    return date(year, month + 1, min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def compute_performance(dates: np.ndarray, closes: np.ndarray) -> dict:
+    """
+    Compute the returns of the last close over the MarketWatch performance windows, in one vectorized
+    lookup of every window's reference close in the date-sorted series.\n
+    RESPONSE: A dictionary of returns as fractions (0.0289 for 2.89%), None where the series is too short.
+    """
+    if len(dates) == 0:
+        return dict.fromkeys(PERFORMANCE_FIELDS)
+
+    as_of = dates[-1].astype(date)
+    targets = np.array([
+        _months_back(as_of, 1),
+        _months_back(as_of, 3),
+        date(as_of.year - 1, 12, 31),
+        _months_back(as_of, 12)
+    ], dtype="datetime64[D]")
+    # Position of the last session on or before each target date, -1 when the series starts after it
+    positions = np.searchsorted(dates, targets, side="right") - 1
+    valid = (positions >= 0) & (targets - dates[np.maximum(positions, 0)] <= MAX_REFERENCE_GAP)
+
+    positions = np.concatenate(([len(dates) - 1 - FIVE_DAYS_SESSIONS], positions))
+    valid = np.concatenate(([positions[0] >= 0], valid))
+    references = closes[np.maximum(positions, 0)]
+    valid &= references > 0
+    returns = closes[-1] / np.where(valid, references, 1.0) - 1
+
+    return {
+        field: float(value) if is_valid else None
+        for field, value, is_valid in zip(PERFORMANCE_FIELDS, returns, valid)
+    }
+
+
+def load_close_series(stock_symbol: str, session_date: date) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Load the stored closes of a symbol covering the performance windows up to a session.\n
+    RESPONSE: The session dates (datetime64[D]) and closes (float64), sorted by date.
+    """
+    start = _months_back(session_date, 12) - timedelta(days=10)
+    db_session = SessionLocal()
+    try:
+        with timed("db"):
+            rows = db_session.query(DailyBars.session_date, DailyBars.close).filter(
+                DailyBars.stock_symbol == stock_symbol.upper(),
+                DailyBars.session_date >= start,
+                DailyBars.session_date <= session_date).order_by(DailyBars.session_date).all()
+    finally:
+        db_session.close()
+    dates = np.array([row[0] for row in rows], dtype="datetime64[D]")
+    closes = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+    return dates, closes
+
+
+async def stored_performance(stock_symbol: str, bar: dict) -> dict:
+    """
+    Get the performance of a symbol computed from its stored daily bars, the given bar being the
+    latest session. Missing windows trigger a background backfill of the symbol's history, once per session.\n
+    RESPONSE: A dictionary of returns, None for the windows the stored history does not cover.
+    """
+    key = session_key(stock_symbol, bar["session_date"])
+    performance = performance_cache.get(key)
+    if performance is not None:
+        return performance
+
+    dates, closes = await run_in_executor(load_close_series, stock_symbol, bar["session_date"])
+    if len(dates) == 0 or dates[-1] < np.datetime64(bar["session_date"], "D"):
+        dates = np.append(dates, np.datetime64(bar["session_date"], "D"))
+        closes = np.append(closes, float(bar["close"]))
+    performance = compute_performance(dates, closes)
+
+    if None in performance.values() and _backfilled_sessions.get(stock_symbol.upper()) != bar["session_date"]:
+        # Not cached, computed again once the history is backfilled
+        start_backfill(stock_symbol, bar["session_date"])
+    else:
+        performance_cache.set(key, performance, ttl=seconds_until_next_session_data())
+    return performance
+
+
+async def fetch_daily_range(stock_symbol: str, start: date, end: date,
+                            client: httpx.AsyncClient | None = None) -> list[dict]:
+    """
+    Fetch the daily bars of a symbol over a date range in a single Polygon range aggregates request.\n
+    RESPONSE: A list of daily bar dictionaries, oldest first.
+    """
+    url = (f"{get_polygon_api_url()}/v2/aggs/ticker/{stock_symbol.upper()}/range/1/day/"
+           f"{start.isoformat()}/{end.isoformat()}")
+    params = {"adjusted": "true", "sort": "asc", "limit": 50000}
+    try:
+        if client is not None:
+            response = await polygon_get(client, url, params)
+        else:
+            async with http_client() as shared_client, admit("polygon"):
+                with timed("polygon"):
+                    response = await polygon_get(shared_client, url, params)
+        response.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        logger.error(f"HTTP error while fetching the daily bars of {stock_symbol} from Polygon: {e}")
+        raise ExternalAPIError(
+            message=f"Failed to fetch daily bars from external API. {e}",
+            error_detail={"error": e.response.content.decode("utf-8")},
+            status_code=e.response.status_code
+        )
+    return [
+        {
+            "stock_symbol": stock_symbol.upper(),
+            # Aggregate timestamps are the start of the session day in New York, in epoch milliseconds
+            "session_date": datetime.fromtimestamp(result["t"] / 1000, MARKET_TIMEZONE).date(),
+            "open": result["o"],
+            "high": result["h"],
+            "low": result["l"],
+            "close": result["c"],
+            "volume": result.get("v")
+        }
+        for result in response.json().get("results", [])
+    ]
+
+
+def _save_bars(bars: list[dict]):
+    db_session = SessionLocal()
+    try:
+        save_bars(db_session, bars)
+    finally:
+        db_session.close()
+
+
+async def backfill_bars(stock_symbol: str, session_date: date) -> int:
+    """
+    Store a year of daily bars of a symbol up to a session, enough for every performance window.
+    """
+    bars = await fetch_daily_range(stock_symbol, _months_back(session_date, 12) - timedelta(days=10), session_date)
+    await run_in_executor(_save_bars, bars)
+    logger.info(f"Backfilled {len(bars)} daily bars for {stock_symbol}")
+    return len(bars)
+
+
+def backfill_in_progress(stock_symbol: str) -> bool:
+    return stock_symbol.upper() in _backfills_in_progress
+
+
+def start_backfill(stock_symbol: str, session_date: date):
+    stock_symbol = stock_symbol.upper()
+    if not get_performance_backfill_enabled() or stock_symbol in _backfills_in_progress:
+        return
+    _backfills_in_progress.add(stock_symbol)
+
+    async def run():
+        try:
+            await backfill_bars(stock_symbol, session_date)
+            _backfilled_sessions[stock_symbol] = session_date
+        except Exception as e:
+            logger.error(f"Failed to backfill the daily bars of {stock_symbol}: {e}")
+        finally:
+            _backfills_in_progress.discard(stock_symbol)
+
+    task = asyncio.ensure_future(run())
+    _backfill_tasks.add(task)
+    task.add_done_callback(_backfill_tasks.discard)
+
+
+if __name__ == "__main__":
+    # Backfill the bar history of symbols: python -m app.performance SYMBOL [SYMBOL ...]
+    async def backfill_all(stock_symbols: list[str]):
+        for stock_symbol in stock_symbols:
+            await backfill_bars(stock_symbol, last_completed_session())
+
+    asyncio.run(backfill_all([stock_symbol.upper() for stock_symbol in sys.argv[1:]]))
@@ -0,0 +1,170 @@
+# app/polygon_keys.py
+import math
+import time
+from collections import deque
+import httpx
+from app.exceptions import ServiceOverloadedError
+from app.logger import logger
+from app.utils import (
+    get_polygon_api_keys,
+    get_polygon_key_requests_per_minute,
+    get_polygon_key_cooldown,
+    get_polygon_key_auth_cooldown
+)
+
+# Length of the sliding window over which the requests of a key are counted against its quota
+QUOTA_WINDOW = 60.0
+
+
+def mask_key(secret: str | None) -> str:
+    # Keys are only ever exposed by their last characters, e.g. in /metrics and logs
+    if not secret:
+        return "none"
+    return f"...{secret[-4:]}" if len(secret) > 8 else "..."
+
+
+class PolygonKey:
+    """
+    A Polygon API key of the pool, with its requests of the current quota window and its cooldown.
+    """
+
+    def __init__(self, secret: str | None, index: int):
+        self.secret = secret
+        self.key_id = f"{index}:{mask_key(secret)}"
+        self.window = deque()
+        self.cooldown_until = 0.0
+        self.last_used = 0.0
+        self.requests = 0
+        self.rate_limited = 0
+        self.unauthorized = 0
+        self.forbidden = 0
+
+    def remaining(self, now: float, requests_per_minute: int) -> float:
+        if not requests_per_minute:
+            return math.inf
+        while self.window and self.window[0] <= now - QUOTA_WINDOW:
+            self.window.popleft()
+        return requests_per_minute - len(self.window)
+
+    def available_at(self, now: float, requests_per_minute: int) -> float:
+        # When the key can be used again: after its cooldown and once its oldest request leaves the window
+        available_at = max(self.cooldown_until, now)
+        if self.remaining(now, requests_per_minute) <= 0:
+            available_at = max(available_at, self.window[0] + QUOTA_WINDOW)
+        return available_at
+
+
+class PolygonKeyPool:
+    """
+    Pool of Polygon API keys, so that the upstream throughput grows with the number of keys.\n
+    Each request uses the available key with the most quota left in the current window (the least
+    recently used one on ties). Rate limited keys (429) are left aside for their Retry-After, unknown or
+    revoked keys (401) for much longer; a 403 (data outside the key's plan) only moves the request to another key.
+    """
+
+    def __init__(self, secrets: list[str | None], requests_per_minute: int = 0, timer=time.monotonic):
+        self.keys = [PolygonKey(secret, index) for index, secret in enumerate(secrets)]
+        self.requests_per_minute = requests_per_minute
+        self.timer = timer
+
+    def __len__(self):
+        return len(self.keys)
+
+    def try_acquire(self, excluded: tuple = ()) -> PolygonKey | None:
+        now = self.timer()
+        available = [key for key in self.keys if key not in excluded and key.cooldown_until <= now
+                     and key.remaining(now, self.requests_per_minute) > 0]
+        if not available:
+            return None
+        key = max(available, key=lambda key: (key.remaining(now, self.requests_per_minute), -key.last_used))
+        key.window.append(now)
+        key.last_used = now
+        key.requests += 1
+        return key
+
+    def acquire(self) -> PolygonKey:
+        """
+        Take a key for one request, or raise ServiceOverloadedError when every key is cooling down or out of quota.
+        """
+        key = self.try_acquire()
+        if key is not None:
+            return key
+        now = self.timer()
+        retry_after = min(key.available_at(now, self.requests_per_minute) for key in self.keys) - now
+        logger.warning(f"No Polygon key available for {retry_after:.0f}s")
+        raise ServiceOverloadedError(
+            message="The Polygon quota of the service is exhausted. Retry later.",
+            error_detail={"error": "Every Polygon API key is rate limited or out of quota."},
+            status_code=503,
+            retry_after=max(math.ceil(retry_after), 1)
+        )
+
+    def record(self, key: PolygonKey, response: httpx.Response):
+        """
+        Account the response received with a key, leaving the key aside when Polygon rejected it.
+        """
+        if response.status_code == 429:
+            key.rate_limited += 1
+            retry_after = response.headers.get("Retry-After")
+            cooldown = int(retry_after) if retry_after and retry_after.isdigit() else get_polygon_key_cooldown()
+            key.cooldown_until = self.timer() + cooldown
+            logger.warning(f"Polygon key {key.key_id} is rate limited, left aside for {cooldown}s")
+        elif response.status_code == 401:
+            key.unauthorized += 1
+            key.cooldown_until = self.timer() + get_polygon_key_auth_cooldown()
+            logger.error(f"Polygon key {key.key_id} was rejected, left aside for {get_polygon_key_auth_cooldown()}s")
+        elif response.status_code == 403:
+            key.forbidden += 1
+
+    def stats(self) -> dict:
+        now = self.timer()
+        return {
+            key.key_id: {
+                "requests": key.requests,
+                "window_requests": len(key.window),
+                "remaining": None if not self.requests_per_minute else key.remaining(now, self.requests_per_minute),
+                "cooldown_seconds": round(max(key.cooldown_until - now, 0), 1),
+                "rate_limited": key.rate_limited,
+                "unauthorized": key.unauthorized,
+                "forbidden": key.forbidden
+            }
+            for key in self.keys
+        }
+
+
+def _build_pool() -> PolygonKeyPool:
+    return PolygonKeyPool(get_polygon_api_keys(), get_polygon_key_requests_per_minute())
+
+
+key_pool = _build_pool()
+
+
+def reset_key_pool():
+    """
+    Rebuild the key pool from the configuration (done in the app lifespan).
+    """
+    global key_pool
+    key_pool = _build_pool()
+
+
+async def polygon_get(client: httpx.AsyncClient, url: str, params: dict | None = None) -> httpx.Response:
+    """
+    Send a GET request to Polygon with a key of the pool. A request whose key is rate limited or
+    rejected is sent again with another available key, if any.\n
+    RESPONSE: The last response received.
+    """
+    key = key_pool.acquire()
+    tried = []
+    while True:
+        response = await client.get(url, params={**(params or {}), "apiKey": key.secret})
+        key_pool.record(key, response)
+        if response.status_code not in (401, 403, 429):
+            return response
+        tried.append(key)
+        key = key_pool.try_acquire(excluded=tuple(tried))
+        if key is None:
+            return response
+
+
+def polygon_key_stats() -> dict:
+    return key_pool.stats()
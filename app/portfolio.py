@@ -0,0 +1,166 @@
+# app/portfolio.py
+import asyncio
+import math
+from datetime import date
+from decimal import Decimal
+import numpy as np
+from sqlalchemy.orm import Session
+from app.bars import bar_from_polygon, get_bars_for_session, save_bars
+from app.cache import price_cache, session_key
+from app.market_calendar import seconds_until_next_session_data
+from app.resources import run_in_executor
+from app.exceptions import StocksFastAPIError
+from app.logger import logger
+from app.holdings import holdings as holdings_map
+from app.services import fetch_polygon_open_close_stock_data
+from app.utils import get_portfolio_fetch_concurrency
+
+# Monetary values are reported with the same precision as the persisted purchased amounts
+MONEY_QUANTUM = Decimal("0.0001")
+# Amounts and prices are stored with 4 decimals: valued as integers of 1/10000, their products are exact
+PRICE_SCALE = 10 ** 4
+
+
+async def load_portfolio_prices(db_session: Session, stock_symbols: list[str], session_date: date) -> dict:
+    """
+    Get the daily bar of every symbol for the given session.\n
+    Bars are read from the price cache first, then from the stored daily bars, and only the
+    remaining symbols are fetched from Polygon, concurrently. Fetched bars are stored and cached.\n
+    RESPONSE: A dictionary of daily bar dictionaries keyed by stock symbol. Symbols that could not be priced are left out.
+    """
+    session_ttl = seconds_until_next_session_data()
+    bars = {}
+    for stock_symbol in stock_symbols:
+        bar = price_cache.get(session_key(stock_symbol, session_date))
+        if bar is not None:
+            bars[stock_symbol] = bar
+
+    missing = [stock_symbol for stock_symbol in stock_symbols if stock_symbol not in bars]
+    if missing:
+        stored_bars = await run_in_executor(get_bars_for_session, db_session, missing, session_date)
+        for stock_symbol, bar in stored_bars.items():
+            price_cache.set(session_key(stock_symbol, session_date), bar, ttl=session_ttl)
+        bars.update(stored_bars)
+        missing = [stock_symbol for stock_symbol in missing if stock_symbol not in stored_bars]
+
+    if missing:
+        logger.info(f"Fetching {len(missing)} missing portfolio prices from Polygon for {session_date}")
+        semaphore = asyncio.Semaphore(get_portfolio_fetch_concurrency())
+
+        async def fetch_bar(stock_symbol: str):
+            async with semaphore:
+                polygon_data = await fetch_polygon_open_close_stock_data(stock_symbol, session_date.isoformat())
+            return bar_from_polygon(polygon_data)
+
+        results = await asyncio.gather(*(fetch_bar(stock_symbol) for stock_symbol in missing), return_exceptions=True)
+        fetched_bars = []
+        for stock_symbol, result in zip(missing, results):
+            if isinstance(result, StocksFastAPIError):
+                logger.error(f"Could not price {stock_symbol} for {session_date}: {result.message}")
+                continue
+            if isinstance(result, Exception):
+                logger.error(f"Could not price {stock_symbol} for {session_date}: {result}")
+                continue
+            price_cache.set(session_key(stock_symbol, session_date), result, ttl=session_ttl)
+            bars[stock_symbol] = result
+            fetched_bars.append(result)
+        await run_in_executor(save_bars, db_session, fetched_bars)
+
+    return bars
+
+
+def _to_units(values: np.ndarray, known: np.ndarray) -> np.ndarray:
+    # Prices and amounts have at most 4 decimals, so scaling and rounding their float values is exact
+    return np.where(known, np.round(np.nan_to_num(values) * PRICE_SCALE), 0).astype(np.int64)
+
+
+def compute_portfolio_valuation(amounts: np.ndarray, opens: np.ndarray, closes: np.ndarray) -> dict:
+    """
+    Compute market value, session P&L and weight of every position in one vectorized pass.\n
+    Amounts and prices are scaled to integers of 1/10000 so that monetary values are exact; values are
+    returned as integers of 1/10000^2, converted by to_money. Positions without a close are excluded from
+    the totals and weights, positions without an open from the P&L total only.\n
+    RESPONSE: A dictionary with the per-position arrays and masks, and the totals.
+    """
+    priced = ~np.isnan(closes)
+    pnl_known = priced & ~np.isnan(opens)
+    amount_units = _to_units(amounts, np.ones(amounts.shape, dtype=bool))
+    close_units = _to_units(closes, priced)
+    open_units = _to_units(opens, pnl_known)
+
+    # Products and sums must fit in int64, Python integers take over in the (unlikely) case they would not
+    largest = int(np.abs(amount_units).max(initial=0)) * 2 * int(max(np.abs(close_units).max(initial=0),
+                                                                       np.abs(open_units).max(initial=0)))
+    if largest * max(len(amounts), 1) >= 2 ** 63:
+        amount_units, close_units, open_units = (units.astype(object) for units in (amount_units, close_units, open_units))
+
+    market_values = amount_units * close_units
+    day_pnls = amount_units * (close_units - open_units)
+    total_value = int(market_values[priced].sum())
+    total_day_pnl = int(day_pnls[pnl_known].sum())
+
+    # Weights are ratios, not amounts, floats are precise enough for them
+    weights = np.full(market_values.shape, np.nan)
+    if total_value:
+        weights[priced] = (market_values[priced] / total_value).astype(np.float64)
+
+    return {
+        "market_values": market_values,
+        "day_pnls": day_pnls,
+        "priced": priced,
+        "pnl_known": pnl_known,
+        "weights": weights,
+        "total_value": total_value,
+        "total_day_pnl": total_day_pnl
+    }
+
+
+def to_money(value_units: int) -> Decimal:
+    """
+    Convert a value computed in integers of 1/10000^2 into a Decimal with the precision of the stored amounts.
+    """
+    return Decimal(int(value_units)).scaleb(-8).quantize(MONEY_QUANTUM)
+
+
+def _bar_prices(bars: dict, stock_symbols: list[str], field: str) -> np.ndarray:
+    # NaN for the symbols without a bar, and for the prices missing from their bar
+    prices = (bars[stock_symbol][field] if stock_symbol in bars else None for stock_symbol in stock_symbols)
+    return np.fromiter((np.nan if price is None else price for price in prices), dtype=np.float64,
+                       count=len(stock_symbols))
+
+
+async def value_portfolio(db_session: Session, session_date: date) -> dict:
+    """
+    Value every holding for the given session, from the in-memory copy of the Stocks table.\n
+    RESPONSE: A dictionary matching the Portfolio schema.
+    """
+    holdings = sorted(holdings_map.items())
+    stock_symbols = [stock_symbol for stock_symbol, _ in holdings]
+    bars = await load_portfolio_prices(db_session, stock_symbols, session_date)
+
+    count = len(holdings)
+    amounts = np.fromiter((purchased_amount or 0 for _, purchased_amount in holdings), dtype=np.float64, count=count)
+    opens = _bar_prices(bars, stock_symbols, "open")
+    closes = _bar_prices(bars, stock_symbols, "close")
+
+    valuation = compute_portfolio_valuation(amounts, opens, closes)
+
+    positions = []
+    for index, (stock_symbol, purchased_amount) in enumerate(holdings):
+        priced = valuation["priced"][index]
+        positions.append({
+            "stock_symbol": stock_symbol,
+            "purchased_amount": purchased_amount,
+            "close": float(closes[index]) if priced else None,
+            "market_value": to_money(valuation["market_values"][index]) if priced else None,
+            "day_pnl": to_money(valuation["day_pnls"][index]) if valuation["pnl_known"][index] else None,
+            "weight": None if math.isnan(valuation["weights"][index]) else float(valuation["weights"][index])
+        })
+
+    return {
+        "session_date": session_date,
+        "total_value": to_money(valuation["total_value"]),
+        "total_day_pnl": to_money(valuation["total_day_pnl"]),
+        "positions": positions,
+        "missing_prices": [stock_symbol for stock_symbol in stock_symbols if stock_symbol not in bars]
+    }
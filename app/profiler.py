@@ -0,0 +1,126 @@
+# app/profiler.py
+import asyncio
+import sys
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from app.exceptions import InvalidAPIRequestError
+from app.logger import logger
+from app.utils import get_profiler_interval, get_profiler_max_seconds
+
+# Profiles captured for single requests, kept until fetched or pushed out by newer ones
+MAX_STORED_PROFILES = 20
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a background thread samples the stack of the profiled thread at a fixed interval
+    and counts the identical stacks. The counts are rendered as folded stacks ("frame;frame;frame count"),
+    the input format of flamegraph.pl and speedscope. Nothing is sampled while no profile is running.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = Counter()
+        self._target_thread_id = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id: int):
+        self._target_thread_id = thread_id
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        self._stop.set()
+        self._thread.join()
+        return self.folded()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target_thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+# A single profile runs at a time, sampling the event loop thread which serves every request of the worker
+_profile_lock = threading.Lock()
+_stored_profiles: OrderedDict[str, str] = OrderedDict()
+
+
+def _begin() -> SamplingProfiler:
+    if not _profile_lock.acquire(blocking=False):
+        raise InvalidAPIRequestError(
+            message="A profile is already running in this worker.",
+            error_detail={"error": "Retry once the running profile is finished."},
+            status_code=409
+        )
+    profiler = SamplingProfiler(get_profiler_interval())
+    profiler.start(threading.get_ident())
+    return profiler
+
+
+def _end(profiler: SamplingProfiler) -> str:
+    try:
+        return profiler.stop()
+    finally:
+        _profile_lock.release()
+
+
+async def profile_window(seconds: float) -> str:
+    """
+    Profile the worker for a time window.\n
+    RESPONSE: The folded stacks sampled during the window.
+    """
+    seconds = min(seconds, get_profiler_max_seconds())
+    profiler = _begin()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        folded = _end(profiler)
+    logger.info(f"Captured a {seconds}s profile with {sum(profiler.samples.values())} samples")
+    return folded
+
+
+async def profile_request(request, call_next):
+    """
+    Run a request under the profiler and store its profile.\n
+    RESPONSE: The request's response, carrying the profile id in an X-Profile-Id header.
+    """
+    try:
+        profiler = _begin()
+    except InvalidAPIRequestError:
+        # Middlewares are outside the exception handlers, a busy profiler just leaves the request unprofiled
+        logger.warning("Profile requested while another one is running, serving the request unprofiled")
+        return await call_next(request)
+    try:
+        response = await call_next(request)
+    finally:
+        folded = _end(profiler)
+    profile_id = uuid.uuid4().hex
+    _stored_profiles[profile_id] = folded
+    while len(_stored_profiles) > MAX_STORED_PROFILES:
+        _stored_profiles.popitem(last=False)
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
+def pop_stored_profile(profile_id: str) -> str:
+    folded = _stored_profiles.pop(profile_id, None)
+    if folded is None:
+        raise InvalidAPIRequestError(
+            message=f"Unknown profile {profile_id}.",
+            error_detail={"error": "The profile does not exist or was already fetched."},
+            status_code=404
+        )
+    return folded
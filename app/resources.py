@@ -0,0 +1,69 @@
+# app/resources.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+import httpx
+from app.utils import (
+    get_http_max_connections,
+    get_http_max_keepalive_connections,
+    get_http_timeout,
+    get_executor_max_workers
+)
+from app.logger import logger
+
+# Per-worker resources, created in the app lifespan and released on shutdown.
+# When the app runs without its lifespan (e.g. in tests), callers fall back to short-lived resources.
+_http_client: httpx.AsyncClient | None = None
+_executor: ThreadPoolExecutor | None = None
+
+
+def open_resources():
+    """
+    Create the shared HTTP client and thread pool executor of the current worker.
+    """
+    global _http_client, _executor
+    _http_client = httpx.AsyncClient(
+        timeout=get_http_timeout(),
+        limits=httpx.Limits(
+            max_connections=get_http_max_connections(),
+            max_keepalive_connections=get_http_max_keepalive_connections()
+        )
+    )
+    _executor = ThreadPoolExecutor(
+        max_workers=get_executor_max_workers(), thread_name_prefix="stocks-worker")
+    logger.info("Opened shared HTTP client and executor")
+
+
+async def close_resources():
+    """
+    Close the shared HTTP client and wait for the executor to finish its pending work.
+    """
+    global _http_client, _executor
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    logger.info("Closed shared HTTP client and executor")
+
+
+@asynccontextmanager
+async def http_client():
+    """
+    Yield the worker's shared HTTP client, or a short-lived one when the lifespan did not run.
+    """
+    if _http_client is not None:
+        yield _http_client
+    else:
+        async with httpx.AsyncClient() as client:
+            yield client
+
+
+async def run_in_executor(func, *args, **kwargs):
+    """
+    Run a blocking function in the worker's executor without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
@@ -1,6 +1,6 @@
 # app/schemas.py
 from pydantic import BaseModel, Field, model_validator
-from typing import List
+from typing import List, Optional
 from decimal import Decimal
 from datetime import date
 
@@ -12,6 +12,7 @@ class MarketCap(BaseModel):
 
 class Competitor(BaseModel):
     name: str
+    symbol: Optional[str] = Field(None, description="Competitor stock symbol, when MarketWatch links to its quote page")
     market_cap: MarketCap
 
 
@@ -80,3 +81,49 @@ class MarketWatchStockDataResponse(BaseModel):
     company_name: str
     performance_data: PerformanceData
     competitors_data: List[Competitor]
+
+
+class PortfolioPosition(BaseModel):
+    stock_symbol: str
+    purchased_amount: Decimal
+    close: Optional[float] = Field(None, description="Session close price, null when no price is available")
+    market_value: Optional[Decimal] = Field(None, description="purchased_amount * close")
+    day_pnl: Optional[Decimal] = Field(None, description="P&L over the session: purchased_amount * (close - open)")
+    weight: Optional[float] = Field(None, description="Share of the position in the total portfolio value")
+
+
+class Portfolio(BaseModel):
+    session_date: date = Field(..., description="Session the portfolio was valued for, in the YYYY-MM-DD format")
+    total_value: Decimal
+    total_day_pnl: Decimal
+    positions: List[PortfolioPosition]
+    missing_prices: List[str] = Field(..., description="Symbols that could not be priced and are left out of the totals")
+
+
+class CompetitorEdge(BaseModel):
+    stock_symbol: str = Field(..., description="Symbol listing the competitor")
+    competitor_name: str
+    competitor_symbol: Optional[str] = None
+    market_cap: Optional[MarketCap] = None
+
+
+class Peer(BaseModel):
+    symbol: str
+    score: int = Field(..., description="Number of competitor graph connections shared with the requested symbol")
+
+
+class PeersResponse(BaseModel):
+    stock_symbol: str
+    peers: List[Peer]
+
+
+class Ticker(BaseModel):
+    symbol: str
+    name: str
+
+
+class HoldingsImportResult(BaseModel):
+    rows: int = Field(..., description="Number of imported rows")
+    symbols: int = Field(..., description="Number of stocks created or updated")
+    seconds: float
+    rows_per_second: Optional[int] = None
@@ -0,0 +1,38 @@
+# app/security.py
+import secrets
+from fastapi import Header, Request
+from app.exceptions import InvalidAPIRequestError
+from app.utils import get_admin_token, get_profiler_enabled
+
+
+def _is_admin_token(token: str | None) -> bool:
+    admin_token = get_admin_token()
+    return bool(admin_token and token and secrets.compare_digest(token, admin_token))
+
+
+def is_admin_request(request: Request) -> bool:
+    return _is_admin_token(request.headers.get("X-Admin-Token"))
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)):
+    """
+    FastAPI dependency protecting the admin endpoints with the ADMIN_TOKEN shared secret.
+    """
+    if not _is_admin_token(x_admin_token):
+        raise InvalidAPIRequestError(
+            message="Admin access required.",
+            error_detail={"error": "Missing or invalid X-Admin-Token header."},
+            status_code=403
+        )
+
+
+def require_profiler():
+    """
+    FastAPI dependency of the profiler endpoints, which only exist when PROFILER_ENABLED is set.
+    """
+    if not get_profiler_enabled():
+        raise InvalidAPIRequestError(
+            message="The profiler is disabled.",
+            error_detail={"error": "Set PROFILER_ENABLED to enable it."},
+            status_code=404
+        )
@@ -0,0 +1,58 @@
+# app/server.py
+# Production entry point: python -m app.server
+# Runs the API in several worker processes under a supervisor that respawns workers
+# when they exit, e.g. after reaching WORKER_MAX_REQUESTS.
+import importlib.util
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+from app.utils import (
+    get_web_host,
+    get_web_port,
+    get_web_concurrency,
+    get_worker_max_requests,
+    get_graceful_shutdown_timeout,
+    get_keep_alive_timeout
+)
+from app.logger import logger
+
+
+def _module_available(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+def build_server_config() -> uvicorn.Config:
+    """
+    Build the uvicorn configuration for production serving from the environment.
+    """
+    return uvicorn.Config(
+        "app.main:app",
+        host=get_web_host(),
+        port=get_web_port(),
+        workers=get_web_concurrency(),
+        # uvloop and httptools are used when installed, otherwise asyncio and h11
+        loop="uvloop" if _module_available("uvloop") else "asyncio",
+        http="httptools" if _module_available("httptools") else "h11",
+        lifespan="on",
+        limit_max_requests=get_worker_max_requests(),
+        timeout_graceful_shutdown=get_graceful_shutdown_timeout(),
+        timeout_keep_alive=get_keep_alive_timeout(),
+        proxy_headers=True,
+        access_log=False
+    )
+
+
+def main():
+    config = build_server_config()
+    logger.info(
+        f"Starting {config.workers} workers on {config.host}:{config.port} "
+        f"(loop={config.loop}, http={config.http}, max_requests={config.limit_max_requests})")
+
+    # Workers are always supervised, even when there is only one, so a recycled worker is replaced.
+    # On SIGTERM every worker stops accepting connections and drains its in-flight requests.
+    server = uvicorn.Server(config=config)
+    sock = config.bind_socket()
+    Multiprocess(config, target=server.run, sockets=[sock]).run()
+
+
+if __name__ == "__main__":
+    main()
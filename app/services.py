@@ -10,16 +10,33 @@ from app.utils import (
     convert_performance_percentage_to_float, 
     convert_period_to_best_practice, 
     get_polygon_base_url, 
-    get_polygon_api_key, 
     get_marketwatch_base_url, 
     get_marketwatch_base_url
 )
 from fastapi import HTTPException, status
-from app.exceptions import InvalidAPIResponseError, MarketWatchDataScrapeError, ExternalAPIError
+from app.exceptions import InvalidAPIResponseError, MarketWatchDataScrapeError, MarketWatchMissingSectionError, ExternalAPIError
 from app.logger import logger
+from app.resources import http_client, run_in_executor
+from app.cache import negative_cache
+from app.timing import timed
+from app.admission import admit
+from app.polygon_keys import polygon_get
+from app.page_archive import store_page, save_last_good_parse, load_last_good_parse
+from datetime import datetime
+from app.market_calendar import is_trading_day
 from app.schemas import PolygonOpenCloseStockDataResponse
 from pydantic import ValidationError
 
+def classify_polygon_not_found(date: str) -> str:
+    """
+    Polygon answers 404 both for unknown tickers and for dates without a trading session.
+    """
+    try:
+        trading_day = is_trading_day(datetime.strptime(date, "%Y-%m-%d").date())
+    except ValueError:
+        return "not_found"
+    return "not_found" if trading_day else "no_trading_day"
+
 async def fetch_polygon_open_close_stock_data(stock_symbol: str, date: str):
     """
     Fetch open/close stock data from the Polygon API for the given symbol and date.\n
@@ -27,11 +44,19 @@ async def fetch_polygon_open_close_stock_data(stock_symbol: str, date: str):
     {date}: The date to fetch data for in the format YYYY-MM-DD. e.g. 2023-04-28.\n
     RESPONSE: A dictionary containing the polygon open/close API stock data.
     """
+    # Known-permanent failures are answered from the negative cache without calling Polygon
+    negative_key = ("polygon", stock_symbol.upper(), date)
+    known_outcome = negative_cache.get(negative_key)
+    if known_outcome is not None:
+        logger.info(f"Negative cache hit for Polygon data of {stock_symbol} on {date}")
+        return negative_cache.replay(known_outcome)
+
     url = f"{get_polygon_base_url()}/{stock_symbol}/{date}"
-    params = {"adjusted": "true", "apiKey": get_polygon_api_key()}
-    async with httpx.AsyncClient() as client:
+    params = {"adjusted": "true"}
+    async with http_client() as client, admit("polygon"):
         try:
-            response = await client.get(url, params=params)
+            with timed("polygon"):
+                response = await polygon_get(client, url, params)
             response.raise_for_status()
             
             # Parse the response JSON
@@ -55,11 +80,14 @@ async def fetch_polygon_open_close_stock_data(stock_symbol: str, date: str):
             
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error while fetching data from Polygon: {e}")
-            raise ExternalAPIError(
+            error = ExternalAPIError(
             message=f"Failed to fetch data from external API. {e}",
             error_detail={"error": e.response.content.decode("utf-8")},
             status_code=e.response.status_code
         )
+            if e.response.status_code == status.HTTP_404_NOT_FOUND:
+                negative_cache.record(negative_key, classify_polygon_not_found(date), error)
+            raise error
         
         except Exception as e:
             logger.exception(f"Unexpected error while fetching data from Polygon: {e}")
@@ -71,11 +99,10 @@ async def fetch_polygon_open_close_stock_data(stock_symbol: str, date: str):
                 status_code=status_code
             )
         
-async def fetch_marketwatch_and_scrape_stock_data(stock_symbol: str):
+async def fetch_marketwatch_page(stock_symbol: str, negative_key: tuple) -> tuple[str, str]:
     """
-    Fetch performance and competitors data from MarketWatch for the given stock symbol.
-    :param stock_symbol: The symbol of the stock to fetch data for.
-    :return: A dictionary containing the stock data.
+    Download the MarketWatch quote page of the given stock symbol.\n
+    RESPONSE: The URL and the HTML of the page.
     """
     url = f"{get_marketwatch_base_url()}/{stock_symbol.lower()}"
     
@@ -86,19 +113,23 @@ async def fetch_marketwatch_and_scrape_stock_data(stock_symbol: str):
         "Referer": "https://www.google.com/"
     }
 
-    async with httpx.AsyncClient() as client:
+    async with http_client() as client, admit("marketwatch"):
         try:
-            response = await client.get(url, headers=headers)
+            with timed("marketwatch"):
+                response = await client.get(url, headers=headers)
             response.raise_for_status()
             logger.info(f"Successfully fetched {get_marketwatch_base_url()} data for {stock_symbol}")
             
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error while fetching URL from Marketwatch: {e}")
-            raise ExternalAPIError(
+            error = ExternalAPIError(
             message=f"Failed to fetch URL. {e}",
             error_detail={"error": e.response.content.decode("utf-8")},
             status_code=e.response.status_code
         )
+            if e.response.status_code == status.HTTP_404_NOT_FOUND:
+                negative_cache.record(negative_key, "not_found", error)
+            raise error
             
         except Exception as e:
             logger.exception(f"Unexpected error during scraping for {stock_symbol}: {e}")
@@ -109,93 +140,165 @@ async def fetch_marketwatch_and_scrape_stock_data(stock_symbol: str):
                 error_detail={"error": error_content},
                 status_code=status_code
             )
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        logger.info(f"Successfully got {get_marketwatch_base_url()} for {stock_symbol} html  for scraping")
-
-        # Parse company_name
-        company_name = soup.find(
-            'h1', {'class': 'company__name'})
-        if(company_name):
-            company_name = company_name.get_text(strip=True)
-            logger.info(f"Successfully got company_name from {get_marketwatch_base_url()} for {stock_symbol}: {company_name}")
-        else:
-            logger.error(f"Failed to extract company name for {stock_symbol}")
+
+        return url, response.text
+
+
+def parse_marketwatch_page(html: str, stock_symbol: str) -> dict:
+    """
+    Extract the company name, performance and competitors data from a MarketWatch quote page.
+    Parsing is separate from fetching so that archived pages can be parsed again without the network.\n
+    RESPONSE: A dictionary containing the stock data.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    logger.info(f"Successfully got {get_marketwatch_base_url()} for {stock_symbol} html  for scraping")
+
+    # Parse company_name
+    company_name = soup.find(
+        'h1', {'class': 'company__name'})
+    if(company_name):
+        company_name = company_name.get_text(strip=True)
+        logger.info(f"Successfully got company_name from {get_marketwatch_base_url()} for {stock_symbol}: {company_name}")
+    else:
+        logger.error(f"Failed to extract company name for {stock_symbol}")
+        raise MarketWatchMissingSectionError(
+            message=f"Failed to extract company name from MarketWatch page for {stock_symbol}.",
+            error_detail={"error": "Company name not found in page."},
+            status_code=500
+        )
+    # Parse performance table
+    # Search by text with the help of lambda function
+    preformance_text = 'Performance'
+    performance_span = soup.find(
+        lambda tag: tag.name == "span" and preformance_text in tag.text)
+    if not performance_span:
+        logger.error(f"Failed to find performance section for {stock_symbol}")
+        raise MarketWatchMissingSectionError(
+            message=f"Failed to extract performance data from MarketWatch page for {stock_symbol}.",
+            error_detail={"error": "Performance section not found in page."},
+            status_code=500
+        )
+    performance_table = performance_span.parent.parent.parent
+    performance_data = {}
+    if performance_table:
+        try:
+            rows = performance_table.find_all('tr', {'class': 'table__row'})
+            for row in rows:
+                period = convert_period_to_best_practice(
+                    row.find('td', {'class': 'table__cell'}).get_text(strip=True))
+                value = row.find('li', {'class': re.compile(r'\bvalue\b')}).get_text(
+                    strip=True)  # Use regex to match a specific class within the class attribute
+                performance_data[period] = convert_performance_percentage_to_float(
+                    value)
+            logger.info(f"Successfully got performance data from {get_marketwatch_base_url()} for {stock_symbol}")
+            logger.debug(f"Performance data: {performance_data}")
+        except Exception as e:
+            logger.exception(f"Unexpected error during scraping for {stock_symbol}: {e}")
             raise MarketWatchDataScrapeError(
-                message=f"Failed to extract company name from MarketWatch page for {stock_symbol}.",
-                error_detail={"error": "Company name not found in page."},
-                status_code=500
+                message=f"An unexpected error occurred during data scraping. {e}",
+                error_detail={"error": str(e)},
+                status_code=status.HTTP_204_NO_CONTENT
+            )
+
+    # Parse competitors table
+    competitors_table = soup.find(
+        'table', {'aria-label': 'Competitors data table'})
+    competitors_data = []
+
+    # Regex pattern to match market cap values form currency and value separation
+    pattern = r"^(.*?)\s*([\d.,]+[kMBT]?)$"
+
+    if competitors_table:
+        try:
+            rows = competitors_table.find('tbody').find_all('tr')
+            for row in rows:
+                name_cell = row.find('td', {'class': 'table__cell w50'})
+                name = name_cell.get_text(strip=True)
+                # The competitor name links to its quote page, which carries its symbol
+                link = name_cell.find('a', href=True)
+                symbol_match = re.search(r"/investing/stock/([^/?#]+)", link['href']) if link else None
+                change = row.find('td', {'class': 'table__cell w25'}).find(
+                    'bg-quote').get_text(strip=True)
+                market_cap = row.find(
+                    'td', {'class': 'table__cell w25 number'}).get_text(strip=True)
+                regex_match = re.match(pattern, market_cap.strip())
+                if regex_match:
+                    market_cap_currency, market_cap_value = regex_match.groups()
+                competitors_data.append({
+                    'name': name,
+                    'symbol': symbol_match.group(1).upper() if symbol_match else None,
+                    'change': change,
+                    'market_cap': {
+                        'currency': market_cap_currency,
+                        'value': convert_market_cap_to_decimal(market_cap_value)
+                    } if regex_match else {
+                        'currency': None,
+                        'value': None
+                    }
+                })
+            logger.info(f"Successfully got competitors data from {get_marketwatch_base_url()} for {stock_symbol}")
+            logger.debug(f"Competitors data: {competitors_data}")
+        except Exception as e:
+            logger.exception(f"Unexpected error during scraping for {stock_symbol}: {e}")
+            raise MarketWatchDataScrapeError(
+                message=f"An unexpected error occurred during data scraping. {e}",
+                error_detail={"error": str(e)},
+                status_code=status.HTTP_204_NO_CONTENT
             )
-        # Parse performance table
-        # Search by text with the help of lambda function
-        preformance_text = 'Performance'
-        performance_table = soup.find(
-            lambda tag: tag.name == "span" and preformance_text in tag.text).parent.parent.parent
-        performance_data = {}
-        if performance_table:
-            try:
-                rows = performance_table.find_all('tr', {'class': 'table__row'})
-                for row in rows:
-                    period = convert_period_to_best_practice(
-                        row.find('td', {'class': 'table__cell'}).get_text(strip=True))
-                    value = row.find('li', {'class': re.compile(r'\bvalue\b')}).get_text(
-                        strip=True)  # Use regex to match a specific class within the class attribute
-                    performance_data[period] = convert_performance_percentage_to_float(
-                        value)
-                logger.info(f"Successfully got performance data from {get_marketwatch_base_url()} for {stock_symbol}")
-                logger.debug(f"Performance data: {performance_data}")
-            except Exception as e:
-                logger.exception(f"Unexpected error during scraping for {stock_symbol}: {e}")
-                raise MarketWatchDataScrapeError(
-                    message=f"An unexpected error occurred during data scraping. {e}",
-                    error_detail={"error": e.response.content.decode("utf-8")},
-                    status_code=status.HTTP_204_NO_CONTENT
-                )
-
-        # Parse competitors table
-        competitors_table = soup.find(
-            'table', {'aria-label': 'Competitors data table'})
-        competitors_data = []
-
-        # Regex pattern to match market cap values form currency and value separation
-        pattern = r"^(.*?)\s*([\d.,]+[kMBT]?)$"
-
-        if competitors_table:
-            try:
-                rows = competitors_table.find('tbody').find_all('tr')
-                for row in rows:
-                    name = row.find(
-                        'td', {'class': 'table__cell w50'}).get_text(strip=True)
-                    change = row.find('td', {'class': 'table__cell w25'}).find(
-                        'bg-quote').get_text(strip=True)
-                    market_cap = row.find(
-                        'td', {'class': 'table__cell w25 number'}).get_text(strip=True)
-                    regex_match = re.match(pattern, market_cap.strip())
-                    if regex_match:
-                        market_cap_currency, market_cap_value = regex_match.groups()
-                    competitors_data.append({
-                        'name': name,
-                        'change': change,
-                        'market_cap': {
-                            'currency': market_cap_currency,
-                            'value': convert_market_cap_to_decimal(market_cap_value)
-                        } if regex_match else {
-                            'currency': None,
-                            'value': None
-                        }
-                    })
-                logger.info(f"Successfully got competitors data from {get_marketwatch_base_url()} for {stock_symbol}")
-                logger.debug(f"Competitors data: {competitors_data}")
-            except Exception as e:
-                logger.exception(f"Unexpected error during scraping for {stock_symbol}: {e}")
-                raise MarketWatchDataScrapeError(
-                    message=f"An unexpected error occurred during data scraping. {e}",
-                    error_detail={"error": e.response.content.decode("utf-8")},
-                    status_code=status.HTTP_204_NO_CONTENT
-                )
-
-        return {
-            'company_name': company_name,
-            'performance_data': performance_data,
-            'competitors_data': competitors_data
-        }
\ No newline at end of file
+
+    marketwatch_data = {
+        'company_name': company_name,
+        'performance_data': performance_data,
+        'competitors_data': competitors_data
+    }
+
+    if not competitors_table:
+        logger.info(f"No competitors table on MarketWatch page for {stock_symbol}")
+
+    return marketwatch_data
+
+
+async def fetch_marketwatch_and_scrape_stock_data(stock_symbol: str):
+    """
+    Fetch performance and competitors data from MarketWatch for the given stock symbol.
+    The fetched page is archived before it is parsed, and when the parse fails the last good parse of the symbol is served.
+    :param stock_symbol: The symbol of the stock to fetch data for.
+    :return: A dictionary containing the stock data.
+    """
+    negative_key = ("marketwatch", stock_symbol.upper())
+    known_outcome = negative_cache.get(negative_key)
+    if known_outcome is not None:
+        logger.info(f"Negative cache hit for MarketWatch data of {stock_symbol}")
+        return negative_cache.replay(known_outcome)
+
+    url, html = await fetch_marketwatch_page(stock_symbol, negative_key)
+
+    # Archiving is best effort, a full or read-only disk must not fail the request
+    digest = None
+    try:
+        digest = await run_in_executor(store_page, stock_symbol, url, html)
+    except OSError as e:
+        logger.error(f"Failed to archive the MarketWatch page of {stock_symbol}: {e}")
+
+    # Parsing is CPU bound, so it runs in the worker's executor to keep the event loop responsive
+    try:
+        with timed("parse"):
+            marketwatch_data = await run_in_executor(parse_marketwatch_page, html, stock_symbol)
+    except MarketWatchDataScrapeError as error:
+        # The markup changed or the parser failed: the last good parse is better than no data. The caller
+        # caches it in the scrape cache like any parse.
+        last_good = await run_in_executor(load_last_good_parse, stock_symbol)
+        if last_good is not None:
+            logger.warning(f"Serving the last good MarketWatch parse of {stock_symbol} from {last_good['parsed_at']}")
+            return last_good["data"]
+        # Only a missing section is known to be permanent, other parse failures may not happen again
+        if isinstance(error, MarketWatchMissingSectionError):
+            negative_cache.record(negative_key, "missing_section", error)
+        raise error
+
+    try:
+        await run_in_executor(save_last_good_parse, stock_symbol, digest, marketwatch_data)
+    except OSError as e:
+        logger.error(f"Failed to save the MarketWatch parse of {stock_symbol}: {e}")
+
+    return marketwatch_data
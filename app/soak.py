@@ -0,0 +1,235 @@
+# app/soak.py
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import secrets
+import socket
+import sys
+import time
+from datetime import date
+import httpx
+
+# Memory soak test: drives the app for hours against local stand-ins of Polygon and MarketWatch and records
+# the RSS and the tracemalloc top allocations of the worker over time, one JSON line per interval.
+#   python -m app.soak --duration 14400 --interval 300 --output soak.jsonl
+# By default the app runs in this process (its lifespan too, so the database of the .env is used). With
+# --target, a separately started worker is driven instead; it must be configured with the stand-in URLs
+# printed at startup (--upstream-port fixes their port) and with the ADMIN_TOKEN given by --admin-token.
+# Memory snapshots are per worker, so the target must be a server running a single worker.
+
+
+def _stand_in_price(stock_symbol: str, day: str) -> float:
+    digest = hashlib.sha256(f"{stock_symbol}{day}".encode()).digest()
+    return round(10 + int.from_bytes(digest[:4], "big") % 50000 / 100, 2)
+
+
+def _stand_in_page(stock_symbol: str, competitors: list[str], page_kb: int) -> str:
+    """
+    A quote page with the markup the MarketWatch parser expects, padded to the size of a real page.
+    """
+    rows = "".join(
+        f'<tr class="table__row"><td class="table__cell">{period}</td>'
+        f'<td><ul><li class="content__item value">{random.uniform(-20, 20):.2f}%</li></ul></td></tr>'
+        for period in ("5 Day", "1 Month", "3 Month", "YTD", "1 Year")
+    )
+    competitor_rows = "".join(
+        f'<tr><td class="table__cell w50"><a href="/investing/stock/{symbol.lower()}">{symbol} Corp.</a></td>'
+        f'<td class="table__cell w25"><bg-quote>{random.uniform(-5, 5):.2f}%</bg-quote></td>'
+        f'<td class="table__cell w25 number">${random.uniform(1, 900):.1f}B</td></tr>'
+        for symbol in competitors
+    )
+    filler = "".join(f'<div class="article"><p>Paragraph {index} of {stock_symbol} news.</p></div>'
+                     for index in range(page_kb * 1024 // 60))
+    return (f'<html><body><h1 class="company__name">{stock_symbol} Inc.</h1>{filler}'
+            f'<table><tbody><tr><th><span>Performance</span></th></tr>{rows}</tbody></table>'
+            f'<table aria-label="Competitors data table"><tbody>{competitor_rows}</tbody></table></body></html>')
+
+
+def _serve_stand_ins(port: int, symbols: list[str], page_kb: int, latency: float):
+    # Runs in its own process, so that the stand-ins do not show up in the memory of the app
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import HTMLResponse
+
+    stand_ins = FastAPI()
+
+    @stand_ins.get("/v1/open-close/{stock_symbol}/{day}")
+    async def open_close(stock_symbol: str, day: str):
+        await asyncio.sleep(latency)
+        close = _stand_in_price(stock_symbol, day)
+        return {"status": "OK", "from": day, "symbol": stock_symbol.upper(), "open": close * 0.99,
+                "high": close * 1.01, "low": close * 0.98, "close": close, "volume": 1000000,
+                "afterHours": close, "preMarket": close}
+
+    @stand_ins.get("/investing/stock/{stock_symbol}")
+    async def quote_page(stock_symbol: str):
+        await asyncio.sleep(latency)
+        return HTMLResponse(_stand_in_page(stock_symbol.upper(), random.sample(symbols, min(5, len(symbols))), page_kb))
+
+    uvicorn.run(stand_ins, host="127.0.0.1", port=port, log_level="warning")
+
+
+def start_stand_ins(port: int, symbols: list[str], page_kb: int, latency: float) -> tuple[multiprocessing.Process, str]:
+    if not port:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+    process = multiprocessing.get_context("spawn").Process(
+        target=_serve_stand_ins, args=(port, symbols, page_kb, latency), daemon=True)
+    process.start()
+    for _ in range(100):
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.1):
+                return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"The upstream stand-ins did not start on port {port}.")
+
+
+def stand_in_environment(upstream_url: str) -> dict:
+    return {
+        "POLYGON_BASE_URL": f"{upstream_url}/v1/open-close",
+        "POLYGON_API_URL": upstream_url,
+        "MARKETWATCH_BASE_URL": f"{upstream_url}/investing/stock",
+    }
+
+
+def configure_in_process(upstream_url: str, admin_token: str):
+    """
+    Point the app of this process at the stand-ins, before it is imported since the caches read their
+    configuration at import. Scraped data expires quickly so that pages keep being fetched and parsed.
+    """
+    os.environ.update(stand_in_environment(upstream_url))
+    os.environ.update({"ADMIN_TOKEN": admin_token, "POLYGON_API_KEYS": "soak-test-key"})
+    for name, value in (("MARKETWATCH_CACHE_TTL", "10"), ("PAGE_ARCHIVE_ENABLED", "false"),
+                        ("CACHE_SNAPSHOT_ENABLED", "false"), ("BULK_INGEST_ENABLED", "false"),
+                        ("MEMORY_TRACE_ENABLED", "true"), ("MEMORY_MAX_SNAPSHOTS", "3")):
+        os.environ.setdefault(name, value)
+
+
+def load_symbols(count: int) -> list[str]:
+    from app.tickers import TickerIndex
+    from app.utils import get_ticker_reference_path
+    symbols = [symbol for symbol in TickerIndex.from_file(get_ticker_reference_path()).symbols if symbol.isalpha()]
+    return symbols[:count]
+
+
+async def drive(client: httpx.AsyncClient, symbols: list[str], counters: dict, stop_at: float):
+    while time.monotonic() < stop_at:
+        path = "/portfolio" if random.random() < 0.02 else f"/stock/{random.choice(symbols)}"
+        try:
+            response = await client.get(path, headers={"Accept-Encoding": "gzip"})
+            counters["requests"] += 1
+            if response.status_code >= 500:
+                counters["errors"] += 1
+        except httpx.HTTPError:
+            counters["requests"] += 1
+            counters["errors"] += 1
+
+
+async def record(client: httpx.AsyncClient, admin_headers: dict, started: float, counters: dict,
+                 baseline: str | None, previous: str | None, top: int, log_path_known: bool = True) -> tuple[dict, str]:
+    snapshot = (await client.post("/admin/memory/snapshots", params={"limit": top}, headers=admin_headers)).json()
+    metrics = (await client.get("/metrics")).json()
+    line = {
+        "elapsed_seconds": round(time.monotonic() - started, 1),
+        "requests": counters["requests"],
+        "errors": counters["errors"],
+        "pid": snapshot["pid"],
+        "rss_bytes": snapshot["rss_bytes"],
+        "traced_bytes": snapshot["traced_bytes"],
+        "cache_bytes": sum(metrics[name]["bytes"] for name in ("cache", "price_cache", "scrape_cache")),
+        # The log file of an in-process app, to tell a growing log handler from a growing heap
+        "app_log_bytes": os.path.getsize("app.log") if log_path_known and os.path.exists("app.log") else None,
+        "top": snapshot["top"]
+    }
+    for name, first in (("growth_since_start", baseline), ("growth_since_previous", previous)):
+        if first is not None:
+            diff = await client.get("/admin/memory/diff", headers=admin_headers,
+                                    params={"first": first, "second": snapshot["id"], "limit": top})
+            if diff.status_code == 409:
+                # Answered by another worker than the one that took the baseline
+                raise SystemExit(f"{diff.json()['message']} --target must be a server running a single worker.")
+            line[name] = diff.json()
+    return line, snapshot["id"]
+
+
+async def soak(arguments: argparse.Namespace):
+    symbols = load_symbols(arguments.symbols)
+    stand_ins, upstream_url = start_stand_ins(arguments.upstream_port, symbols, arguments.page_kb,
+                                              arguments.upstream_latency_ms / 1000)
+    print(f"Upstream stand-ins at {upstream_url}: {json.dumps(stand_in_environment(upstream_url))}", file=sys.stderr)
+
+    if arguments.target:
+        admin_token = arguments.admin_token or os.getenv("ADMIN_TOKEN")
+        client = httpx.AsyncClient(base_url=arguments.target, timeout=30)
+        lifespan = None
+    else:
+        admin_token = secrets.token_hex(16)
+        configure_in_process(upstream_url, admin_token)
+        from app.main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://soak", timeout=30)
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+
+    admin_headers = {"X-Admin-Token": admin_token}
+    counters = {"requests": 0, "errors": 0}
+    started = time.monotonic()
+    stop_at = started + arguments.duration
+    try:
+        with open(arguments.output, "a", encoding="utf-8") as output:
+            line = None
+            baseline_line, previous = await record(client, admin_headers, started, counters, None, None, arguments.top,
+                                                   not arguments.target)
+            output.write(json.dumps(baseline_line) + "\n")
+            # Growth is measured from the first snapshot of the worker, the one it keeps for the whole run
+            baseline = (await client.get("/admin/memory/snapshots", headers=admin_headers)).json()[0]["id"]
+
+            drivers = [asyncio.create_task(drive(client, symbols, counters, stop_at))
+                       for _ in range(arguments.concurrency)]
+            while time.monotonic() < stop_at:
+                await asyncio.sleep(min(arguments.interval, max(stop_at - time.monotonic(), 0)))
+                line, previous = await record(client, admin_headers, started, counters, baseline, previous,
+                                              arguments.top, not arguments.target)
+                output.write(json.dumps(line) + "\n")
+                output.flush()
+                print(f"{line['elapsed_seconds']:.0f}s: {line['requests']} requests, {line['errors']} errors, "
+                      f"RSS {line['rss_bytes'] / 2 ** 20:.1f} MiB, traced {line['traced_bytes'] / 2 ** 20:.1f} MiB",
+                      file=sys.stderr)
+            await asyncio.gather(*drivers)
+
+        if line is not None:
+            hours = max(line["elapsed_seconds"], 1) / 3600
+            growth = line["rss_bytes"] - baseline_line["rss_bytes"]
+            print(f"RSS grew by {growth / 2 ** 20:.1f} MiB over {hours:.2f}h "
+                  f"({growth / hours / 2 ** 20:.1f} MiB/h), details in {arguments.output}", file=sys.stderr)
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+        await client.aclose()
+        stand_ins.terminate()
+
+
+def _parse_arguments(arguments: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m app.soak", description="Memory soak test of the app.")
+    parser.add_argument("--duration", type=float, default=3600, help="Seconds to run, default 3600.")
+    parser.add_argument("--interval", type=float, default=60, help="Seconds between two memory records, default 60.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients, default 8.")
+    parser.add_argument("--symbols", type=int, default=500, help="Distinct symbols requested, default 500.")
+    parser.add_argument("--top", type=int, default=10, help="Top allocations recorded, default 10.")
+    parser.add_argument("--page-kb", type=int, default=200, help="Size of the stand-in quote pages, default 200.")
+    parser.add_argument("--upstream-latency-ms", type=float, default=50, help="Stand-in latency, default 50.")
+    parser.add_argument("--upstream-port", type=int, default=0, help="Port of the stand-ins, random by default.")
+    parser.add_argument("--target", help="URL of a running worker to drive instead of an in-process app.")
+    parser.add_argument("--admin-token", help="ADMIN_TOKEN of the target worker, $ADMIN_TOKEN by default.")
+    parser.add_argument("--output", default=f"soak-{date.today().isoformat()}.jsonl", help="JSON lines output file.")
+    return parser.parse_args(arguments)
+
+
+if __name__ == "__main__":
+    asyncio.run(soak(_parse_arguments(sys.argv[1:])))
@@ -0,0 +1,186 @@
+# app/tickers.py
+import asyncio
+import csv
+import os
+import sys
+from bisect import bisect_left
+from typing import Annotated
+import httpx
+from fastapi import Depends
+from app.exceptions import InvalidAPIRequestError
+from app.logger import logger
+from app.polygon_keys import polygon_get
+from app.utils import (
+    get_ticker_reference_path,
+    get_ticker_validation_enabled,
+    get_ticker_refresh_interval,
+    get_polygon_api_url
+)
+
+
+# First line of the reference files written by download_ticker_reference, which list every active ticker
+COMPLETE_MARKER = "# complete"
+
+
+def normalize_stock_symbol(stock_symbol: str) -> str:
+    """
+    Normalize a stock symbol: upper case, no surrounding spaces and "." as share class separator (BRK-B -> BRK.B).
+    """
+    return stock_symbol.strip().upper().replace("-", ".").replace("/", ".")
+
+
+class TickerIndex:
+    """
+    In-memory index of the known tickers, kept as parallel sorted tuples so that
+    membership checks and prefix searches are binary searches. Only a complete index
+    can tell that a symbol does not exist.
+    """
+    __slots__ = ("symbols", "names", "mtime", "complete")
+
+    def __init__(self, rows: list[tuple[str, str]], mtime: float = 0.0, complete: bool = False):
+        rows = sorted({normalize_stock_symbol(symbol): name for symbol, name in rows if symbol}.items())
+        self.symbols = tuple(symbol for symbol, _ in rows)
+        self.names = tuple(name for _, name in rows)
+        self.mtime = mtime
+        self.complete = complete
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, stock_symbol: str) -> bool:
+        position = bisect_left(self.symbols, stock_symbol)
+        return position < len(self.symbols) and self.symbols[position] == stock_symbol
+
+    def search(self, prefix: str, limit: int = 10) -> list[dict]:
+        """
+        Get the tickers starting with the given prefix, in alphabetical order.
+        """
+        prefix = normalize_stock_symbol(prefix)
+        results = []
+        position = bisect_left(self.symbols, prefix)
+        while position < len(self.symbols) and len(results) < limit and self.symbols[position].startswith(prefix):
+            results.append({"symbol": self.symbols[position], "name": self.names[position]})
+            position += 1
+        return results
+
+    @classmethod
+    def from_file(cls, path: str) -> "TickerIndex":
+        """
+        Load the index from a "symbol,name" CSV reference file, complete when it starts with the COMPLETE_MARKER line.
+        """
+        with open(path, newline="", encoding="utf-8") as file:
+            complete = file.readline().startswith(COMPLETE_MARKER)
+            if not complete:
+                file.seek(0)
+            rows = [(row["symbol"], row.get("name") or "") for row in csv.DictReader(file)]
+        return cls(rows, mtime=os.path.getmtime(path), complete=complete)
+
+
+_index: TickerIndex | None = None
+
+
+def get_ticker_index() -> TickerIndex:
+    """
+    Get the ticker index of the worker, loading it from the reference file on first use.
+    """
+    global _index
+    if _index is None:
+        _index = TickerIndex.from_file(get_ticker_reference_path())
+        logger.info(f"Loaded {len(_index)} tickers from {get_ticker_reference_path()}")
+        if not ticker_validation_active():
+            logger.warning("Stock symbols are not validated: the ticker reference file is not a complete download, "
+                           "run python -m app.tickers or set TICKER_VALIDATION_ENABLED=true")
+    return _index
+
+
+def reload_ticker_index_if_changed() -> bool:
+    """
+    Reload the ticker index when the reference file was modified since it was loaded.
+    """
+    global _index
+    path = get_ticker_reference_path()
+    if _index is not None and os.path.getmtime(path) == _index.mtime:
+        return False
+    _index = TickerIndex.from_file(path)
+    logger.info(f"Reloaded {len(_index)} tickers from {path}")
+    return True
+
+
+async def refresh_ticker_index_periodically():
+    """
+    Background task of the app lifespan that picks up updates of the reference file.
+    """
+    while True:
+        await asyncio.sleep(get_ticker_refresh_interval())
+        try:
+            reload_ticker_index_if_changed()
+        except Exception as e:
+            logger.error(f"Failed to reload the ticker index: {e}")
+
+
+def ticker_validation_active() -> bool:
+    """
+    Check whether unknown symbols are rejected: as set by TICKER_VALIDATION_ENABLED, or when it is unset,
+    only when the index is complete, since the bundled reference file only lists major tickers.
+    """
+    enabled = get_ticker_validation_enabled()
+    return get_ticker_index().complete if enabled is None else enabled
+
+
+def valid_stock_symbol(stock_symbol: str) -> str:
+    """
+    FastAPI dependency normalizing the {stock_symbol} path parameter and rejecting unknown tickers
+    before any upstream call is made.
+    """
+    stock_symbol = normalize_stock_symbol(stock_symbol)
+    if ticker_validation_active() and stock_symbol not in get_ticker_index():
+        raise InvalidAPIRequestError(
+            message=f"Unknown stock symbol {stock_symbol}.",
+            error_detail={"error": "The stock symbol is not in the ticker reference index."},
+            status_code=404
+        )
+    return stock_symbol
+
+
+# Annotation for the {stock_symbol} path parameter of the routes
+StockSymbol = Annotated[str, Depends(valid_stock_symbol)]
+
+
+def is_known_stock_symbol(stock_symbol: str) -> bool:
+    """
+    Check a symbol against the index, every symbol being accepted when validation is not active.
+    """
+    return not ticker_validation_active() or normalize_stock_symbol(stock_symbol) in get_ticker_index()
+
+
+async def download_ticker_reference(path: str):
+    """
+    Download the active US stock tickers from the Polygon reference API and write them as the reference file.
+    """
+    url = f"{get_polygon_api_url()}/v3/reference/tickers"
+    params = {"market": "stocks", "active": "true", "limit": 1000}
+    rows = []
+    async with httpx.AsyncClient(timeout=30) as client:
+        while url:
+            response = await polygon_get(client, url, params)
+            response.raise_for_status()
+            payload = response.json()
+            rows.extend((ticker["ticker"], ticker.get("name", "")) for ticker in payload.get("results", []))
+            # The next page URL already carries the query, only the API key must be sent again
+            url = payload.get("next_url")
+            params = None
+
+    # Write to a temporary file first so that workers never read a partial file
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", newline="", encoding="utf-8") as file:
+        file.write(f"{COMPLETE_MARKER}: {len(rows)} active tickers from {get_polygon_api_url()}\n")
+        writer = csv.writer(file)
+        writer.writerow(["symbol", "name"])
+        writer.writerows(sorted(rows))
+    os.replace(temporary_path, path)
+    logger.info(f"Wrote {len(rows)} tickers to {path}")
+
+
+if __name__ == "__main__":
+    # Refresh the reference file: python -m app.tickers [path]
+    asyncio.run(download_ticker_reference(sys.argv[1] if len(sys.argv) > 1 else get_ticker_reference_path()))
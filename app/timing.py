@@ -0,0 +1,111 @@
+# app/timing.py
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from fastapi import Request
+
+# Upper bounds of the histogram buckets, in milliseconds; the last bucket is unbounded
+BUCKET_BOUNDS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Durations of the stages run by the current request, accumulated per stage name
+_request_stages: ContextVar[dict | None] = ContextVar("request_stages", default=None)
+
+
+class Histogram:
+    """
+    Cumulative latency histogram with fixed buckets, cheap enough to update on every request.
+    """
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, duration_ms: float):
+        self.counts[bisect_left(BUCKET_BOUNDS_MS, duration_ms)] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Estimate a quantile as the upper bound of the bucket containing it.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for position, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return BUCKET_BOUNDS_MS[position] if position < len(BUCKET_BOUNDS_MS) else self.max_ms
+        return self.max_ms
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p90_ms": self.quantile(0.9),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": {
+                **{f"le_{bound}": count for bound, count in zip(BUCKET_BOUNDS_MS, self.counts)},
+                "inf": self.counts[-1]
+            }
+        }
+
+
+stage_histograms: dict[str, Histogram] = {}
+
+
+def _observe(stage: str, duration_ms: float):
+    histogram = stage_histograms.get(stage)
+    if histogram is None:
+        histogram = stage_histograms[stage] = Histogram()
+    histogram.observe(duration_ms)
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Time a stage of the request being served, e.g. `with timed("db"): ...`.
+    Stages run several times by a request (e.g. two queries) are summed in its Server-Timing header.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        _observe(stage, duration_ms)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0.0) + duration_ms
+
+
+async def server_timing_middleware(request: Request, call_next):
+    """
+    HTTP middleware reporting the stage durations of each request in a Server-Timing header.
+    """
+    # The dict is shared with the request handler, which runs in a copy of this context
+    stages = {}
+    token = _request_stages.set(stages)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _request_stages.reset(token)
+    total_ms = (time.perf_counter() - start) * 1000
+    _observe("total", total_ms)
+
+    metrics = [f"{stage};dur={duration_ms:.1f}" for stage, duration_ms in stages.items()]
+    metrics.append(f"total;dur={total_ms:.1f}")
+    response.headers["Server-Timing"] = ", ".join(metrics)
+    return response
+
+
+def timing_stats() -> dict:
+    return {stage: histogram.stats() for stage, histogram in sorted(stage_histograms.items())}
@@ -67,5 +67,276 @@ def get_polygon_base_url():
 def get_polygon_api_key():
     return os.getenv("POLYGON_API_KEY")
 
+def get_polygon_api_keys():
+    # Comma-separated pool of Polygon keys, falling back to the single POLYGON_API_KEY
+    keys = [key.strip() for key in os.getenv("POLYGON_API_KEYS", "").split(",") if key.strip()]
+    return keys or [get_polygon_api_key()]
+
 def get_marketwatch_base_url():
     return os.getenv("MARKETWATCH_BASE_URL")
+
+
+def _getenv_int(name: str, default: int | None) -> int | None:
+    """
+    Read an integer setting from the environment, falling back to default when unset or empty.
+    """
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return int(value)
+
+def _getenv_float(name: str, default: float) -> float:
+    """
+    Read a float setting from the environment, falling back to default when unset or empty.
+    """
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return float(value)
+
+def _getenv_bool(name: str, default: bool) -> bool:
+    """
+    Read a boolean setting ("1", "true", "yes", "on") from the environment.
+    """
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+def get_web_host():
+    return os.getenv("WEB_HOST", "0.0.0.0")
+
+def get_web_port():
+    return _getenv_int("PORT", 8000)
+
+def get_web_concurrency():
+    # Number of worker processes, defaults to the number of available cores.
+    return max(1, _getenv_int("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+def get_worker_max_requests():
+    # Recycle a worker after it served this many requests to keep its memory bounded. 0 disables recycling.
+    return _getenv_int("WORKER_MAX_REQUESTS", 10000) or None
+
+def get_graceful_shutdown_timeout():
+    # Seconds a worker waits for in-flight requests to finish after SIGTERM.
+    return _getenv_int("GRACEFUL_SHUTDOWN_TIMEOUT", 30)
+
+def get_keep_alive_timeout():
+    return _getenv_int("KEEP_ALIVE_TIMEOUT", 5)
+
+def get_db_echo():
+    return _getenv_bool("DB_ECHO", False)
+
+def get_db_pool_size():
+    return _getenv_int("DB_POOL_SIZE", 5)
+
+def get_db_max_overflow():
+    return _getenv_int("DB_MAX_OVERFLOW", 10)
+
+def get_db_pool_recycle():
+    return _getenv_int("DB_POOL_RECYCLE", 1800)
+
+def get_http_max_connections():
+    return _getenv_int("HTTP_MAX_CONNECTIONS", 100)
+
+def get_http_max_keepalive_connections():
+    return _getenv_int("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)
+
+def get_http_timeout():
+    return _getenv_float("HTTP_TIMEOUT", 10.0)
+
+def get_executor_max_workers():
+    # None lets concurrent.futures pick its own default (min(32, cpu_count + 4)).
+    return _getenv_int("EXECUTOR_MAX_WORKERS", None)
+
+def get_cache_max_bytes():
+    # Memory budget of the stock cache of each worker
+    return _getenv_int("CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+def get_cache_protected_ratio():
+    # Share of the cache budget reserved to entries that were hit at least once
+    return _getenv_float("CACHE_PROTECTED_RATIO", 0.8)
+
+def get_cache_ttl():
+    return _getenv_int("CACHE_TTL", 60)
+
+def get_cache_stale_grace():
+    # Seconds expired stock and scraped entries can still be served when upstream calls are shed
+    return _getenv_int("CACHE_STALE_GRACE", 86400)
+
+def get_portfolio_fetch_concurrency():
+    # Maximum number of concurrent Polygon calls made to price a portfolio
+    return _getenv_int("PORTFOLIO_FETCH_CONCURRENCY", 10)
+
+def get_competitor_prefetch_enabled():
+    # Prefetch the competitors of a requested symbol into the cache in the background
+    return _getenv_bool("COMPETITOR_PREFETCH_ENABLED", False)
+
+def get_competitor_prefetch_limit():
+    return _getenv_int("COMPETITOR_PREFETCH_LIMIT", 5)
+
+def get_polygon_api_url():
+    # Root of the Polygon API, used for the endpoints other than open/close
+    return os.getenv("POLYGON_API_URL", "https://api.polygon.io")
+
+def get_ticker_reference_path():
+    return os.getenv("TICKER_REFERENCE_PATH", os.path.join(os.path.dirname(__file__), "data", "tickers.csv"))
+
+def get_ticker_validation_enabled():
+    # Unset, unknown symbols are rejected only when the reference file is a complete download (python -m app.tickers)
+    if os.getenv("TICKER_VALIDATION_ENABLED", "").strip() == "":
+        return None
+    return _getenv_bool("TICKER_VALIDATION_ENABLED", False)
+
+def get_ticker_refresh_interval():
+    # Seconds between two checks for an updated ticker reference file
+    return _getenv_int("TICKER_REFRESH_INTERVAL", 3600)
+
+def get_negative_cache_ttl(error_class: str):
+    # Seconds a known-permanent upstream outcome is remembered, per error class
+    defaults = {"not_found": 300, "no_trading_day": 900, "missing_section": 120}
+    return _getenv_int(f"NEGATIVE_CACHE_TTL_{error_class.upper()}", defaults[error_class])
+
+def get_negative_cache_maxsize():
+    return _getenv_int("NEGATIVE_CACHE_MAXSIZE", 10000)
+
+def get_session_data_delay():
+    # Seconds after the session close before its daily data is available upstream
+    return _getenv_int("SESSION_DATA_DELAY", 1800)
+
+def get_marketwatch_cache_ttl():
+    # Scraped MarketWatch data does not follow the trading sessions, it has its own TTL
+    return _getenv_int("MARKETWATCH_CACHE_TTL", 3600)
+
+def get_marketwatch_cache_max_bytes():
+    return _getenv_int("MARKETWATCH_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+
+def get_price_cache_max_bytes():
+    return _getenv_int("PRICE_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+
+def get_bulk_ingest_enabled():
+    # Ingest the whole market's daily bars after each session close and keep them in the price cache
+    return _getenv_bool("BULK_INGEST_ENABLED", False)
+
+def get_bulk_ingest_retry_interval():
+    return _getenv_int("BULK_INGEST_RETRY_INTERVAL", 300)
+
+def get_admin_token():
+    # Token expected in the X-Admin-Token header of the admin endpoints, which are disabled when unset
+    return os.getenv("ADMIN_TOKEN")
+
+def get_profiler_enabled():
+    return _getenv_bool("PROFILER_ENABLED", False)
+
+def get_profiler_interval():
+    # Sampling interval of the profiler, configured in milliseconds
+    return _getenv_float("PROFILER_INTERVAL_MS", 5.0) / 1000
+
+def get_profiler_max_seconds():
+    return _getenv_float("PROFILER_MAX_SECONDS", 60.0)
+
+def get_holdings_listen_enabled():
+    # Keep the in-memory holdings of every worker current through Postgres LISTEN/NOTIFY
+    return _getenv_bool("HOLDINGS_LISTEN_ENABLED", True)
+
+def get_holdings_reconnect_interval():
+    return _getenv_int("HOLDINGS_RECONNECT_INTERVAL", 5)
+
+def get_holdings_export_batch_size():
+    # Rows fetched per round trip by the server-side cursor of the holdings export
+    return _getenv_int("HOLDINGS_EXPORT_BATCH_SIZE", 1000)
+
+def get_page_archive_enabled():
+    return _getenv_bool("PAGE_ARCHIVE_ENABLED", True)
+
+def get_page_archive_dir():
+    return os.getenv("PAGE_ARCHIVE_DIR", os.path.join(os.path.dirname(__file__), "data", "page_archive"))
+
+def get_page_archive_compression():
+    # zstd when the zstandard package is installed, gzip otherwise
+    return os.getenv("PAGE_ARCHIVE_COMPRESSION", "zstd").lower()
+
+def get_page_archive_max_versions():
+    # Archived versions of a symbol's page kept referenced, older ones are removed by the garbage collection
+    return _getenv_int("PAGE_ARCHIVE_MAX_VERSIONS", 10)
+
+def get_page_archive_gc_interval():
+    # Seconds between two removals of the archived pages no version references anymore
+    return _getenv_int("PAGE_ARCHIVE_GC_INTERVAL", 3600)
+
+def get_admission_max_concurrency(upstream: str | None = None):
+    # Concurrent in-flight upstream calls per worker, overall or for one upstream (ADMISSION_POLYGON_MAX_CONCURRENCY, ...)
+    if upstream is None:
+        return _getenv_int("ADMISSION_MAX_CONCURRENCY", 64)
+    defaults = {"polygon": 32, "marketwatch": 16}
+    return _getenv_int(f"ADMISSION_{upstream.upper()}_MAX_CONCURRENCY", defaults[upstream])
+
+def get_admission_max_queue():
+    # Calls allowed to wait for a slot, further calls are shed right away
+    return _getenv_int("ADMISSION_MAX_QUEUE", 128)
+
+def get_admission_queue_timeout():
+    # Seconds a call may wait for a slot before it is shed
+    return _getenv_float("ADMISSION_QUEUE_TIMEOUT", 2.0)
+
+def get_admission_retry_after():
+    return _getenv_int("ADMISSION_RETRY_AFTER", 1)
+
+def get_performance_source():
+    # "marketwatch" scrapes the performance data, "bars" computes it from the stored daily closes
+    return os.getenv("PERFORMANCE_SOURCE", "marketwatch").lower()
+
+def get_performance_backfill_enabled():
+    # Fetch a year of daily bars from Polygon for the symbols whose stored history is too short
+    return _getenv_bool("PERFORMANCE_BACKFILL_ENABLED", True)
+
+def get_performance_cache_max_bytes():
+    return _getenv_int("PERFORMANCE_CACHE_MAX_BYTES", 4 * 1024 * 1024)
+
+def get_marketwatch_profile_cache_ttl():
+    # TTL of scraped MarketWatch data when it only provides the company name and competitors
+    return _getenv_int("MARKETWATCH_PROFILE_CACHE_TTL", 86400)
+
+def get_compression_min_size():
+    # Responses smaller than this are sent uncompressed, compression would not pay for itself
+    return _getenv_int("COMPRESSION_MIN_SIZE", 500)
+
+def get_compression_gzip_level():
+    return _getenv_int("COMPRESSION_GZIP_LEVEL", 6)
+
+def get_compression_brotli_quality():
+    # brotli is used when the optional brotli package is installed
+    return _getenv_int("COMPRESSION_BROTLI_QUALITY", 5)
+
+def get_polygon_key_requests_per_minute():
+    # Requests per minute allowed to each key by this worker (its share of the key's quota), 0 for unlimited
+    return _getenv_int("POLYGON_KEY_REQUESTS_PER_MINUTE", 0)
+
+def get_polygon_key_cooldown():
+    # Seconds a rate limited key is left aside when Polygon does not send a Retry-After header
+    return _getenv_int("POLYGON_KEY_COOLDOWN", 60)
+
+def get_polygon_key_auth_cooldown():
+    # Seconds a key rejected as unknown or revoked (401) is left aside
+    return _getenv_int("POLYGON_KEY_AUTH_COOLDOWN", 3600)
+
+def get_cache_snapshot_enabled():
+    # Save the caches on shutdown and periodically, and load them back on startup
+    return _getenv_bool("CACHE_SNAPSHOT_ENABLED", True)
+
+def get_cache_snapshot_path():
+    return os.getenv("CACHE_SNAPSHOT_PATH", os.path.join(os.path.dirname(__file__), "data", "cache_snapshot.bin"))
+
+def get_cache_snapshot_interval():
+    return _getenv_int("CACHE_SNAPSHOT_INTERVAL", 300)
+
+def get_memory_trace_enabled():
+    # Trace the allocations with tracemalloc from startup, otherwise from the first memory snapshot
+    return _getenv_bool("MEMORY_TRACE_ENABLED", False)
+
+def get_memory_trace_frames():
+    # Frames kept per traced allocation, more frames give better tracebacks at a higher cost
+    return _getenv_int("MEMORY_TRACE_FRAMES", 10)
+
+def get_memory_max_snapshots():
+    return _getenv_int("MEMORY_MAX_SNAPSHOTS", 10)
@@ -0,0 +1,26 @@
+# tests/conftest.py
+
+import pytest
+from datetime import date
+from decimal import Decimal
+from app.schemas import Stock, StockValues, PerformanceData, Competitor, MarketCap
+
+
+@pytest.fixture
+def stock() -> Stock:
+    return Stock(
+        status="OK",
+        purchased_amount=Decimal("10.5"),
+        purchased_status="Purchased",
+        request_date=date(2024, 11, 27),
+        company_code="AAPL",
+        company_name="Apple Inc.",
+        stock_values=StockValues(open=234.465, high=235.69, low=233.8101, close=234.93),
+        performance_data=PerformanceData(five_days=0.0289, one_month=0.0792, three_months=0.0462,
+                                         year_to_date=0.2444, one_year=0.2648),
+        competitors=[
+            Competitor(name="Microsoft Corp.", symbol="MSFT", market_cap=MarketCap(currency="$", value=Decimal("3.15E+12"))),
+            Competitor(name="Samsung Electronics Co. Ltd.", market_cap=MarketCap(currency="₩", value=Decimal("3.575E+14"))),
+            Competitor(name="Tiny Co.", market_cap=MarketCap(currency="$", value=Decimal("1234.5")))
+        ]
+    )
@@ -0,0 +1,65 @@
+# tests/test_admission.py
+
+import asyncio
+import time
+import pytest
+from app.admission import AdmissionLimiter, admit, reset_limiters, admission_stats
+from app.exceptions import ServiceOverloadedError
+
+
+@pytest.mark.asyncio
+async def test_limiter_sheds_when_queue_is_full():
+    limiter = AdmissionLimiter("test", max_concurrency=1, max_queue=1)
+    deadline = time.monotonic() + 5
+    await limiter.acquire(deadline)
+
+    waiter = asyncio.ensure_future(limiter.acquire(deadline))
+    await asyncio.sleep(0)
+    assert limiter.stats()["queue_depth"] == 1
+
+    with pytest.raises(ServiceOverloadedError) as exc_info:
+        await limiter.acquire(deadline)
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.retry_after >= 1
+
+    limiter.release()
+    await waiter
+    stats = limiter.stats()
+    assert stats["in_flight"] == 1
+    assert stats["admitted"] == 2
+    assert stats["shed_queue_full"] == 1
+
+
+@pytest.mark.asyncio
+async def test_limiter_sheds_past_deadline():
+    limiter = AdmissionLimiter("test", max_concurrency=1, max_queue=10)
+    await limiter.acquire(time.monotonic() + 5)
+
+    with pytest.raises(ServiceOverloadedError):
+        await limiter.acquire(time.monotonic() + 0.05)
+    assert limiter.stats()["shed_deadline"] == 1
+    assert limiter.stats()["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_admit_holds_upstream_and_global_slots(monkeypatch):
+    monkeypatch.setenv("ADMISSION_POLYGON_MAX_CONCURRENCY", "2")
+    monkeypatch.setenv("ADMISSION_MAX_QUEUE", "0")
+    reset_limiters()
+
+    async with admit("polygon"), admit("polygon"):
+        stats = admission_stats()
+        assert stats["polygon"]["in_flight"] == 2
+        assert stats["global"]["in_flight"] == 2
+        with pytest.raises(ServiceOverloadedError):
+            async with admit("polygon"):
+                pass
+        # MarketWatch calls are not held back by the saturated Polygon limit
+        async with admit("marketwatch"):
+            pass
+
+    stats = admission_stats()
+    assert stats["polygon"]["in_flight"] == 0
+    assert stats["global"]["in_flight"] == 0
+    assert stats["polygon"]["shed_queue_full"] == 1
+    reset_limiters()
@@ -0,0 +1,121 @@
+# tests/test_cache.py
+
+from app.cache import SizedCache, CompactStock
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Blob:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+
+def test_compact_stock_round_trip(stock):
+    compact = CompactStock.from_stock(stock)
+
+    assert compact.to_stock() == stock
+    assert compact.nbytes > 0
+
+
+def test_sized_cache_respects_byte_budget():
+    cache = SizedCache(max_bytes=3000, ttl=60)
+    for index in range(10):
+        cache[f"S{index}"] = Blob(800)
+
+    assert cache.current_bytes <= 3000
+    assert cache.stats()["evictions"] > 0
+    assert "S9" in cache
+    assert "S0" not in cache
+
+
+def test_sized_cache_protects_entries_hit_before():
+    cache = SizedCache(max_bytes=3000, ttl=60)
+    cache["HOT"] = Blob(800)
+    assert cache.get("HOT") is not None
+
+    # A scan of one-off entries evicts other probation entries, not the hot one
+    for index in range(10):
+        cache[f"S{index}"] = Blob(800)
+    assert "HOT" in cache
+
+
+def test_sized_cache_rejects_oversized_entries():
+    cache = SizedCache(max_bytes=1000, ttl=60)
+    cache["BIG"] = Blob(5000)
+
+    assert "BIG" not in cache
+    assert cache.stats()["rejections"] == 1
+
+
+def test_sized_cache_entry_ttl():
+    timer = FakeTimer()
+    cache = SizedCache(max_bytes=10000, ttl=60, timer=timer)
+    cache.set("SHORT", Blob(10), ttl=5)
+    cache["DEFAULT"] = Blob(10)
+
+    timer.now = 10
+    assert cache.get("SHORT") is None
+    assert cache.get("DEFAULT") is not None
+    timer.now = 61
+    assert "DEFAULT" not in cache
+    assert cache.current_bytes == 0
+
+
+def test_sized_cache_get_stale():
+    timer = FakeTimer()
+    cache = SizedCache(max_bytes=10_000, ttl=10, timer=timer, stale_grace=100)
+    cache["AAPL"] = Blob(100)
+    timer.now = 20
+
+    assert cache.get_stale("AAPL") is not None
+    assert cache.get_stale("MSFT") is None
+    assert cache.stats()["hits"] == 0
+    assert cache.get("AAPL") is None
+    assert "AAPL" not in cache
+    # Expired entries stay readable as stale data for every request of the grace period
+    assert cache.get_stale("AAPL") is not None
+    assert cache.get_stale("AAPL") is not None
+
+    timer.now = 111
+    assert cache.get_stale("AAPL") is None
+    assert cache.current_bytes == 0
+    assert cache.stats()["expirations"] == 1
+
+
+def test_sized_cache_without_stale_grace_drops_expired_entries():
+    timer = FakeTimer()
+    cache = SizedCache(max_bytes=10_000, ttl=10, timer=timer)
+    cache["AAPL"] = Blob(100)
+    timer.now = 20
+
+    assert cache.get("AAPL") is None
+    assert cache.get_stale("AAPL") is None
+
+
+def test_sized_cache_evicts_expired_entries_first_on_session_rollover():
+    timer = FakeTimer()
+    cache = SizedCache(max_bytes=20_000, ttl=100, timer=timer, stale_grace=100)
+    cache.set(("OLD", 0), Blob(4000), ttl=1)
+    # Previous session: hit twice, so promoted to the protected segment
+    for symbol in ("AAPL", "MSFT", "NVDA"):
+        cache.set((symbol, 1), Blob(4000))
+        cache.get((symbol, 1))
+
+    # Rollover: the previous session expires and the new one fills the cache
+    timer.now = 150
+    for symbol in ("AAPL", "MSFT", "NVDA"):
+        cache.set((symbol, 2), Blob(4000))
+
+    # The fresh entries are kept, the expired ones made room, the one past its stale grace first
+    assert all((symbol, 2) in cache for symbol in ("AAPL", "MSFT", "NVDA"))
+    assert ("OLD", 0) not in cache.probation
+    assert list(cache.protected) == [("NVDA", 1)]
+    assert cache.get_stale(("NVDA", 1)) is not None
+    assert cache.stats()["evictions"] == 0
+    assert cache.stats()["expirations"] == 3
@@ -0,0 +1,86 @@
+# tests/test_cache_snapshot.py
+
+import time
+import pytest
+from datetime import date
+from app.cache import cache, price_cache, scrape_cache, session_key, CompactStock
+from app.cache_snapshot import save_snapshot, load_snapshot, write_snapshot
+from app.compression import EncodedBody
+from app.performance import performance_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    for sized_cache in (cache, price_cache, scrape_cache, performance_cache):
+        sized_cache.clear()
+    yield
+    for sized_cache in (cache, price_cache, scrape_cache, performance_cache):
+        sized_cache.clear()
+
+
+def test_snapshot_round_trip(tmp_path, stock):
+    path = str(tmp_path / "cache_snapshot.bin")
+    key = session_key("AAPL", date(2024, 11, 27))
+    compact = CompactStock.from_stock(stock)
+    compact.set_body(EncodedBody(b'{"status": "OK"}'))
+    cache.set(key, compact, ttl=600)
+    assert cache.get(key) is not None  # promoted to the protected segment
+    price_cache.set(key, {"close": 234.93, "session_date": date(2024, 11, 27)}, ttl=600)
+    scrape_cache.set("AAPL", {"company_name": "Apple Inc."}, ttl=0.01)
+    time.sleep(0.02)
+
+    assert save_snapshot(path) == 2
+    cache.clear()
+    price_cache.clear()
+
+    assert load_snapshot(path) == 2
+    restored = cache.get(key)
+    assert restored.to_stock() == stock
+    assert restored.body.content == b'{"status": "OK"}'
+    assert key in cache.protected
+    assert price_cache.get(key)["close"] == 234.93
+    assert "AAPL" not in scrape_cache
+    # The remaining TTL is kept, not reset to the cache default
+    assert 590 < price_cache.live_entries()[0][2] <= 600
+
+
+def test_snapshot_skips_expired_and_carries_other_entries(tmp_path):
+    path = str(tmp_path / "cache_snapshot.bin")
+    now = time.time()
+    # Written by another worker: one live entry, one that expires before the next load
+    write_snapshot([(2, False, now + 600, "MSFT", {"company_name": "Microsoft Corp."}),
+                    (2, False, now + 0.01, "IBM", {"company_name": "IBM"})], path)
+    scrape_cache.set("AAPL", {"company_name": "Apple Inc."}, ttl=600)
+    time.sleep(0.02)
+
+    # The entries of this worker are added to the live ones of the previous snapshot
+    assert save_snapshot(path) == 2
+    scrape_cache.clear()
+    assert load_snapshot(path) == 2
+    assert scrape_cache.get("MSFT") == {"company_name": "Microsoft Corp."}
+    assert scrape_cache.get("AAPL") == {"company_name": "Apple Inc."}
+    assert "IBM" not in scrape_cache
+
+
+def test_concurrent_snapshot_writes_keep_every_entry(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    path = str(tmp_path / "cache_snapshot.bin")
+    now = time.time()
+    symbols = [f"SYM{index}" for index in range(16)]
+
+    # Each writer merges its own entry into the snapshot written by the others
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda symbol: write_snapshot([(2, False, now + 600, symbol, {"company_name": symbol})], path),
+                          symbols))
+
+    scrape_cache.clear()
+    assert load_snapshot(path) == len(symbols)
+    assert all(scrape_cache.get(symbol) == {"company_name": symbol} for symbol in symbols)
+    scrape_cache.clear()
+
+
+def test_load_snapshot_ignores_invalid_files(tmp_path):
+    path = tmp_path / "cache_snapshot.bin"
+    assert load_snapshot(str(path)) == 0
+    path.write_bytes(b"not a snapshot")
+    assert load_snapshot(str(path)) == 0
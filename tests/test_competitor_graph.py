@@ -0,0 +1,76 @@
+# tests/test_competitor_graph.py
+
+import pytest
+from decimal import Decimal
+from unittest.mock import Mock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models import CompetitorEdges
+from app.competitor_graph import (
+    save_competitors,
+    get_competitor_edges,
+    get_listed_by,
+    get_neighbor_symbols,
+    get_peers
+)
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite://")
+    CompetitorEdges.__table__.create(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def competitor(name, symbol, value):
+    return {"name": name, "symbol": symbol, "market_cap": {"currency": "$", "value": Decimal(value)}}
+
+
+def test_competitor_graph_lookups(db_session):
+    save_competitors(db_session, "aapl", [
+        competitor("Microsoft Corp.", "MSFT", "3.15E+12"),
+        competitor("Alphabet Inc. Cl A", "GOOGL", "2.08E+12"),
+        competitor("Alphabet Inc. Cl A", "GOOGL", "2.08E+12"),
+    ])
+    save_competitors(db_session, "NVDA", [competitor("Apple Inc.", "AAPL", "3.5E+12"), competitor("Microsoft Corp.", "MSFT", "3.15E+12")])
+
+    edges = get_competitor_edges(db_session, "AAPL")
+    assert [edge["competitor_symbol"] for edge in edges] == ["MSFT", "GOOGL"]
+
+    assert [edge["stock_symbol"] for edge in get_listed_by(db_session, "MSFT")] == ["AAPL", "NVDA"]
+    assert get_neighbor_symbols(db_session, "AAPL") == ["MSFT", "GOOGL", "NVDA"]
+
+    # NVDA both lists AAPL and shares MSFT as a competitor
+    peers = get_peers(db_session, "AAPL")
+    assert peers[0] == {"symbol": "NVDA", "score": 2}
+
+
+def test_save_competitors_replaces_edges(db_session):
+    save_competitors(db_session, "AAPL", [competitor("Microsoft Corp.", "MSFT", "3.15E+12")])
+    save_competitors(db_session, "AAPL", [competitor("HP Inc.", "HPQ", "3.414E+10")])
+
+    assert [edge["competitor_symbol"] for edge in get_competitor_edges(db_session, "AAPL")] == ["HPQ"]
+
+
+@pytest.mark.asyncio
+async def test_prefetch_competitors_releases_its_session(monkeypatch):
+    from app import main
+    session = Mock()
+    prefetched = []
+
+    async def build_stock(stock_symbol):
+        # The session was closed before the first upstream round-trip
+        session.close.assert_called_once()
+        prefetched.append(stock_symbol)
+
+    monkeypatch.setattr(main, "SessionLocal", lambda: session)
+    monkeypatch.setattr(main, "get_neighbor_symbols", lambda db_session, stock_symbol: ["HPQ", "MSFT"])
+    monkeypatch.setattr(main, "build_stock", build_stock)
+    monkeypatch.setattr(main, "is_known_stock_symbol", lambda stock_symbol: True)
+    main.cache.clear()
+
+    await main.prefetch_competitors("AAPL")
+
+    assert prefetched == ["HPQ", "MSFT"]
@@ -0,0 +1,117 @@
+# tests/test_compression.py
+
+import gzip
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from app import compression
+from app.compression import EncodedBody, compression_middleware, negotiate_encoding
+from app.cache import CompactStock, SizedCache
+
+PAYLOAD = {"competitors": [{"name": f"Company {index}", "symbol": f"S{index}"} for index in range(200)]}
+
+
+@pytest.fixture
+def without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+
+
+def test_negotiate_encoding(without_brotli):
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip, deflate, br") == "gzip"
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("*") == "gzip"
+
+
+def test_negotiate_encoding_prefers_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", object())
+    assert negotiate_encoding("gzip, br") == "br"
+    assert negotiate_encoding("gzip, br;q=0.5") == "gzip"
+
+
+def test_encoded_body_threshold(without_brotli, monkeypatch):
+    monkeypatch.setenv("COMPRESSION_MIN_SIZE", "100")
+    assert EncodedBody(b"{}").variants == {}
+
+    content = b'{"value": "' + b"x" * 1000 + b'"}'
+    body = EncodedBody(content, tag="5.0")
+    assert gzip.decompress(body.variants["gzip"]) == content
+    assert body.nbytes > len(content)
+    assert body.tag == "5.0"
+
+
+def test_compact_stock_counts_its_body(stock):
+    compact = CompactStock.from_stock(stock)
+    size = compact.nbytes
+    compact.set_body(EncodedBody(stock.model_dump_json().encode("utf-8")))
+    assert compact.nbytes > size
+
+
+def test_rendered_again_body_is_counted_in_the_cache(stock):
+    cache = SizedCache(max_bytes=1_000_000, ttl=60)
+    compact = CompactStock.from_stock(stock)
+    compact.set_body(EncodedBody(b"{}"))
+    cache.set("AAPL", compact)
+    before = cache.current_bytes
+
+    compact.set_body(EncodedBody(stock.model_dump_json().encode("utf-8") * 4))
+    cache.resize("AAPL", compact)
+
+    assert cache.current_bytes > before + 3 * len(stock.model_dump_json())
+    # The segment totals follow the entry, nothing is left over once it is removed
+    cache.pop("AAPL")
+    assert cache.current_bytes == 0
+
+
+def make_client() -> TestClient:
+    app = FastAPI()
+    app.middleware("http")(compression_middleware)
+
+    @app.get("/large")
+    async def large():
+        return PAYLOAD
+
+    @app.get("/small")
+    async def small():
+        return {"status": "OK"}
+
+    @app.get("/text")
+    async def text():
+        return PlainTextResponse("line\n" * 1000)
+
+    @app.get("/stream")
+    async def stream():
+        return StreamingResponse(iter([b"{}"] * 1000), media_type="application/json")
+
+    @app.get("/precompressed")
+    async def precompressed(request: Request):
+        return EncodedBody(b'{"value": "' + b"y" * 2000 + b'"}').response(request)
+
+    return TestClient(app)
+
+
+def test_compression_middleware(without_brotli):
+    client = make_client()
+
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert response.json() == PAYLOAD
+
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert client.get("/text", headers={"Accept-Encoding": "gzip"}).headers["content-encoding"] == "gzip"
+    assert "content-encoding" not in client.get("/stream", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_precompressed_bodies_pass_through(without_brotli):
+    response = make_client().get("/precompressed", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.json()["value"] == "y" * 2000
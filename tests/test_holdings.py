@@ -0,0 +1,86 @@
+# tests/test_holdings.py
+
+import json
+import pytest
+from decimal import Decimal
+from types import SimpleNamespace
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models import Stocks
+from app.holdings import HoldingsMap, HoldingsListener, holdings, notify_holding_changed
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite://")
+    Stocks.__table__.create(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def test_holdings_map_load_and_set(db_session):
+    db_session.add_all([Stocks(stock_symbol="AAPL", purchased_amount=Decimal("5.33")),
+                        Stocks(stock_symbol="msft", purchased_amount=Decimal("2"))])
+    db_session.commit()
+
+    holdings_map = HoldingsMap()
+    holdings_map.load(db_session)
+    assert holdings_map.get("aapl") == Decimal("5.33")
+    assert holdings_map.get("MSFT") == Decimal("2")
+    assert holdings_map.get("NVDA") is None
+
+    holdings_map.set("nvda", Decimal("1"))
+    assert sorted(holdings_map.items()) == [("AAPL", Decimal("5.33")), ("MSFT", Decimal("2")), ("NVDA", Decimal("1"))]
+
+
+def test_notify_is_skipped_outside_postgres(db_session):
+    notify_holding_changed(db_session, "AAPL", Decimal("1"))
+    db_session.commit()
+
+
+class FakeNotifyConnection:
+    """
+    Stand-in for a psycopg2 connection: poll() moves the pending notifications to `notifies`.
+    """
+
+    def __init__(self):
+        self.pending = []
+        self.notifies = []
+
+    def poll(self):
+        self.notifies.extend(self.pending)
+        self.pending.clear()
+
+
+def test_listener_applies_notifications(monkeypatch):
+    monkeypatch.setattr(holdings, "_amounts", {"AAPL": Decimal("1")})
+    monkeypatch.setattr(holdings, "loaded", True)
+    listener = HoldingsListener()
+    listener._connection = FakeNotifyConnection()
+    listener._connection.pending = [
+        SimpleNamespace(payload=json.dumps({"stock_symbol": "AAPL", "purchased_amount": "6.3300", "pid": 1})),
+        SimpleNamespace(payload="not json"),
+        SimpleNamespace(payload=json.dumps({"stock_symbol": "TSLA", "purchased_amount": "3", "pid": 1}))
+    ]
+
+    listener._on_readable()
+
+    assert holdings.get("AAPL") == Decimal("6.3300")
+    assert holdings.get("TSLA") == Decimal("3")
+    assert listener._connection.notifies == []
+
+
+@pytest.mark.asyncio
+async def test_listener_reconnect_reloads_off_the_event_loop(monkeypatch):
+    import threading
+    from app import holdings as holdings_module
+    listener = HoldingsListener()
+    reload_threads = []
+    monkeypatch.setattr(holdings_module, "get_holdings_reconnect_interval", lambda: 0)
+    monkeypatch.setattr(listener, "start", lambda: None)
+    monkeypatch.setattr(holdings, "reload", lambda: reload_threads.append(threading.current_thread()))
+
+    await listener._reconnect()
+
+    assert reload_threads and reload_threads[0] is not threading.main_thread()
@@ -0,0 +1,103 @@
+# tests/test_holdings_io.py
+
+import csv
+import json
+import pytest
+from decimal import Decimal
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models import Stocks
+from app.exceptions import InvalidAPIRequestError
+from app.holdings_io import HoldingsParser, iter_lines, aiter_blocks, iter_export
+
+
+@pytest.fixture(autouse=True)
+def no_ticker_validation(monkeypatch):
+    monkeypatch.setenv("TICKER_VALIDATION_ENABLED", "false")
+
+
+def spooled_rows(parser):
+    parser.spool.seek(0)
+    return list(csv.reader(parser.spool))
+
+
+def test_iter_lines_across_chunks():
+    chunks = [b"stock_symbol,purchased_amount\nAA", b"PL,5.33\r\nMSFT,2", b"\n\nNVDA,1"]
+    assert list(iter_lines(chunks)) == ["stock_symbol,purchased_amount", "AAPL,5.33\r", "MSFT,2", "", "NVDA,1"]
+
+
+@pytest.mark.asyncio
+async def test_aiter_blocks_keeps_lines_whole():
+    async def chunks():
+        for chunk in (b"stock_symbol,purchased_amount\nAA", b"PL,5.33\r\nMSFT,2", b"\n\nNVDA,1"):
+            yield chunk
+
+    blocks = [block async for block in aiter_blocks(chunks(), block_bytes=16)]
+    assert blocks == [b"stock_symbol,purchased_amount", b"AAPL,5.33\r\nMSFT,2\n", b"NVDA,1"]
+
+    parser = HoldingsParser("csv")
+    for block in blocks:
+        parser.feed_block(block)
+    assert spooled_rows(parser) == [["AAPL", "5.33"], ["MSFT", "2"], ["NVDA", "1"]]
+
+
+def test_parser_csv_and_ndjson():
+    parser = HoldingsParser("csv")
+    for line in ["purchased_amount,stock_symbol", "5.33, aapl", "", "2,brk-b"]:
+        parser.feed(line)
+    parser.raise_for_errors()
+    assert parser.rows == 2
+    assert spooled_rows(parser) == [["AAPL", "5.33"], ["BRK.B", "2"]]
+
+    parser = HoldingsParser("ndjson")
+    parser.feed(json.dumps({"stock_symbol": "msft", "purchased_amount": 1.25}))
+    assert spooled_rows(parser) == [["MSFT", "1.25"]]
+
+
+def test_parser_rejects_invalid_rows():
+    parser = HoldingsParser("csv")
+    for line in ["stock_symbol,purchased_amount", "AAPL,-1", "MSFT,1.00001", "NVDA,abc", "TSLA,3"]:
+        parser.feed(line)
+
+    assert parser.rows == 1
+    with pytest.raises(InvalidAPIRequestError) as exc_info:
+        parser.raise_for_errors()
+    assert exc_info.value.status_code == 400
+    assert [error["line"] for error in exc_info.value.error_detail["errors"]] == [2, 3, 4]
+
+    parser = HoldingsParser("csv")
+    parser.feed("symbol,amount")
+    with pytest.raises(InvalidAPIRequestError):
+        parser.raise_for_errors()
+
+
+def test_iter_export(monkeypatch):
+    engine = create_engine("sqlite://")
+    Stocks.__table__.create(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    with session_factory() as db_session:
+        db_session.add_all([Stocks(stock_symbol="MSFT", purchased_amount=Decimal("2.5")),
+                            Stocks(stock_symbol="AAPL", purchased_amount=Decimal("5.33"))])
+        db_session.commit()
+    monkeypatch.setattr("app.holdings_io.SessionLocal", session_factory)
+    monkeypatch.setenv("HOLDINGS_EXPORT_BATCH_SIZE", "1")
+
+    assert "".join(iter_export("csv")) == "stock_symbol,purchased_amount\nAAPL,5.3300\nMSFT,2.5000\n"
+    lines = "".join(iter_export("ndjson")).splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"stock_symbol": "AAPL", "purchased_amount": "5.3300"},
+        {"stock_symbol": "MSFT", "purchased_amount": "2.5000"}
+    ]
+
+
+def test_import_requires_admin_token(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app import main
+    monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+    imported = []
+    monkeypatch.setattr(main, "merge_holdings", lambda parser, mode: imported.append(mode))
+    client = TestClient(main.app)
+
+    response = client.post("/holdings/import?format=csv", content=b"stock_symbol,purchased_amount\nAAPL,1\n")
+    assert response.status_code == 403
+    assert imported == []
@@ -0,0 +1,128 @@
+# tests/test_ingest.py
+
+import httpx
+import pytest
+from datetime import date
+from unittest.mock import Mock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app import ingest
+from app.ingest import fetch_grouped_daily, parse_grouped_daily, fill_price_cache
+from app.cache import price_cache, session_key
+from app.exceptions import ExternalAPIError, InvalidAPIResponseError
+from app.models import DailyBars, IngestedSessions
+
+GROUPED_DAILY = {
+    "status": "OK",
+    "resultsCount": 3,
+    "results": [
+        {"T": "AAPL", "o": 234.47, "h": 235.69, "l": 233.81, "c": 234.93, "v": 33498439, "t": 1732741200000},
+        {"T": "MSFT", "o": 420.10, "h": 424.0, "l": 419.5, "c": 422.99, "v": 18332900.0, "t": 1732741200000},
+        {"T": "BROKEN", "o": 1.0, "t": 1732741200000}
+    ]
+}
+
+
+@pytest.mark.asyncio
+async def test_fetch_grouped_daily_single_request(monkeypatch):
+    monkeypatch.setenv("POLYGON_API_URL", "http://polygon.local")
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json=GROUPED_DAILY)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        payload = await fetch_grouped_daily(date(2024, 11, 27), client=client)
+
+    assert payload == GROUPED_DAILY
+    assert len(requests) == 1
+    assert requests[0].url.path == "/v2/aggs/grouped/locale/us/market/stocks/2024-11-27"
+    assert requests[0].url.params["adjusted"] == "true"
+
+
+@pytest.mark.asyncio
+async def test_fetch_grouped_daily_http_error(monkeypatch):
+    monkeypatch.setenv("POLYGON_API_URL", "http://polygon.local")
+    transport = httpx.MockTransport(lambda request: httpx.Response(403, text="Forbidden"))
+
+    async with httpx.AsyncClient(transport=transport) as client:
+        with pytest.raises(ExternalAPIError) as exc_info:
+            await fetch_grouped_daily(date(2024, 11, 27), client=client)
+    assert exc_info.value.status_code == 403
+
+
+def test_parse_grouped_daily_and_fill_price_cache():
+    session_date = date(2024, 11, 27)
+    batch = parse_grouped_daily(GROUPED_DAILY, session_date)
+
+    assert list(batch["stock_symbol"]) == ["AAPL", "MSFT"]
+    assert batch["close"].tolist() == [234.93, 422.99]
+    assert batch["volume"].tolist() == [33498439, 18332900]
+
+    price_cache.clear()
+    assert fill_price_cache(batch) == 2
+    bar = price_cache.get(session_key("MSFT", session_date))
+    assert bar["open"] == 420.10
+    assert bar["session_date"] == session_date
+    assert price_cache.get(session_key("BROKEN", session_date)) is None
+    price_cache.clear()
+
+
+def test_parse_grouped_daily_rejects_error_payload():
+    with pytest.raises(InvalidAPIResponseError):
+        parse_grouped_daily({"status": "ERROR", "error": "Unknown API Key"}, date(2024, 11, 27))
+
+
+@pytest.mark.asyncio
+async def test_ingest_lock_is_not_held_in_a_transaction(monkeypatch):
+    connection = Mock()
+    connection.execute.return_value.scalar.return_value = True
+    monkeypatch.setattr(ingest, "engine", Mock(connect=Mock(return_value=connection)))
+    monkeypatch.setattr(ingest, "_session_is_stored", lambda session_date: False)
+
+    async def fake_ingest_session(session_date):
+        # The lock was taken and its transaction committed before the ingestion is awaited
+        assert connection.commit.call_count == 1
+        assert not connection.close.called
+        return 3
+
+    monkeypatch.setattr(ingest, "ingest_session", fake_ingest_session)
+    assert await ingest.ingest_or_load_session(date(2024, 11, 27)) == 3
+
+    assert "pg_advisory_unlock" in str(connection.execute.call_args.args[0])
+    assert connection.commit.call_count == 2
+    connection.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_session_with_a_few_stored_bars_is_still_ingested(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    DailyBars.__table__.create(bind=engine)
+    IngestedSessions.__table__.create(bind=engine)
+    session_date = date(2024, 11, 27)
+    db_session = sessionmaker(bind=engine)()
+    # A single bar stored by a portfolio valuation before the grouped ingestion ran
+    db_session.add(DailyBars(stock_symbol="AAPL", session_date=session_date, close=234.93))
+    db_session.commit()
+    db_session.close()
+
+    monkeypatch.setattr(ingest, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(ingest, "_try_ingest_lock", lambda: Mock())
+    monkeypatch.setattr(ingest, "_release_ingest_lock", lambda connection: None)
+    ingested = []
+
+    async def fake_ingest_session(session_date):
+        ingested.append(session_date)
+        return 2
+
+    monkeypatch.setattr(ingest, "ingest_session", fake_ingest_session)
+    assert await ingest.ingest_or_load_session(session_date) == 2
+    assert ingested == [session_date]
+
+    db_session = sessionmaker(bind=engine)()
+    db_session.add(IngestedSessions(session_date=session_date, bar_count=2))
+    db_session.commit()
+    db_session.close()
+    assert ingest._session_is_stored(session_date)
@@ -6,7 +6,11 @@ from app.main import app
 from app.data_base import get_db_session, Base, engine
 from sqlalchemy.orm import sessionmaker
 from app.models import Stocks
-from unittest.mock import patch, Mock
+from app.cache import cache, session_key, CompactStock
+from app.exceptions import ServiceOverloadedError
+from app.holdings import holdings
+from app.market_calendar import last_completed_session
+from unittest.mock import patch, Mock, AsyncMock
 
 TestingSessionLocal = sessionmaker(
     autocommit=False, autoflush=False, bind=engine)
@@ -92,3 +96,45 @@ async def test_update_stock_amount(setup_database):
     assert stock is not None
     assert float(stock.purchased_amount) == 10
     db.close()
+
+
+@pytest.mark.asyncio
+async def test_shed_requests_keep_getting_stale_data(monkeypatch, stock):
+    monkeypatch.setattr(holdings, "loaded", True)
+    key = session_key("AAPL", last_completed_session())
+    cache.set(key, CompactStock.from_stock(stock), ttl=-1)
+    overloaded = AsyncMock(side_effect=ServiceOverloadedError(message="Overloaded.", retry_after=2))
+
+    try:
+        with patch("app.main.build_stock", overloaded):
+            transport = ASGITransport(app=app)
+            async with AsyncClient(transport=transport, base_url="http://test") as ac:
+                responses = [await ac.get("/stock/AAPL") for _ in range(2)]
+    finally:
+        cache.pop(key)
+
+    assert overloaded.call_count == 2
+    for response in responses:
+        assert response.status_code == 200
+        assert response.headers["X-Served-Stale"] == "true"
+        assert response.json()["company_name"] == stock.company_name
+
+
+@pytest.mark.asyncio
+async def test_stock_built_from_stale_scraped_data_is_flagged(monkeypatch, stock):
+    monkeypatch.setattr(holdings, "loaded", True)
+    monkeypatch.setenv("COMPETITOR_PREFETCH_ENABLED", "true")
+    key = session_key("AAPL", last_completed_session())
+    cache.pop(key, None)
+    build_stock = AsyncMock(return_value=(CompactStock.from_stock(stock), True))
+    prefetch = AsyncMock()
+
+    with patch("app.main.build_stock", build_stock), patch("app.main.prefetch_competitors", prefetch):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            response = await ac.get("/stock/AAPL")
+
+    assert response.status_code == 200
+    assert response.headers["X-Served-Stale"] == "true"
+    assert response.json()["company_name"] == stock.company_name
+    prefetch.assert_not_called()
@@ -0,0 +1,51 @@
+# tests/test_market_calendar.py
+
+from datetime import date, datetime
+from app.market_calendar import (
+    MARKET_TIMEZONE,
+    market_holidays,
+    is_trading_day,
+    session_close,
+    last_completed_session,
+    seconds_until_next_session_data
+)
+
+
+def test_market_holidays_2024():
+    assert market_holidays(2024) == {
+        date(2024, 1, 1), date(2024, 1, 15), date(2024, 2, 19), date(2024, 3, 29), date(2024, 5, 27),
+        date(2024, 6, 19), date(2024, 7, 4), date(2024, 9, 2), date(2024, 11, 28), date(2024, 12, 25)
+    }
+
+
+def test_observed_holidays():
+    # Saturday New Year's Day is not observed, Sunday Juneteenth is observed on Monday
+    assert date(2021, 12, 31) not in market_holidays(2021)
+    assert date(2022, 6, 20) in market_holidays(2022)
+    assert date(2021, 12, 24) in market_holidays(2021)
+    assert not is_trading_day(date(2024, 11, 30))
+    assert is_trading_day(date(2024, 11, 29))
+
+
+def test_session_close():
+    assert session_close(date(2024, 11, 27)).hour == 16
+    assert session_close(date(2024, 11, 29)).hour == 13
+    assert session_close(date(2024, 7, 3)).hour == 13
+    assert session_close(date(2024, 12, 24)).hour == 13
+
+
+def test_last_completed_session(monkeypatch):
+    monkeypatch.setenv("SESSION_DATA_DELAY", "1800")
+    # Before the data of Wednesday is available, the last session is Tuesday
+    assert last_completed_session(datetime(2024, 11, 27, 16, 10, tzinfo=MARKET_TIMEZONE)) == date(2024, 11, 26)
+    assert last_completed_session(datetime(2024, 11, 27, 16, 40, tzinfo=MARKET_TIMEZONE)) == date(2024, 11, 27)
+    # Thanksgiving and the weekend fall back to the previous trading day
+    assert last_completed_session(datetime(2024, 11, 28, 18, 0, tzinfo=MARKET_TIMEZONE)) == date(2024, 11, 27)
+    assert last_completed_session(datetime(2024, 12, 1, 12, 0, tzinfo=MARKET_TIMEZONE)) == date(2024, 11, 29)
+
+
+def test_seconds_until_next_session_data(monkeypatch):
+    monkeypatch.setenv("SESSION_DATA_DELAY", "0")
+    # Saturday noon: the next data is Monday's close
+    now = datetime(2024, 11, 30, 12, 0, tzinfo=MARKET_TIMEZONE)
+    assert seconds_until_next_session_data(now) == (2 * 24 + 4) * 3600
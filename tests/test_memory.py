@@ -0,0 +1,68 @@
+# tests/test_memory.py
+
+import os
+import tracemalloc
+import pytest
+from app import memory
+from app.exceptions import InvalidAPIRequestError
+from app.memory import take_snapshot, diff_snapshots, list_snapshots, memory_stats, rss_bytes
+from app.soak import _stand_in_page
+from app.services import parse_marketwatch_page
+
+
+@pytest.fixture
+def tracing(monkeypatch):
+    monkeypatch.setattr(memory, "_snapshots", memory.OrderedDict())
+    was_tracing = tracemalloc.is_tracing()
+    yield
+    if not was_tracing:
+        tracemalloc.stop()
+
+
+def test_snapshot_diff_shows_growth(tracing):
+    first = take_snapshot()
+    retained = [bytearray(1024) for _ in range(2000)]
+    second = take_snapshot()
+
+    assert first["rss_bytes"] > 0
+    diff = diff_snapshots(first["id"], second["id"], limit=5)
+    assert diff["traced_diff_bytes"] >= 2000 * 1024
+    top = diff["top"][0]
+    assert "test_memory.py" in top["location"]
+    assert top["size_diff_bytes"] >= 2000 * 1024
+    assert len(retained) == 2000
+
+
+def test_snapshots_keep_the_baseline(tracing, monkeypatch):
+    monkeypatch.setenv("MEMORY_MAX_SNAPSHOTS", "3")
+    ids = [take_snapshot(limit=1)["id"] for _ in range(5)]
+
+    assert [snapshot["id"] for snapshot in list_snapshots()] == [ids[0], ids[3], ids[4]]
+    assert memory_stats()["snapshots"] == [ids[0], ids[3], ids[4]]
+    with pytest.raises(InvalidAPIRequestError) as exc_info:
+        diff_snapshots(ids[1], ids[4])
+    assert exc_info.value.status_code == 404
+
+
+def test_snapshots_of_other_workers_are_rejected(tracing):
+    snapshot_id = take_snapshot(limit=1)["id"]
+    assert snapshot_id.startswith(f"{os.getpid()}-")
+
+    with pytest.raises(InvalidAPIRequestError) as exc_info:
+        diff_snapshots(f"{os.getpid() + 1}-1", snapshot_id)
+    assert exc_info.value.status_code == 409
+    assert "another worker" in exc_info.value.message
+
+
+def test_rss_bytes():
+    assert rss_bytes() > 1024 * 1024
+
+
+def test_soak_stand_in_page_parses():
+    html = _stand_in_page("AAPL", ["MSFT", "GOOG"], page_kb=10)
+    data = parse_marketwatch_page(html, "AAPL")
+
+    assert len(html) > 10 * 1024
+    assert data["company_name"] == "AAPL Inc."
+    assert set(data["performance_data"]) == {"five_days", "one_month", "three_months", "year_to_date", "one_year"}
+    assert [competitor["symbol"] for competitor in data["competitors_data"]] == ["MSFT", "GOOG"]
@@ -0,0 +1,84 @@
+# tests/test_page_archive.py
+
+import os
+import pytest
+from app.page_archive import (
+    store_page,
+    load_page,
+    page_versions,
+    save_last_good_parse,
+    load_last_good_parse,
+    reparse_archive,
+    collect_garbage
+)
+from app.exceptions import MarketWatchDataScrapeError
+
+
+@pytest.fixture(autouse=True)
+def page_archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("PAGE_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setenv("PAGE_ARCHIVE_COMPRESSION", "gzip")
+    return tmp_path
+
+
+def test_store_page_is_content_addressed(page_archive_dir):
+    first = store_page("aapl", "https://example.com/aapl", "<html>v1</html>")
+    second = store_page("AAPL", "https://example.com/aapl", "<html>v2</html>")
+    again = store_page("AAPL", "https://example.com/aapl", "<html>v1</html>")
+
+    assert again == first
+    assert load_page(first) == "<html>v1</html>"
+    assert [version["digest"] for version in page_versions("AAPL")] == [first, second]
+    objects = [name for _, _, names in os.walk(page_archive_dir / "objects") for name in names]
+    assert sorted(objects) == sorted([f"{first}.html.gz", f"{second}.html.gz"])
+
+
+def test_store_page_disabled(monkeypatch):
+    monkeypatch.setenv("PAGE_ARCHIVE_ENABLED", "false")
+    assert store_page("AAPL", "https://example.com/aapl", "<html></html>") is None
+    assert page_versions("AAPL") == []
+
+
+def test_reparse_archive_without_network():
+    digest = store_page("AAPL", "https://example.com/aapl", "<html>Apple Inc.</html>")
+    store_page("MSFT", "https://example.com/msft", "<html>broken</html>")
+
+    def parse(html, stock_symbol):
+        if "broken" in html:
+            raise MarketWatchDataScrapeError(message="Company name not found.")
+        return {"company_name": html[6:-7]}
+
+    result = reparse_archive(parse)
+
+    assert result == {"parsed": ["AAPL"], "failed": {"MSFT": "Company name not found."}}
+    last_good = load_last_good_parse("AAPL")
+    assert last_good["digest"] == digest
+    assert last_good["data"] == {"company_name": "Apple Inc."}
+    assert load_last_good_parse("MSFT") is None
+
+
+def archived_objects(page_archive_dir):
+    return sorted(name for _, _, names in os.walk(page_archive_dir / "objects") for name in names)
+
+
+def test_versions_are_trimmed_and_unreferenced_pages_collected(page_archive_dir, monkeypatch):
+    monkeypatch.setenv("PAGE_ARCHIVE_MAX_VERSIONS", "2")
+    digests = [store_page("AAPL", "https://example.com/aapl", f"<html>v{index}</html>") for index in range(4)]
+    last_good = store_page("MSFT", "https://example.com/msft", "<html>msft v0</html>")
+    save_last_good_parse("MSFT", last_good, {"company_name": "Microsoft Corp."})
+    store_page("MSFT", "https://example.com/msft", "<html>msft v1</html>")
+    store_page("MSFT", "https://example.com/msft", "<html>msft v2</html>")
+
+    assert [version["digest"] for version in page_versions("AAPL")] == [digests[3], digests[2]]
+    assert len(os.listdir(page_archive_dir / "refs" / "AAPL")) == 2
+    # Recently written pages are kept, a worker may be about to reference them
+    assert collect_garbage()["removed"] == 0
+
+    result = collect_garbage(grace_seconds=0)
+
+    assert result["removed"] == 2
+    assert result["kept"] == 5
+    assert f"{digests[0]}.html.gz" not in archived_objects(page_archive_dir)
+    # The page of the last good parse is kept even though no version references it anymore
+    assert f"{last_good}.html.gz" in archived_objects(page_archive_dir)
+    assert load_page(digests[3]) == "<html>v3</html>"
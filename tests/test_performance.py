@@ -0,0 +1,166 @@
+# tests/test_performance.py
+
+import asyncio
+import httpx
+import numpy as np
+import pytest
+from datetime import date, timedelta
+from app import performance
+from app.performance import compute_performance, fetch_daily_range, stored_performance, performance_cache
+from app.market_calendar import is_trading_day
+
+
+def trading_days(start: date, end: date) -> list[date]:
+    days, day = [], start
+    while day <= end:
+        if is_trading_day(day):
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def series(days: list[date]) -> tuple[np.ndarray, np.ndarray]:
+    # Closes growing by one per session, so that every reference close is known from its position
+    return np.array(days, dtype="datetime64[D]"), np.arange(1, len(days) + 1, dtype=np.float64)
+
+
+def test_compute_performance_windows():
+    days = trading_days(date(2023, 11, 1), date(2024, 11, 27))
+    dates, closes = series(days)
+    performance = compute_performance(dates, closes)
+
+    def expected(reference_day: date) -> float:
+        return closes[-1] / closes[days.index(reference_day)] - 1
+
+    assert performance["five_days"] == pytest.approx(closes[-1] / closes[-6] - 1)
+    # Calendar windows use the last session on or before their start date
+    assert performance["one_month"] == pytest.approx(expected(date(2024, 10, 25)))
+    assert performance["three_months"] == pytest.approx(expected(date(2024, 8, 27)))
+    assert performance["year_to_date"] == pytest.approx(expected(date(2023, 12, 29)))
+    assert performance["one_year"] == pytest.approx(expected(date(2023, 11, 27)))
+
+
+def test_compute_performance_short_history():
+    dates, closes = series(trading_days(date(2024, 9, 3), date(2024, 11, 27)))
+    performance = compute_performance(dates, closes)
+
+    assert performance["five_days"] is not None
+    assert performance["one_month"] is not None
+    assert performance["three_months"] is None
+    assert performance["year_to_date"] is None
+    assert performance["one_year"] is None
+    assert compute_performance(np.array([], dtype="datetime64[D]"), np.array([])) == dict.fromkeys(
+        performance.keys())
+
+
+def test_compute_performance_gap_in_history():
+    # A hole in the stored series must not be matched with a much older close
+    days = [day for day in trading_days(date(2024, 6, 3), date(2024, 11, 27))
+            if not date(2024, 10, 1) <= day <= date(2024, 11, 15)]
+    performance = compute_performance(*series(days))
+    assert performance["one_month"] is None
+    assert performance["three_months"] is not None
+
+
+@pytest.mark.asyncio
+async def test_fetch_daily_range(monkeypatch):
+    monkeypatch.setenv("POLYGON_API_URL", "http://polygon.local")
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"status": "OK", "results": [
+            {"o": 234.47, "h": 235.69, "l": 233.81, "c": 234.93, "v": 33498439, "t": 1732683600000}
+        ]})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        bars = await fetch_daily_range("aapl", date(2023, 11, 17), date(2024, 11, 27), client=client)
+
+    assert requests[0].url.path == "/v2/aggs/ticker/AAPL/range/1/day/2023-11-17/2024-11-27"
+    assert bars == [{"stock_symbol": "AAPL", "session_date": date(2024, 11, 27), "open": 234.47,
+                     "high": 235.69, "low": 233.81, "close": 234.93, "volume": 33498439}]
+
+
+@pytest.mark.asyncio
+async def test_stored_performance_appends_bar_and_backfills(monkeypatch):
+    session_date = date(2024, 11, 27)
+    dates, closes = series(trading_days(date(2024, 10, 1), date(2024, 11, 26)))
+    monkeypatch.setattr(performance, "load_close_series", lambda stock_symbol, day: (dates, closes))
+    backfills = []
+    monkeypatch.setattr(performance, "start_backfill", lambda stock_symbol, day: backfills.append(stock_symbol))
+    performance_cache.clear()
+
+    bar = {"session_date": session_date, "close": float(len(closes) + 1)}
+    result = await stored_performance("AAPL", bar)
+
+    # The bar of the session is the last close even before it is stored
+    assert result["five_days"] == pytest.approx(bar["close"] / closes[-5] - 1)
+    assert result["one_year"] is None
+    assert backfills == ["AAPL"]
+    # Incomplete results are not cached, they are computed again once the history is backfilled
+    assert len(performance_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_stored_performance_caches_gaps_left_by_the_backfill(monkeypatch):
+    session_date = date(2024, 11, 27)
+    # Listed in October: no backfill can provide the year to date and one year references
+    dates, closes = series(trading_days(date(2024, 10, 1), date(2024, 11, 26)))
+    loads, backfills = [], []
+
+    def load_close_series(stock_symbol, day):
+        loads.append(stock_symbol)
+        return dates, closes
+
+    async def backfill_bars(stock_symbol, day):
+        backfills.append(stock_symbol)
+        return 0
+
+    monkeypatch.setattr(performance, "load_close_series", load_close_series)
+    monkeypatch.setattr(performance, "backfill_bars", backfill_bars)
+    monkeypatch.setattr(performance, "_backfilled_sessions", {})
+    monkeypatch.setenv("PERFORMANCE_BACKFILL_ENABLED", "true")
+    performance_cache.clear()
+
+    bar = {"session_date": session_date, "close": float(len(closes) + 1)}
+    assert (await stored_performance("NEWCO", bar))["one_year"] is None
+    await asyncio.sleep(0)
+    assert backfills == ["NEWCO"]
+
+    # Backfilled for the session already: the partial result is cached instead of backfilling again
+    for _ in range(3):
+        assert (await stored_performance("NEWCO", bar))["one_year"] is None
+    await asyncio.sleep(0)
+    assert backfills == ["NEWCO"]
+    assert loads == ["NEWCO", "NEWCO"]
+    performance_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_start_backfill_normalizes_the_symbol_and_keeps_its_task(monkeypatch):
+    session_date = date(2024, 11, 27)
+    release = asyncio.Event()
+    backfills = []
+
+    async def backfill_bars(stock_symbol, day):
+        backfills.append(stock_symbol)
+        await release.wait()
+        return 0
+
+    monkeypatch.setattr(performance, "backfill_bars", backfill_bars)
+    monkeypatch.setattr(performance, "_backfilled_sessions", {})
+    monkeypatch.setenv("PERFORMANCE_BACKFILL_ENABLED", "true")
+
+    performance.start_backfill("aapl", session_date)
+    performance.start_backfill("AAPL", session_date)
+    await asyncio.sleep(0)
+    assert backfills == ["AAPL"]
+    assert performance.backfill_in_progress("aapl")
+    assert len(performance._backfill_tasks) == 1
+
+    release.set()
+    await asyncio.gather(*performance._backfill_tasks)
+    await asyncio.sleep(0)
+    assert not performance.backfill_in_progress("AAPL")
+    assert performance._backfilled_sessions == {"AAPL": session_date}
+    assert not performance._backfill_tasks
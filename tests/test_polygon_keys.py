@@ -0,0 +1,98 @@
+# tests/test_polygon_keys.py
+
+import httpx
+import pytest
+from app import polygon_keys
+from app.exceptions import ServiceOverloadedError
+from app.polygon_keys import PolygonKeyPool, mask_key, polygon_get, reset_key_pool
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_mask_key():
+    assert mask_key("abcdefghijkl1234") == "...1234"
+    assert mask_key("short") == "..."
+    assert mask_key(None) == "none"
+
+
+def test_pool_balances_on_remaining_quota():
+    clock = Clock()
+    pool = PolygonKeyPool(["key-one-0001", "key-two-0002"], requests_per_minute=2, timer=clock)
+
+    used = [pool.acquire().secret for _ in range(4)]
+    assert sorted(used) == ["key-one-0001", "key-one-0001", "key-two-0002", "key-two-0002"]
+
+    # Both keys are out of quota until their oldest request leaves the window
+    with pytest.raises(ServiceOverloadedError) as exc_info:
+        pool.acquire()
+    assert exc_info.value.retry_after == 60
+
+    clock.now += 61
+    assert pool.acquire() is not None
+    assert pool.stats()["0:...0001"]["requests"] + pool.stats()["1:...0002"]["requests"] == 5
+
+
+def test_pool_leaves_rejected_keys_aside(monkeypatch):
+    monkeypatch.setenv("POLYGON_KEY_AUTH_COOLDOWN", "3600")
+    clock = Clock()
+    pool = PolygonKeyPool(["key-one-0001", "key-two-0002", "key-three-0003"], timer=clock)
+    limited, revoked, forbidden = pool.keys
+
+    pool.record(limited, httpx.Response(429, headers={"Retry-After": "30"}))
+    pool.record(revoked, httpx.Response(401))
+    pool.record(forbidden, httpx.Response(403))
+
+    assert {pool.acquire().secret for _ in range(3)} == {"key-three-0003"}
+    clock.now += 31
+    assert {pool.acquire().secret for _ in range(4)} == {"key-one-0001", "key-three-0003"}
+
+    stats = pool.stats()
+    assert stats["0:...0001"]["rate_limited"] == 1
+    assert stats["1:...0002"]["unauthorized"] == 1
+    assert stats["1:...0002"]["cooldown_seconds"] == 3600 - 31
+    assert stats["2:...0003"]["forbidden"] == 1
+
+
+@pytest.mark.asyncio
+async def test_polygon_get_moves_to_another_key(monkeypatch):
+    monkeypatch.setenv("POLYGON_API_KEYS", "limited-key-0001, good-key-0002")
+    reset_key_pool()
+    polygon_keys.key_pool.keys[0].last_used = -1  # the limited key is picked first
+    keys = []
+
+    def handler(request):
+        keys.append(request.url.params["apiKey"])
+        if request.url.params["apiKey"] == "limited-key-0001":
+            return httpx.Response(429)
+        return httpx.Response(200, json={"status": "OK"})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        response = await polygon_get(client, "http://polygon.local/v1/open-close/AAPL/2024-11-27", {"adjusted": "true"})
+
+    assert response.status_code == 200
+    assert keys == ["limited-key-0001", "good-key-0002"]
+    assert polygon_keys.key_pool.stats()["0:...0001"]["cooldown_seconds"] > 0
+    monkeypatch.delenv("POLYGON_API_KEYS")
+    reset_key_pool()
+
+
+@pytest.mark.asyncio
+async def test_polygon_get_single_forbidden_key(monkeypatch):
+    monkeypatch.setenv("POLYGON_API_KEYS", "only-key-0001")
+    reset_key_pool()
+    transport = httpx.MockTransport(lambda request: httpx.Response(403, text="NOT_AUTHORIZED"))
+
+    async with httpx.AsyncClient(transport=transport) as client:
+        response = await polygon_get(client, "http://polygon.local/v1/open-close/AAPL/2000-01-03")
+
+    # The 403 is returned to the caller, and the key stays usable for other requests
+    assert response.status_code == 403
+    assert polygon_keys.key_pool.try_acquire() is not None
+    monkeypatch.delenv("POLYGON_API_KEYS")
+    reset_key_pool()
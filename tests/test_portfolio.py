@@ -0,0 +1,104 @@
+# tests/test_portfolio.py
+
+import pytest
+import numpy as np
+from datetime import date
+from decimal import Decimal
+from unittest.mock import patch, Mock
+from app.portfolio import compute_portfolio_valuation, load_portfolio_prices, to_money
+from app.cache import price_cache
+from app.exceptions import ExternalAPIError
+
+
+def test_compute_portfolio_valuation():
+    amounts = np.array([10.0, 5.0, 2.0])
+    opens = np.array([100.0, 50.0, np.nan])
+    closes = np.array([110.0, 40.0, np.nan])
+
+    valuation = compute_portfolio_valuation(amounts, opens, closes)
+
+    assert to_money(valuation["total_value"]) == Decimal("1300")
+    assert to_money(valuation["total_day_pnl"]) == Decimal("50")
+    assert to_money(valuation["market_values"][0]) == Decimal("1100")
+    assert to_money(valuation["day_pnls"][1]) == Decimal("-50")
+    assert valuation["weights"][0] == pytest.approx(1100 / 1300)
+    assert np.isnan(valuation["weights"][2])
+    assert list(valuation["priced"]) == [True, True, False]
+
+
+def test_compute_portfolio_valuation_is_exact():
+    amounts = np.array([0.1] * 3)
+    prices = np.array([0.1] * 3)
+
+    valuation = compute_portfolio_valuation(amounts, prices, prices)
+
+    # 0.1 * 0.1 * 3 is 0.030000000000000006 in floats
+    assert to_money(valuation["total_value"]) == Decimal("0.0300")
+    assert to_money(valuation["total_day_pnl"]) == Decimal("0.0000")
+    assert valuation["market_values"].dtype == np.int64
+
+
+def test_compute_portfolio_valuation_without_open():
+    amounts = np.array([10.0, 5.0])
+    opens = np.array([1.5, np.nan])
+    closes = np.array([2.0, 3.0])
+
+    valuation = compute_portfolio_valuation(amounts, opens, closes)
+
+    # The position without an open has a market value but is left out of the P&L total
+    assert to_money(valuation["total_value"]) == Decimal("35")
+    assert to_money(valuation["total_day_pnl"]) == Decimal("5")
+    assert list(valuation["pnl_known"]) == [True, False]
+
+
+def test_compute_portfolio_valuation_past_int64():
+    amounts = np.array([999999.9999] * 2)
+    prices = np.array([99999999.9999] * 2)
+
+    valuation = compute_portfolio_valuation(amounts, prices, prices)
+
+    # 199999999979800.00000002 does not fit in int64 once scaled, Python integers keep it exact
+    assert valuation["total_value"] == 19999999997980000000002
+    assert to_money(valuation["total_value"]) == Decimal("199999999979800.0000")
+
+
+def test_to_money():
+    assert to_money(12345678912) == Decimal("123.4568")
+    assert to_money(-5 * 10 ** 8) == Decimal("-5.0000")
+
+
+@pytest.mark.asyncio
+async def test_load_portfolio_prices_fetches_only_missing():
+    session_date = date(2024, 11, 27)
+    price_cache.clear()
+    price_cache[("AAPL", session_date)] = {"stock_symbol": "AAPL", "session_date": session_date, "open": 1.0, "close": 2.0}
+    stored = {"MSFT": {"stock_symbol": "MSFT", "session_date": session_date, "open": 3.0, "close": 4.0}}
+
+    async def fake_fetch(stock_symbol, date):
+        if stock_symbol == "BAD":
+            raise ExternalAPIError(message="Not found", status_code=404)
+        return {"status": "OK", "symbol": stock_symbol, "from": date, "open": 5.0, "high": 6.0, "low": 4.0,
+                "close": 6.0, "volume": 100}
+
+    with patch("app.portfolio.get_bars_for_session", return_value=stored) as mock_stored, \
+            patch("app.portfolio.save_bars") as mock_save, \
+            patch("app.portfolio.fetch_polygon_open_close_stock_data", side_effect=fake_fetch) as mock_fetch:
+        bars = await load_portfolio_prices(Mock(), ["AAPL", "MSFT", "NVDA", "BAD"], session_date)
+
+    mock_stored.assert_called_once()
+    assert mock_stored.call_args.args[1] == ["MSFT", "NVDA", "BAD"]
+    assert mock_fetch.call_count == 2
+    assert set(bars) == {"AAPL", "MSFT", "NVDA"}
+    assert [bar["stock_symbol"] for bar in mock_save.call_args.args[1]] == ["NVDA"]
+    price_cache.clear()
+
+
+def test_save_bars_keeps_missing_open():
+    from app.bars import save_bars
+    db_session = Mock()
+    save_bars(db_session, [{"stock_symbol": "AAPL", "session_date": date(2024, 11, 27), "open": None,
+                            "high": None, "low": None, "close": 234.93, "volume": None}])
+
+    parameters = db_session.execute.call_args.args[0].compile().params
+    assert parameters["open_m0"] is None
+    assert parameters["close_m0"] == Decimal("234.93")
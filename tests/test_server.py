@@ -0,0 +1,18 @@
+# tests/test_server.py
+
+from app.server import build_server_config
+
+
+def test_build_server_config(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.setenv("PORT", "9000")
+    monkeypatch.setenv("WORKER_MAX_REQUESTS", "1000")
+    monkeypatch.setenv("GRACEFUL_SHUTDOWN_TIMEOUT", "15")
+
+    config = build_server_config()
+    assert config.app == "app.main:app"
+    assert config.workers == 4
+    assert config.port == 9000
+    assert config.limit_max_requests == 1000
+    assert config.timeout_graceful_shutdown == 15
+    assert config.lifespan == "on"
@@ -7,7 +7,23 @@ from app.services import (
     fetch_marketwatch_and_scrape_stock_data
 )
 from app.exceptions import ExternalAPIError, InvalidAPIResponseError, MarketWatchDataScrapeError
+from app.cache import negative_cache
+from app.page_archive import page_versions
 import httpx
+from decimal import Decimal
+
+
+@pytest.fixture(autouse=True)
+def clear_negative_cache():
+    negative_cache.clear()
+    yield
+    negative_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def page_archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("PAGE_ARCHIVE_DIR", str(tmp_path))
+    return tmp_path
 
 
 @pytest.mark.asyncio
@@ -276,4 +292,132 @@ async def test_fetch_marketwatch_parsing_error():
 
         with pytest.raises(MarketWatchDataScrapeError) as exc_info:
             await fetch_marketwatch_and_scrape_stock_data(stock_symbol)
-        assert "Failed to extract company name from MarketWatch page" in str(exc_info.value)
\ No newline at end of file
+        assert "Failed to extract company name from MarketWatch page" in str(exc_info.value)
+
+MARKETWATCH_HTML = """
+<html><body>
+<h1 class="company__name">Apple Inc.</h1>
+<table><tbody><tr><th><span>Performance</span></th></tr>
+<tr class="table__row"><td class="table__cell">5 Day</td><td><ul><li class="content__item value">2.89%</li></ul></td></tr>
+</tbody></table>
+<table aria-label="Competitors data table"><tbody>
+<tr>
+<td class="table__cell w50"><a class="link" href="https://www.marketwatch.com/investing/stock/msft?mod=mw_quote_competitors">Microsoft Corp.</a></td>
+<td class="table__cell w25"><bg-quote>0.50%</bg-quote></td>
+<td class="table__cell w25 number">$3.15T</td>
+</tr>
+<tr>
+<td class="table__cell w50">Unlisted Co.</td>
+<td class="table__cell w25"><bg-quote>0.10%</bg-quote></td>
+<td class="table__cell w25 number">$1.2B</td>
+</tr>
+</tbody></table>
+</body></html>
+"""
+
+
+@pytest.mark.asyncio
+async def test_fetch_marketwatch_parses_competitor_symbols():
+    with patch("app.services.httpx.AsyncClient") as mock_client:
+        mock_client_instance = mock_client.return_value.__aenter__.return_value
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.text = MARKETWATCH_HTML
+        mock_response.raise_for_status = Mock()
+        mock_client_instance.get = AsyncMock(return_value=mock_response)
+
+        result = await fetch_marketwatch_and_scrape_stock_data("AAPL")
+
+    assert result["company_name"] == "Apple Inc."
+    assert result["performance_data"]["five_days"] == pytest.approx(0.0289)
+    assert [competitor["symbol"] for competitor in result["competitors_data"]] == ["MSFT", None]
+    assert result["competitors_data"][0]["market_cap"]["value"] == Decimal("3.15E+12")
+
+
+@pytest.mark.asyncio
+async def test_fetch_polygon_not_found_is_negatively_cached():
+    with patch("app.services.httpx.AsyncClient") as mock_client:
+        mock_client_instance = mock_client.return_value.__aenter__.return_value
+        mock_response = Mock()
+        mock_response.raise_for_status.side_effect = httpx.HTTPStatusError(
+            message="Not Found",
+            request=httpx.Request('GET', 'url'),
+            response=httpx.Response(status_code=404, content=b'Not Found')
+        )
+        mock_client_instance.get = AsyncMock(return_value=mock_response)
+
+        # 2024-11-30 is a Saturday
+        for _ in range(3):
+            with pytest.raises(ExternalAPIError) as exc_info:
+                await fetch_polygon_open_close_stock_data("AAPL", "2024-11-30")
+            assert exc_info.value.status_code == 404
+
+    assert mock_client_instance.get.call_count == 1
+    assert negative_cache.stats()["hits"]["no_trading_day"] == 2
+
+
+@pytest.mark.asyncio
+async def test_fetch_marketwatch_missing_section_is_negatively_cached():
+    with patch("app.services.httpx.AsyncClient") as mock_client:
+        mock_client_instance = mock_client.return_value.__aenter__.return_value
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.text = "<html><body>No quote here</body></html>"
+        mock_response.raise_for_status = Mock()
+        mock_client_instance.get = AsyncMock(return_value=mock_response)
+
+        for _ in range(2):
+            with pytest.raises(MarketWatchDataScrapeError):
+                await fetch_marketwatch_and_scrape_stock_data("AAPL")
+
+    assert mock_client_instance.get.call_count == 1
+    assert negative_cache.stats()["hits"]["missing_section"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fetch_marketwatch_serves_last_good_parse_on_markup_change():
+    with patch("app.services.httpx.AsyncClient") as mock_client:
+        mock_client_instance = mock_client.return_value.__aenter__.return_value
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.text = MARKETWATCH_HTML
+        mock_response.raise_for_status = Mock()
+        mock_client_instance.get = AsyncMock(return_value=mock_response)
+
+        good = await fetch_marketwatch_and_scrape_stock_data("AAPL")
+
+        # MarketWatch changes its markup: the new page is archived and the last good parse is served
+        negative_cache.clear()
+        mock_response.text = "<html><body><h2>Apple Inc.</h2></body></html>"
+        served = await fetch_marketwatch_and_scrape_stock_data("AAPL")
+
+    assert served["company_name"] == good["company_name"]
+    assert [competitor["symbol"] for competitor in served["competitors_data"]] == ["MSFT", None]
+    assert len(page_versions("AAPL")) == 2
+
+
+@pytest.mark.asyncio
+async def test_fetch_marketwatch_only_caches_missing_sections_negatively():
+    stores = sum(negative_cache.stats()["stores"].values())
+    with patch("app.services.httpx.AsyncClient") as mock_client, \
+            patch("app.services.parse_marketwatch_page") as mock_parse:
+        mock_client_instance = mock_client.return_value.__aenter__.return_value
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.text = MARKETWATCH_HTML
+        mock_response.raise_for_status = Mock()
+        mock_client_instance.get = AsyncMock(return_value=mock_response)
+
+        # A parser failure may not happen on the next page, it is not remembered
+        mock_parse.side_effect = MarketWatchDataScrapeError(message="An unexpected error occurred during data scraping.")
+        for _ in range(2):
+            with pytest.raises(MarketWatchDataScrapeError):
+                await fetch_marketwatch_and_scrape_stock_data("ZZZZ")
+        assert mock_client_instance.get.call_count == 2
+
+        # Pages without competitors are results, cached by the caller in the scrape cache
+        mock_parse.side_effect = None
+        mock_parse.return_value = {"company_name": "Zzzz Inc.", "performance_data": {}, "competitors_data": []}
+        await fetch_marketwatch_and_scrape_stock_data("ZZZZ")
+
+    assert sum(negative_cache.stats()["stores"].values()) == stores
@@ -0,0 +1,54 @@
+# tests/test_tickers.py
+
+import pytest
+from app import tickers
+from app.tickers import TickerIndex, normalize_stock_symbol, valid_stock_symbol, is_known_stock_symbol
+from app.exceptions import InvalidAPIRequestError
+
+
+def test_normalize_stock_symbol():
+    assert normalize_stock_symbol(" aapl ") == "AAPL"
+    assert normalize_stock_symbol("brk-b") == "BRK.B"
+    assert normalize_stock_symbol("BRK/B") == "BRK.B"
+
+
+def test_ticker_index_lookup_and_search():
+    index = TickerIndex([("msft", "Microsoft Corp."), ("AAPL", "Apple Inc."), ("AAL", "American Airlines"), ("A", "Agilent")])
+
+    assert "AAPL" in index
+    assert "AAP" not in index
+    assert "ZZZZ" not in index
+    assert [ticker["symbol"] for ticker in index.search("aa")] == ["AAL", "AAPL"]
+    assert [ticker["symbol"] for ticker in index.search("A", limit=2)] == ["A", "AAL"]
+    assert index.search("X") == []
+
+
+def test_valid_stock_symbol(monkeypatch):
+    monkeypatch.setenv("TICKER_VALIDATION_ENABLED", "true")
+    assert valid_stock_symbol("aapl") == "AAPL"
+    with pytest.raises(InvalidAPIRequestError) as exc_info:
+        valid_stock_symbol("AAPLL")
+    assert exc_info.value.status_code == 404
+
+    monkeypatch.setenv("TICKER_VALIDATION_ENABLED", "false")
+    assert valid_stock_symbol("aapll") == "AAPLL"
+
+
+def test_validation_needs_a_complete_index_by_default(monkeypatch, tmp_path):
+    monkeypatch.delenv("TICKER_VALIDATION_ENABLED", raising=False)
+    path = tmp_path / "tickers.csv"
+    path.write_text("symbol,name\nAAPL,Apple Inc.\n")
+    monkeypatch.setattr(tickers, "_index", TickerIndex.from_file(str(path)))
+
+    # A partial reference list cannot tell that ROKU does not exist
+    assert not tickers.get_ticker_index().complete
+    assert valid_stock_symbol("roku") == "ROKU"
+    assert is_known_stock_symbol("ROKU")
+
+    path.write_text("# complete: 1 active tickers\nsymbol,name\nAAPL,Apple Inc.\n")
+    monkeypatch.setattr(tickers, "_index", TickerIndex.from_file(str(path)))
+    assert list(tickers.get_ticker_index().symbols) == ["AAPL"]
+    assert valid_stock_symbol("aapl") == "AAPL"
+    assert not is_known_stock_symbol("ROKU")
+    with pytest.raises(InvalidAPIRequestError):
+        valid_stock_symbol("ROKU")
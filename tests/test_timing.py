@@ -0,0 +1,66 @@
+# tests/test_timing.py
+
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.timing import Histogram, timed, server_timing_middleware, stage_histograms
+from app.profiler import profile_window
+from app.security import require_admin
+from app.exceptions import InvalidAPIRequestError
+
+
+def test_histogram_quantiles():
+    histogram = Histogram()
+    for duration_ms in [0.5, 3, 3, 40, 700]:
+        histogram.observe(duration_ms)
+
+    stats = histogram.stats()
+    assert stats["count"] == 5
+    assert stats["p50_ms"] == 5
+    assert stats["p99_ms"] == 1000
+    assert stats["max_ms"] == 700
+    assert stats["buckets"]["le_5"] == 2
+    assert Histogram().quantile(0.5) is None
+
+
+def test_server_timing_header():
+    app = FastAPI()
+    app.middleware("http")(server_timing_middleware)
+
+    @app.get("/work")
+    async def work():
+        with timed("db"):
+            pass
+        with timed("db"):
+            pass
+        with timed("test_stage"):
+            await asyncio.sleep(0.01)
+        return {}
+
+    response = TestClient(app).get("/work")
+
+    metrics = [metric.split(";")[0] for metric in response.headers["Server-Timing"].split(", ")]
+    assert metrics == ["db", "test_stage", "total"]
+    assert stage_histograms["db"].count >= 2
+    assert stage_histograms["test_stage"].quantile(0.5) >= 10
+
+
+@pytest.mark.asyncio
+async def test_profile_window_samples_event_loop():
+    folded = await profile_window(0.1)
+    stacks = folded.splitlines()
+    assert stacks
+    assert all(stack.rsplit(" ", 1)[1].isdigit() for stack in stacks)
+
+
+def test_require_admin(monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    with pytest.raises(InvalidAPIRequestError):
+        require_admin("anything")
+
+    monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+    require_admin("s3cret")
+    with pytest.raises(InvalidAPIRequestError) as exc_info:
+        require_admin("wrong")
+    assert exc_info.value.status_code == 403
@@ -9,7 +9,9 @@ from app.utils import (
     get_db_url,
     get_polygon_base_url,
     get_polygon_api_key,
-    get_marketwatch_base_url
+    get_marketwatch_base_url,
+    get_web_concurrency,
+    get_worker_max_requests
 )
 import os
 
@@ -54,3 +56,15 @@ def test_get_polygon_api_key(monkeypatch):
 def test_get_marketwatch_base_url(monkeypatch):
     monkeypatch.setenv("MARKETWATCH_BASE_URL", "https://www.marketwatch.com")
     assert get_marketwatch_base_url() == "https://www.marketwatch.com"
+
+def test_get_web_concurrency(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    assert get_web_concurrency() == 3
+    monkeypatch.delenv("WEB_CONCURRENCY")
+    assert get_web_concurrency() == (os.cpu_count() or 1)
+
+def test_get_worker_max_requests(monkeypatch):
+    monkeypatch.setenv("WORKER_MAX_REQUESTS", "500")
+    assert get_worker_max_requests() == 500
+    monkeypatch.setenv("WORKER_MAX_REQUESTS", "0")
+    assert get_worker_max_requests() is None